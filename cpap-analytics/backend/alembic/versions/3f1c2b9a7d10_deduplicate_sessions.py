@@ -0,0 +1,101 @@
+"""Deduplicate sessions, then add their unique constraints
+
+Revision ID: 3f1c2b9a7d10
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+Databases created before ix_sessions_user_id_start_time and
+uq_sessions_user_id_session_id existed can hold several rows for one
+night, and create_all does not add either constraint to an existing
+table, so imports relying on ON CONFLICT fail there. Per
+(user_id, start_time) and then per (user_id, session_id) the row stored
+first (lowest id) is kept, as SD card stitching keeps the earliest stored
+row. Quantile sketch and profile rows left without a session are deleted.
+The rollups of affected users are logged for a rebuild with
+scripts/backfill_rollups.py --user.
+
+Constraints that already exist (tables created by a recent create_all)
+are left alone, so the revision can be applied to any database.
+"""
+import logging
+from typing import Sequence, Set, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2b9a7d10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+START_TIME_INDEX = "ix_sessions_user_id_start_time"
+SESSION_ID_CONSTRAINT = "uq_sessions_user_id_session_id"
+
+# Per-session rows keyed by (user_id, session_id)
+SESSION_ROW_TABLES = ("session_sketches", "session_profiles")
+
+sessions = sa.table(
+    "sessions",
+    sa.column("id", sa.Integer),
+    sa.column("user_id", sa.Integer),
+    sa.column("session_id", sa.String),
+    sa.column("start_time", sa.DateTime),
+)
+
+
+def _delete_duplicates(key: sa.ColumnClause) -> Set[int]:
+    """Delete every row but the first of each (user_id, ``key``); returns the affected users"""
+    first = (
+        sa.select(sa.func.min(sessions.c.id))
+        .where(key.isnot(None))
+        .group_by(sessions.c.user_id, key)
+    )
+    duplicate = sa.and_(key.isnot(None), sessions.c.id.notin_(first))
+    bind = op.get_bind()
+    users = set(bind.execute(sa.select(sessions.c.user_id).where(duplicate).distinct()).scalars())
+    if users:
+        bind.execute(sessions.delete().where(duplicate))
+    return users
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("sessions"):
+        # create_all builds the table with both constraints
+        return
+
+    users = _delete_duplicates(sessions.c.start_time) | _delete_duplicates(sessions.c.session_id)
+    if users:
+        for name in SESSION_ROW_TABLES:
+            if not inspector.has_table(name):
+                continue
+            rows = sa.table(name, sa.column("user_id", sa.Integer), sa.column("session_id", sa.String))
+            stored = sa.exists().where(
+                sessions.c.user_id == rows.c.user_id, sessions.c.session_id == rows.c.session_id
+            )
+            op.execute(rows.delete().where(rows.c.user_id.in_(sorted(users)), ~stored))
+        logger.warning(
+            "Removed duplicate sessions of users %s; rebuild their rollups with "
+            "scripts/backfill_rollups.py --user", sorted(users)
+        )
+
+    index = next((index for index in inspector.get_indexes("sessions") if index["name"] == START_TIME_INDEX), None)
+    if index is not None and not index["unique"]:
+        op.drop_index(START_TIME_INDEX, table_name="sessions")
+        index = None
+    if index is None:
+        op.create_index(START_TIME_INDEX, "sessions", ["user_id", "start_time"], unique=True)
+
+    if SESSION_ID_CONSTRAINT not in {c["name"] for c in inspector.get_unique_constraints("sessions")}:
+        with op.batch_alter_table("sessions") as batch_op:
+            batch_op.create_unique_constraint(SESSION_ID_CONSTRAINT, ["user_id", "session_id"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("sessions") as batch_op:
+        batch_op.drop_constraint(SESSION_ID_CONSTRAINT, type_="unique")
+    op.drop_index(START_TIME_INDEX, table_name="sessions")
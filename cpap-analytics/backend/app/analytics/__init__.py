@@ -4,5 +4,9 @@ Provides intelligent analysis and insights generation
 """
 
 from .insights_engine import InsightsEngine, SmartInsight, generate_insights
+from .batch_insights import BatchSessionFrame, generate_insights_batch
 
-__all__ = ['InsightsEngine', 'SmartInsight', 'generate_insights']
\ No newline at end of file
+__all__ = [
+    'InsightsEngine', 'SmartInsight', 'generate_insights',
+    'BatchSessionFrame', 'generate_insights_batch'
+]
\ No newline at end of file
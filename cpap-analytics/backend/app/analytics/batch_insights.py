@@ -0,0 +1,187 @@
+"""
+Batch Insights
+
+Generates insights for many users at once from one columnar frame of
+sessions: a mapping (or pandas DataFrame) with ``user_id``, ``date`` and the
+metric columns in SessionFrame.COLUMNS. Rows are sorted by (user_id, date)
+once, and the windows the analyzers read are reduced for every user in one
+grouped NumPy pass (GroupedStats over window x user groups). Only the
+per-user insight rules run in Python. Each user's windows are summed in
+date order as in SessionFrame, so output matches calling
+generate_insights() separately for each user.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from .insights_engine import InsightsEngine
+from .session_frame import COLUMNS, GroupedStats, WindowKey, WindowStats, grouped_ols_slope
+
+
+def _slice_bounds(value: Optional[int], lengths: np.ndarray, default: np.ndarray) -> np.ndarray:
+    """Per-group position of a Python slice bound (``None``, negative or positive)"""
+    if value is None:
+        return default
+    if value < 0:
+        return np.maximum(lengths + value, 0)
+    return np.minimum(value, lengths)
+
+
+class _UserFrame:
+    """SessionFrame-compatible view of one user in a BatchSessionFrame"""
+
+    def __init__(self, frame: 'BatchSessionFrame', group: int):
+        self._frame = frame
+        self._group = group
+
+    def __len__(self) -> int:
+        return int(self._frame.lengths[self._group])
+
+    def reduce_windows(self, keys: Iterable[WindowKey]) -> None:
+        # The first user's call reduces the windows of every user
+        self._frame.reduce_windows(keys)
+
+    def window(
+        self,
+        name: str,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        nonzero: bool = False
+    ) -> WindowStats:
+        return self._frame.window(name, start, stop, nonzero).at(self._group)
+
+    def trend(
+        self,
+        name: str,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        last: Optional[int] = None
+    ) -> float:
+        return float(self._frame.trend(name, start, stop, last)[self._group])
+
+
+class BatchSessionFrame:
+    """Sessions of many users sorted by (user_id, date) into contiguous groups"""
+
+    def __init__(self, columns: Mapping[str, Any]):
+        user_ids, user_codes = np.unique(np.asarray(columns['user_id']), return_inverse=True)
+        _, date_codes = np.unique(np.asarray(columns['date']), return_inverse=True)
+        # lexsort is stable, so nights sharing a date keep their input order
+        order = np.lexsort((date_codes, user_codes))
+
+        self.user_ids = user_ids
+        self.num_users = len(user_ids)
+        self.groups = user_codes[order]
+        self.lengths = np.bincount(self.groups, minlength=self.num_users)
+        self.ends = np.cumsum(self.lengths)
+        self.starts = self.ends - self.lengths
+        self.positions = np.arange(len(order)) - self.starts[self.groups]
+
+        self.columns: Dict[str, np.ndarray] = {}
+        for name in COLUMNS:
+            if name in columns:
+                # None becomes NaN, as in SessionFrame
+                self.columns[name] = np.asarray(columns[name], dtype=np.float64)[order]
+            else:
+                self.columns[name] = np.full(len(order), np.nan)
+
+        self._windows: Dict[WindowKey, GroupedStats] = {}
+        self._masks: Dict[WindowKey, np.ndarray] = {}
+        self._trends: Dict[Tuple, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.num_users
+
+    def user(self, group: int) -> _UserFrame:
+        return _UserFrame(self, group)
+
+    def _in_window(self, start: Optional[int], stop: Optional[int]) -> np.ndarray:
+        low = _slice_bounds(start, self.lengths, np.zeros_like(self.lengths))
+        high = _slice_bounds(stop, self.lengths, self.lengths)
+        return (self.positions >= low[self.groups]) & (self.positions < high[self.groups])
+
+    def _mask(self, key: WindowKey) -> np.ndarray:
+        name, start, stop, nonzero = key
+        values = self.columns[name]
+        mask = self._in_window(start, stop) & ~np.isnan(values)
+        if nonzero:
+            mask &= values != 0
+        return mask
+
+    def reduce_windows(self, keys: Iterable[WindowKey]) -> None:
+        """Reduce every window in ``keys`` not reduced yet, for every user, in one grouped pass"""
+        keys = [key for key in dict.fromkeys(keys) if key not in self._windows]
+        if not keys:
+            return
+        masks = [self._mask(key) for key in keys]
+        values = np.concatenate([self.columns[key[0]][mask] for key, mask in zip(keys, masks)])
+        groups = np.concatenate([
+            self.groups[mask] + position * self.num_users for position, mask in enumerate(masks)
+        ])
+        stats = GroupedStats.of(values, groups, len(keys) * self.num_users)
+        for position, (key, mask) in enumerate(zip(keys, masks)):
+            self._windows[key] = stats[position * self.num_users:(position + 1) * self.num_users]
+            self._masks[key] = mask
+
+    def window(
+        self,
+        name: str,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        nonzero: bool = False
+    ) -> GroupedStats:
+        """Statistics of a window of nights for all users, computed once per frame"""
+        key = (name, start, stop, nonzero)
+        if key not in self._windows:
+            self.reduce_windows([key])
+        return self._windows[key]
+
+    def trend(
+        self,
+        name: str,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        last: Optional[int] = None
+    ) -> np.ndarray:
+        """Per-user OLS slope of the last ``last`` present values in a window"""
+        key = (name, start, stop, last)
+        slopes = self._trends.get(key)
+        if slopes is not None:
+            return slopes
+
+        counts = self.window(name, start, stop).count
+        mask = self._masks[(name, start, stop, False)]
+        # 1 for the newest present value of each user, 2 for the one before, ...
+        seen = np.cumsum(mask)
+        seen_before = seen[self.starts] - mask[self.starts]
+        rank_from_end = counts[self.groups] - (seen - seen_before[self.groups]) + 1
+
+        used = np.minimum(counts, last) if last else counts
+        keep = mask & (rank_from_end <= used[self.groups])
+        groups = self.groups[keep]
+        x = (used[self.groups] - rank_from_end)[keep].astype(np.float64)
+        y = self.columns[name][keep]
+
+        # The routine behind ols_slope, so each user's slope is the per-user one
+        slopes = grouped_ols_slope(x, y, groups, self.num_users)
+
+        self._trends[key] = slopes
+        return slopes
+
+
+def generate_insights_batch(columns: Mapping[str, Any]) -> Iterator[Tuple[Any, List[Dict[str, Any]]]]:
+    """
+    Generate insights for every user in a columnar session frame.
+
+    Yields ``(user_id, insights)`` per user in user_id order, so callers can
+    stream results out without holding every user's insights at once.
+    """
+    if len(columns['user_id']) == 0:
+        return
+
+    frame = BatchSessionFrame(columns)
+    engine = InsightsEngine()
+    for group, user_id in enumerate(frame.user_ids.tolist()):
+        insights = engine.analyze_frame(frame.user(group))
+        yield user_id, [insight.to_dict() for insight in insights]
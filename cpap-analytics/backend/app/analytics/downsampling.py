@@ -0,0 +1,84 @@
+"""
+Waveform Downsampling
+
+Reduces long signals to roughly one point (or min/max pair) per pixel
+for charting.
+
+Min/max decimation keeps the extremes of every bucket, so apneas, mask
+leaks and pressure spikes stay visible at any zoom. A pyramid of min/max
+levels (each bucket PYRAMID_FACTOR times wider than the one below) lets a
+window of any length be answered from about a few thousand precomputed
+buckets instead of the raw samples. LTTB (largest triangle three buckets)
+picks actual samples that preserve the visual shape of the curve.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+# Samples per bucket of the finest pyramid level, and growth per level
+PYRAMID_BASE = 8
+PYRAMID_FACTOR = 4
+
+# Levels stop growing once they have this few buckets
+PYRAMID_MIN_BUCKETS = 256
+
+
+def bucket_starts(length: int, bucket: int) -> np.ndarray:
+    return np.arange(0, length, bucket)
+
+
+def minmax_buckets(mins: np.ndarray, maxs: np.ndarray, starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Min of ``mins`` and max of ``maxs`` over the groups beginning at ``starts``"""
+    return np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts)
+
+
+def build_pyramid(samples: np.ndarray) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    (samples per bucket, mins, maxs) for every pyramid level of a signal,
+    finest first. Each level is reduced from the one below it, so building
+    the whole pyramid reads the samples once.
+    """
+    levels = []
+    if samples.size <= PYRAMID_BASE:
+        return levels
+    bucket = PYRAMID_BASE
+    mins, maxs = minmax_buckets(samples, samples, bucket_starts(samples.size, bucket))
+    levels.append((bucket, mins, maxs))
+    while mins.size > PYRAMID_MIN_BUCKETS:
+        bucket *= PYRAMID_FACTOR
+        mins, maxs = minmax_buckets(mins, maxs, bucket_starts(mins.size, PYRAMID_FACTOR))
+        levels.append((bucket, mins, maxs))
+    return levels
+
+
+def pixel_starts(count: int, width: int) -> np.ndarray:
+    """Start index of each of ``width`` near-equal groups over ``count`` items"""
+    return np.unique(np.linspace(0, count, min(width, count), endpoint=False).astype(np.int64))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the ``threshold`` points chosen by Largest-Triangle-Three-
+    Buckets: first and last points are kept, and from every bucket in
+    between the point forming the largest triangle with the previously
+    chosen point and the average of the next bucket.
+    """
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    chosen = np.empty(threshold, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean() if next_stop > stop else x[-1]
+        next_y = y[stop:next_stop].mean() if next_stop > stop else y[-1]
+        px, py = x[previous], y[previous]
+        areas = np.abs((px - next_x) * (y[start:stop] - py) - (px - x[start:stop]) * (next_y - py))
+        previous = start + int(np.argmax(areas))
+        chosen[i + 1] = previous
+    return chosen
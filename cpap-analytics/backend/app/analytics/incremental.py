@@ -0,0 +1,119 @@
+"""
+Incremental Insights
+
+Per-user analyzer state that is updated one night at a time instead of
+re-sorting and re-scanning the whole session history on every request.
+
+No analyzer looks further back than RECENT_NIGHTS nights except for whole
+history statistics, so the state is a bounded buffer of the most recent
+nights plus running totals (count, sum, sum of squares, min/max, compliant
+nights) per metric, accumulated in date order as SessionFrame sums them. Adding a night is O(1) and so is generating insights from the
+state. Nights must be added in date order; anything else (a backfilled,
+edited or deleted night) requires rebuilding the state from scratch.
+"""
+
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from .insights_engine import InsightsEngine
+from .session_frame import COLUMNS, COMPLIANT_HOURS, SessionFrame, WindowKey, WindowStats
+
+# Longest trailing window read by any analyzer (quality history: nights -30..-7)
+RECENT_NIGHTS = 30
+
+
+class RunningStats(WindowStats):
+    """Running statistics of one metric over a user's whole history"""
+
+    def __init__(self, nonzero: bool = False):
+        super().__init__()
+        self.nonzero = nonzero
+
+    def add(self, value: Optional[float]) -> None:
+        if value is None or math.isnan(value) or (self.nonzero and value == 0):
+            return
+        value = float(value)
+        self.count += 1
+        self.total += value
+        self.sumsq += value * value
+        if value >= COMPLIANT_HOURS:
+            self.compliant_count += 1
+        if self.count == 1:
+            self.minimum = self.maximum = value
+        else:
+            self.minimum = min(self.minimum, value)
+            self.maximum = max(self.maximum, value)
+
+
+class IncrementalFrame(SessionFrame):
+    """
+    SessionFrame over the recent-night buffer of an InsightState.
+
+    ``len()`` is the full history length; whole-history windows are served
+    from the running totals and trailing windows from the buffer.
+    """
+
+    def __init__(self, state: 'InsightState'):
+        super().__init__(SessionFrame.from_sessions(list(state.recent)).columns)
+        self.state = state
+
+    def __len__(self) -> int:
+        return self.state.total_sessions
+
+    def reduce_windows(self, keys: Iterable[WindowKey]) -> None:
+        super().reduce_windows(key for key in keys if key[1:3] != (None, None))
+
+    def window(
+        self,
+        name: str,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        nonzero: bool = False
+    ):
+        if start is None and stop is None:
+            return self.state.lifetime[(name, nonzero)]
+        if start is None or start < -RECENT_NIGHTS or start >= 0:
+            raise ValueError(f"Window [{start}:{stop}] reaches beyond the last {RECENT_NIGHTS} nights")
+        return super().window(name, start, stop, nonzero)
+
+
+class InsightState:
+    """Analyzer state for one user, built by adding nights in date order"""
+
+    def __init__(self):
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=RECENT_NIGHTS)
+        self.total_sessions = 0
+        self.lifetime: Dict[tuple, RunningStats] = {
+            (name, nonzero): RunningStats(nonzero) for name in COLUMNS for nonzero in (False, True)
+        }
+        # Opaque ordering key of the newest night (e.g. (start_time, id))
+        self.newest_key: Any = None
+        self._insights: Optional[List[Dict[str, Any]]] = None
+
+    def can_add(self, key: Any) -> bool:
+        """True if a night with ordering ``key`` sorts after every night already added"""
+        return self.newest_key is None or key > self.newest_key
+
+    def add(self, session: Dict[str, Any], key: Any = None) -> None:
+        """Fold one night (a session dict as passed to generate_insights) into the state"""
+        if key is not None:
+            if not self.can_add(key):
+                raise ValueError("Sessions must be added in date order; rebuild the state instead")
+            self.newest_key = key
+
+        self.recent.append({name: session.get(name) for name in ('date',) + COLUMNS})
+        self.total_sessions += 1
+        for (name, _), stats in self.lifetime.items():
+            stats.add(session.get(name))
+        self._insights = None
+
+    def insights(self) -> List[Dict[str, Any]]:
+        """Insights for the current state, identical to generate_insights() over every night added"""
+        if self._insights is None:
+            if not self.total_sessions:
+                self._insights = []
+            else:
+                engine = InsightsEngine()
+                self._insights = [insight.to_dict() for insight in engine.analyze_frame(IncrementalFrame(self))]
+        return self._insights
@@ -6,9 +6,10 @@ Transforms raw data into actionable intelligence and personalized recommendation
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta, date
 from enum import Enum
-import statistics
 import math
 
+from .session_frame import SessionFrame
+
 class InsightType(str, Enum):
     ACHIEVEMENT = "achievement"
     IMPROVEMENT = "improvement"
@@ -67,6 +68,22 @@ class SmartInsight:
 
 class InsightsEngine:
     """AI-powered insights engine for CPAP therapy analysis"""
+
+    # Every (column, start, stop, nonzero) window the analysis modules read,
+    # reduced together in one pass per frame
+    WINDOWS = (
+        ('duration_hours', -7, None, False),
+        ('duration_hours', -7, None, True),
+        ('duration_hours', -14, None, True),
+        ('ahi', None, None, False),
+        ('ahi', -5, None, False),
+        ('ahi', -14, None, False),
+        ('ahi', -15, -5, False),
+        ('quality_score', -7, None, True),
+        ('quality_score', -30, -7, True),
+        ('mask_leak', -7, None, False),
+        ('pressure_avg', -14, None, True),
+    )
     
     def __init__(self):
         self.insights = []
@@ -78,40 +95,49 @@ class InsightsEngine:
         """
         if not sessions:
             return []
-            
-        self.insights = []
         
-        # Sort sessions by date for trend analysis
-        sorted_sessions = sorted(sessions, key=lambda x: x['date'])
+        # Sort sessions by date and convert them to columns once; every
+        # analysis module reads (and shares window statistics from) the frame
+        return self.analyze_frame(SessionFrame.from_sessions(sessions))
+    
+    def analyze_frame(self, frame: SessionFrame) -> List[SmartInsight]:
+        """
+        Run every analysis module over one user's sessions.
+
+        ``frame`` is a SessionFrame or any object with the same ``len()``,
+        ``reduce_windows()``, ``window()`` and ``trend()`` interface (see
+        BatchSessionFrame).
+        """
+        self.insights = []
+        frame.reduce_windows(self.WINDOWS)
         
         # Run all analysis modules
-        self._analyze_compliance_trends(sorted_sessions)
-        self._analyze_ahi_patterns(sorted_sessions)
-        self._analyze_therapy_quality(sorted_sessions)
-        self._analyze_equipment_performance(sorted_sessions)
-        self._analyze_sleep_duration_patterns(sorted_sessions)
-        self._detect_concerning_patterns(sorted_sessions)
-        self._generate_achievements(sorted_sessions)
-        self._suggest_optimizations(sorted_sessions)
+        self._analyze_compliance_trends(frame)
+        self._analyze_ahi_patterns(frame)
+        self._analyze_therapy_quality(frame)
+        self._analyze_equipment_performance(frame)
+        self._analyze_sleep_duration_patterns(frame)
+        self._detect_concerning_patterns(frame)
+        self._generate_achievements(frame)
+        self._suggest_optimizations(frame)
         
         # Sort by priority and clinical relevance
         self.insights.sort(key=lambda x: (x.priority, x.clinical_relevance == ClinicalRelevance.HIGH), reverse=True)
         
         return self.insights[:8]  # Return top 8 insights
     
-    def _analyze_compliance_trends(self, sessions: List[Dict[str, Any]]):
+    def _analyze_compliance_trends(self, frame: SessionFrame):
         """Analyze therapy compliance patterns"""
-        if len(sessions) < 7:
+        if len(frame) < 7:
             return
             
-        recent_week = sessions[-7:]
-        compliance_hours = [s['duration_hours'] for s in recent_week if s['duration_hours']]
+        recent_week = frame.window('duration_hours', -7, nonzero=True)
         
-        if not compliance_hours:
+        if not recent_week.count:
             return
             
-        avg_compliance = statistics.mean(compliance_hours)
-        compliance_rate = len([h for h in compliance_hours if h >= 4]) / len(compliance_hours) * 100
+        avg_compliance = recent_week.mean
+        compliance_rate = recent_week.compliance_rate
         
         if compliance_rate >= 85:
             if avg_compliance >= 7:
@@ -155,17 +181,17 @@ class InsightsEngine:
                 priority=10
             ))
     
-    def _analyze_ahi_patterns(self, sessions: List[Dict[str, Any]]):
+    def _analyze_ahi_patterns(self, frame: SessionFrame):
         """Analyze AHI trends and effectiveness"""
-        if len(sessions) < 14:
+        if len(frame) < 14:
             return
             
-        recent_ahis = [s['ahi'] for s in sessions[-14:] if s['ahi'] is not None]
-        if len(recent_ahis) < 7:
+        recent_ahis = frame.window('ahi', -14)
+        if recent_ahis.count < 7:
             return
             
-        avg_ahi = statistics.mean(recent_ahis)
-        recent_trend = self._calculate_trend(recent_ahis[-7:])
+        avg_ahi = recent_ahis.mean
+        recent_trend = frame.trend('ahi', -14, last=7)
         
         if avg_ahi < 5:
             if recent_trend < -0.5:
@@ -205,19 +231,19 @@ class InsightsEngine:
                 priority=9
             ))
     
-    def _analyze_therapy_quality(self, sessions: List[Dict[str, Any]]):
+    def _analyze_therapy_quality(self, frame: SessionFrame):
         """Analyze overall therapy quality and improvements"""
-        if len(sessions) < 10:
+        if len(frame) < 10:
             return
             
-        recent_quality = [s.get('quality_score', 0) for s in sessions[-7:] if s.get('quality_score')]
-        historical_quality = [s.get('quality_score', 0) for s in sessions[-30:-7] if s.get('quality_score')]
+        recent_quality = frame.window('quality_score', -7, nonzero=True)
+        historical_quality = frame.window('quality_score', -30, -7, nonzero=True)
         
-        if not recent_quality or not historical_quality:
+        if not recent_quality.count or not historical_quality.count:
             return
             
-        recent_avg = statistics.mean(recent_quality)
-        historical_avg = statistics.mean(historical_quality)
+        recent_avg = recent_quality.mean
+        historical_avg = historical_quality.mean
         improvement = recent_avg - historical_avg
         
         if improvement > 5:
@@ -242,16 +268,14 @@ class InsightsEngine:
                 priority=4
             ))
     
-    def _analyze_equipment_performance(self, sessions: List[Dict[str, Any]]):
+    def _analyze_equipment_performance(self, frame: SessionFrame):
         """Analyze mask leaks and equipment issues"""
-        recent_sessions = sessions[-7:]
-        leaks = [s.get('mask_leak', 0) for s in recent_sessions if s.get('mask_leak') is not None]
+        leaks = frame.window('mask_leak', -7)
         
-        if not leaks:
+        if not leaks.count:
             return
             
-        avg_leak = statistics.mean(leaks)
-        high_leak_nights = len([l for l in leaks if l > 24])
+        avg_leak = leaks.mean
         
         if avg_leak > 24:
             self.insights.append(SmartInsight(
@@ -279,19 +303,19 @@ class InsightsEngine:
                 priority=2
             ))
     
-    def _analyze_sleep_duration_patterns(self, sessions: List[Dict[str, Any]]):
+    def _analyze_sleep_duration_patterns(self, frame: SessionFrame):
         """Analyze sleep duration patterns and recommendations"""
-        if len(sessions) < 7:
+        if len(frame) < 7:
             return
             
-        durations = [s['duration_hours'] for s in sessions[-14:] if s['duration_hours']]
-        if not durations:
+        durations = frame.window('duration_hours', -14, nonzero=True)
+        if not durations.count:
             return
             
-        avg_duration = statistics.mean(durations)
-        consistency = statistics.stdev(durations) if len(durations) > 1 else 0
+        avg_duration = durations.mean
         
-        if avg_duration >= 8 and consistency < 1:
+        # Consistency (stdev) only matters for long sleepers, so it is only computed for them
+        if avg_duration >= 8 and durations.stdev < 1:
             self.insights.append(SmartInsight(
                 InsightType.ACHIEVEMENT,
                 "😴 Optimal Sleep Pattern",
@@ -317,22 +341,21 @@ class InsightsEngine:
                 priority=6
             ))
     
-    def _detect_concerning_patterns(self, sessions: List[Dict[str, Any]]):
+    def _detect_concerning_patterns(self, frame: SessionFrame):
         """Detect patterns that need clinical attention"""
-        if len(sessions) < 5:
+        if len(frame) < 5:
             return
             
-        # Check for sudden changes
-        recent_data = sessions[-5:]
-        
-        # Sudden AHI increase
-        recent_ahis = [s['ahi'] for s in recent_data if s['ahi'] is not None]
-        if len(recent_ahis) >= 3:
-            if max(recent_ahis) > 15 and any(ahi < 8 for ahi in sessions[-15:-5] if sessions[-15:-5]):
+        # Sudden AHI increase: a spike in the last 5 nights after well
+        # controlled nights in the 10 before them
+        recent_ahis = frame.window('ahi', -5)
+        if recent_ahis.count >= 3:
+            earlier_ahis = frame.window('ahi', -15, -5)
+            if recent_ahis.maximum > 15 and earlier_ahis.count and earlier_ahis.minimum < 8:
                 self.insights.append(SmartInsight(
                     InsightType.ALERT,
                     "⚠️ Sudden AHI Increase",
-                    f"Your AHI spiked to {max(recent_ahis):.1f} recently. This sudden change warrants investigation.",
+                    f"Your AHI spiked to {recent_ahis.maximum:.1f} recently. This sudden change warrants investigation.",
                     ConfidenceLevel.HIGH,
                     ClinicalRelevance.HIGH,
                     next_steps=[
@@ -344,13 +367,14 @@ class InsightsEngine:
                     priority=8
                 ))
     
-    def _generate_achievements(self, sessions: List[Dict[str, Any]]):
+    def _generate_achievements(self, frame: SessionFrame):
         """Generate milestone achievements and positive reinforcement"""
-        total_sessions = len(sessions)
+        total_sessions = len(frame)
         
         # Milestone achievements
-        if total_sessions >= 30:
-            avg_ahi = statistics.mean([s['ahi'] for s in sessions if s['ahi'] is not None])
+        all_ahis = frame.window('ahi')
+        if total_sessions >= 30 and all_ahis.count:
+            avg_ahi = all_ahis.mean
             if avg_ahi < 5:
                 self.insights.append(SmartInsight(
                     InsightType.ACHIEVEMENT,
@@ -363,8 +387,8 @@ class InsightsEngine:
                 ))
         
         # Weekly streak
-        if len(sessions) >= 7:
-            week_compliance = len([s for s in sessions[-7:] if s['duration_hours'] >= 4])
+        if total_sessions >= 7:
+            week_compliance = frame.window('duration_hours', -7).compliant_count
             if week_compliance == 7:
                 self.insights.append(SmartInsight(
                     InsightType.ACHIEVEMENT,
@@ -376,24 +400,21 @@ class InsightsEngine:
                     priority=4
                 ))
     
-    def _suggest_optimizations(self, sessions: List[Dict[str, Any]]):
+    def _suggest_optimizations(self, frame: SessionFrame):
         """Generate optimization suggestions based on data patterns"""
-        if len(sessions) < 14:
+        if len(frame) < 14:
             return
             
-        # Analyze patterns for optimization opportunities
-        recent_sessions = sessions[-14:]
-        
         # Pressure optimization opportunity
-        pressures = [s.get('pressure_avg', 0) for s in recent_sessions if s.get('pressure_avg')]
-        ahis = [s['ahi'] for s in recent_sessions if s['ahi'] is not None]
+        pressures = frame.window('pressure_avg', -14, nonzero=True)
+        ahis = frame.window('ahi', -14)
         
-        if pressures and ahis and len(pressures) == len(ahis):
-            if statistics.mean(ahis) > 7 and statistics.mean(pressures) < 12:
+        if pressures.count and ahis.count and pressures.count == ahis.count:
+            if ahis.mean > 7 and pressures.mean < 12:
                 self.insights.append(SmartInsight(
                     InsightType.RECOMMENDATION,
                     "🔧 Pressure Optimization Opportunity",
-                    f"Your AHI averages {statistics.mean(ahis):.1f} with pressure at {statistics.mean(pressures):.1f} cmH₂O. A pressure adjustment might improve therapy.",
+                    f"Your AHI averages {ahis.mean:.1f} with pressure at {pressures.mean:.1f} cmH₂O. A pressure adjustment might improve therapy.",
                     ConfidenceLevel.MEDIUM,
                     ClinicalRelevance.HIGH,
                     next_steps=[
@@ -404,25 +425,6 @@ class InsightsEngine:
                     ],
                     priority=6
                 ))
-    
-    def _calculate_trend(self, values: List[float]) -> float:
-        """Calculate linear trend direction for a series of values"""
-        if len(values) < 2:
-            return 0
-            
-        x_values = list(range(len(values)))
-        n = len(values)
-        
-        sum_x = sum(x_values)
-        sum_y = sum(values)
-        sum_xy = sum(x * y for x, y in zip(x_values, values))
-        sum_x2 = sum(x * x for x in x_values)
-        
-        try:
-            slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x * sum_x)
-            return slope
-        except ZeroDivisionError:
-            return 0
 
 # Helper function for API endpoint
 def generate_insights(sessions_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
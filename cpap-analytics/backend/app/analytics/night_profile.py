@@ -0,0 +1,184 @@
+"""
+Hour-of-Night Profiles
+
+Bins a night's leak samples and respiratory events by hour, two ways: by
+hours since mask on (the start of the session) and by clock hour. Per
+hour a profile keeps seconds of use, seconds and sum of leak samples,
+seconds of large leak and event counts, all additive: the profile of 90
+nights is the sum of the nightly profiles, so it is built from cached
+nightly profiles without touching any samples.
+
+Hours since mask on are contiguous runs of samples and are summed with
+np.add.reduceat; clock hours wrap at midnight and use np.bincount.
+Anything past MASK_ON_HOURS lands in the last bin.
+"""
+
+import datetime
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+MASK_ON_HOURS = 12
+CLOCK_HOURS = 24
+
+# Binning -> number of hourly bins
+BINNINGS = {
+    "since_mask_on": MASK_ON_HOURS,
+    "clock_hour": CLOCK_HOURS
+}
+
+# Leak above this (L/min) counts as large leak
+LARGE_LEAK = 24.0
+
+# Respiratory events counted per hour
+EVENT_KINDS = ("obstructive_apneas", "central_apneas", "hypopneas", "unclassified_apneas")
+
+# Per-hour arrays; usage is the only one two files of the same night both know
+LEAK_FIELDS = ("leak_seconds", "leak_sum", "large_leak_seconds")
+FIELDS = ("usage_seconds",) + LEAK_FIELDS + EVENT_KINDS
+
+
+def _seconds_of_day(start_time: datetime.datetime) -> float:
+    return start_time.hour * 3600 + start_time.minute * 60 + start_time.second + start_time.microsecond / 1e6
+
+
+def _bins(offsets: np.ndarray, start_time: datetime.datetime, binning: str) -> np.ndarray:
+    """Hour bin of offsets (seconds from mask on)"""
+    if binning == "since_mask_on":
+        return np.minimum(offsets // 3600, MASK_ON_HOURS - 1).astype(np.int64)
+    return ((offsets + _seconds_of_day(start_time)) // 3600 % CLOCK_HOURS).astype(np.int64)
+
+
+def _empty(binning: str) -> Dict[str, np.ndarray]:
+    return {name: np.zeros(BINNINGS[binning]) for name in FIELDS}
+
+
+@dataclass(eq=False)
+class NightProfile:
+    """Hourly totals of one night (or the sum of several)"""
+    nights: int = 1
+    hours: Dict[str, Dict[str, np.ndarray]] = field(
+        default_factory=lambda: {binning: _empty(binning) for binning in BINNINGS}
+    )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, NightProfile):
+            return NotImplemented
+        return self.nights == other.nights and all(
+            np.array_equal(arrays[name], other.hours[binning][name])
+            for binning, arrays in self.hours.items() for name in FIELDS
+        )
+
+    @classmethod
+    def for_session(
+        cls,
+        start_time: datetime.datetime,
+        duration_seconds: float,
+        leak: Optional[np.ndarray] = None,
+        leak_rate: float = 0.0,
+        events: Optional[Dict[str, Sequence[float]]] = None
+    ) -> "NightProfile":
+        """
+        Profile of a session from ``leak`` samples (L/min at ``leak_rate`` Hz)
+        and/or event onsets (seconds from the start, per EVENT_KINDS kind).
+        """
+        profile = cls()
+        usage_offsets = np.arange(int(np.ceil(duration_seconds)), dtype=np.float64)
+        for binning, arrays in profile.hours.items():
+            size = BINNINGS[binning]
+            arrays["usage_seconds"] = np.bincount(
+                _bins(usage_offsets, start_time, binning), minlength=size
+            ).astype(np.float64)[:size]
+            for kind, onsets in (events or {}).items():
+                onsets = np.asarray(onsets, dtype=np.float64)
+                arrays[kind] = np.bincount(_bins(onsets, start_time, binning), minlength=size).astype(np.float64)
+
+        if leak is not None and leak.size and leak_rate > 0:
+            profile._add_leak(np.asarray(leak, dtype=np.float64).reshape(-1), leak_rate, start_time)
+        return profile
+
+    def _add_leak(self, leak: np.ndarray, rate: float, start_time: datetime.datetime) -> None:
+        seconds = 1.0 / rate
+        large = (leak > LARGE_LEAK).astype(np.float64)
+
+        # Hours since mask on: contiguous runs of samples, one reduceat per field
+        per_hour = int(round(3600 * rate))
+        starts = np.arange(0, min(leak.size, per_hour * MASK_ON_HOURS), per_hour)
+        arrays = self.hours["since_mask_on"]
+        count = starts.size
+        lengths = np.diff(np.append(starts, leak.size))
+        arrays["leak_seconds"][:count] += lengths * seconds
+        arrays["leak_sum"][:count] += np.add.reduceat(leak, starts) * seconds
+        arrays["large_leak_seconds"][:count] += np.add.reduceat(large, starts) * seconds
+
+        # Clock hours wrap at midnight
+        hours = _bins(np.arange(leak.size) * seconds, start_time, "clock_hour")
+        arrays = self.hours["clock_hour"]
+        arrays["leak_seconds"] += np.bincount(hours, minlength=CLOCK_HOURS) * seconds
+        arrays["leak_sum"] += np.bincount(hours, leak, minlength=CLOCK_HOURS) * seconds
+        arrays["large_leak_seconds"] += np.bincount(hours, large, minlength=CLOCK_HOURS) * seconds
+
+    def combine_partial(self, other: "NightProfile") -> "NightProfile":
+        """
+        Profile of one night from profiles of two of its files (e.g. PLD
+        leak and EVE events): both cover the same usage, the rest adds up.
+        """
+        hours = {}
+        for binning, arrays in self.hours.items():
+            theirs = other.hours[binning]
+            hours[binning] = {name: values + theirs[name] for name, values in arrays.items()}
+            hours[binning]["usage_seconds"] = np.maximum(arrays["usage_seconds"], theirs["usage_seconds"])
+        return NightProfile(nights=max(self.nights, other.nights), hours=hours)
+
+    @classmethod
+    def total(cls, profiles: Iterable["NightProfile"]) -> "NightProfile":
+        """Sum of the profiles of different nights"""
+        result = cls(nights=0)
+        for profile in profiles:
+            result.nights += profile.nights
+            for binning, arrays in result.hours.items():
+                for name in FIELDS:
+                    arrays[name] += profile.hours[binning][name]
+        return result
+
+    def to_json(self) -> Dict[str, Any]:
+        """Plain form for storage"""
+        return {
+            "nights": self.nights,
+            "hours": {
+                binning: {name: [round(float(value), 3) for value in values] for name, values in arrays.items()}
+                for binning, arrays in self.hours.items()
+            }
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "NightProfile":
+        hours = {}
+        for binning in BINNINGS:
+            stored = data["hours"].get(binning, {})
+            hours[binning] = {
+                name: np.asarray(stored[name], dtype=np.float64) if name in stored else np.zeros(BINNINGS[binning])
+                for name in FIELDS
+            }
+        return cls(nights=data["nights"], hours=hours)
+
+    def summary(self, binning: str) -> List[Dict[str, Any]]:
+        """Per hour: hours of use, mean leak, share of large leak and events per hour of use"""
+        arrays = self.hours[binning]
+        rows = []
+        for hour in range(BINNINGS[binning]):
+            usage_hours = arrays["usage_seconds"][hour] / 3600
+            leak_seconds = arrays["leak_seconds"][hour]
+            events = {kind: int(arrays[kind][hour]) for kind in EVENT_KINDS}
+            rows.append({
+                "hour": hour,
+                "usage_hours": round(usage_hours, 2),
+                "leak_avg": round(arrays["leak_sum"][hour] / leak_seconds, 2) if leak_seconds else None,
+                "large_leak_percent": (
+                    round(arrays["large_leak_seconds"][hour] / leak_seconds * 100, 1) if leak_seconds else None
+                ),
+                "events": events,
+                "event_index": round(sum(events.values()) / usage_hours, 2) if usage_hours else None
+            })
+        return rows
@@ -0,0 +1,208 @@
+"""
+Columnar Session Frame
+
+Converts a list of session dicts into date-sorted NumPy columns once, so
+every insight analyzer reads the same arrays instead of re-walking the
+dicts. Missing values (``None``) are stored as NaN.
+
+The windows of nights the analyzers read (InsightsEngine.WINDOWS) are
+reduced together in one grouped ``np.bincount`` pass to a count, sum and
+sum of squares each, from which WindowStats derives the mean and standard
+deviation. BatchSessionFrame runs the same pass for many users at once;
+each window is summed in date order either way, so both give the same
+figures for a user.
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Session dict keys loaded into columns
+COLUMNS = ('duration_hours', 'ahi', 'quality_score', 'mask_leak', 'pressure_avg')
+
+# Nightly usage (hours) that counts as compliant
+COMPLIANT_HOURS = 4
+
+# (column, start, stop, nonzero) of a window of nights
+WindowKey = Tuple[str, Optional[int], Optional[int], bool]
+
+
+def grouped_ols_slope(x: np.ndarray, y: np.ndarray, groups: np.ndarray, num_groups: int) -> np.ndarray:
+    """
+    Least-squares slope of ``y`` against ``x`` per group id (0 for groups
+    with fewer than two points). Sums are accumulated in input order, so a
+    group's slope does not depend on the other groups.
+    """
+    n = np.bincount(groups, minlength=num_groups).astype(np.float64)
+    sum_x = np.bincount(groups, weights=x, minlength=num_groups)
+    sum_y = np.bincount(groups, weights=y, minlength=num_groups)
+    sum_xy = np.bincount(groups, weights=x * y, minlength=num_groups)
+    sum_x2 = np.bincount(groups, weights=x * x, minlength=num_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x * sum_x)
+    slopes[n < 2] = 0
+    return slopes
+
+
+def ols_slope(values: np.ndarray) -> float:
+    """Least-squares slope of ``values`` against their position (0, 1, 2, ...)"""
+    values = np.asarray(values, dtype=np.float64)
+    positions = np.arange(len(values), dtype=np.float64)
+    return float(grouped_ols_slope(positions, values, np.zeros(len(values), dtype=np.intp), 1)[0])
+
+
+class WindowStats:
+    """Count, sum, sum of squares, extremes and compliant nights of the valid values in one window"""
+
+    def __init__(
+        self,
+        count: int = 0,
+        total: float = 0.0,
+        sumsq: float = 0.0,
+        minimum: float = math.nan,
+        maximum: float = math.nan,
+        compliant_count: int = 0
+    ):
+        self.count = int(count)
+        self.total = float(total)
+        self.sumsq = float(sumsq)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.compliant_count = int(compliant_count)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    @property
+    def stdev(self) -> float:
+        """Sample standard deviation from the sums (0 for fewer than two values)"""
+        if self.count < 2:
+            return 0.0
+        variance = (self.sumsq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    @property
+    def compliance_rate(self) -> float:
+        """Percentage of values at or above COMPLIANT_HOURS"""
+        if not self.count:
+            return math.nan
+        return self.compliant_count / self.count * 100
+
+
+class GroupedStats:
+    """WindowStats inputs for many groups (windows, or windows of many users) as arrays"""
+
+    def __init__(self, count, total, sumsq, minimum, maximum, compliant_count):
+        self.count = count
+        self.total = total
+        self.sumsq = sumsq
+        self.minimum = minimum
+        self.maximum = maximum
+        self.compliant_count = compliant_count
+
+    @classmethod
+    def of(cls, values: np.ndarray, groups: np.ndarray, num_groups: int) -> 'GroupedStats':
+        """Reduce ``values`` per group id in one pass, each group summed in input order"""
+        minimum = np.full(num_groups, np.inf)
+        maximum = np.full(num_groups, -np.inf)
+        np.minimum.at(minimum, groups, values)
+        np.maximum.at(maximum, groups, values)
+        count = np.bincount(groups, minlength=num_groups)
+        minimum[count == 0] = np.nan
+        maximum[count == 0] = np.nan
+        return cls(
+            count,
+            np.bincount(groups, weights=values, minlength=num_groups),
+            np.bincount(groups, weights=values * values, minlength=num_groups),
+            minimum,
+            maximum,
+            np.bincount(groups[values >= COMPLIANT_HOURS], minlength=num_groups)
+        )
+
+    def __getitem__(self, groups: slice) -> 'GroupedStats':
+        return GroupedStats(
+            self.count[groups], self.total[groups], self.sumsq[groups],
+            self.minimum[groups], self.maximum[groups], self.compliant_count[groups]
+        )
+
+    def at(self, group: int) -> WindowStats:
+        return WindowStats(
+            self.count[group], self.total[group], self.sumsq[group],
+            self.minimum[group], self.maximum[group], self.compliant_count[group]
+        )
+
+
+class SessionFrame:
+    """Date-sorted, columnar view of one user's sessions"""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+        self._length = len(next(iter(columns.values()))) if columns else 0
+        self._windows: Dict[WindowKey, WindowStats] = {}
+
+    @classmethod
+    def from_sessions(cls, sessions: List[Dict[str, Any]]) -> 'SessionFrame':
+        """Sort sessions by ``date`` and load each metric as a float64 column"""
+        ordered = sorted(sessions, key=lambda x: x['date'])
+        return cls({
+            name: np.array([s.get(name) for s in ordered], dtype=np.float64).reshape(-1)
+            for name in COLUMNS
+        })
+
+    def __len__(self) -> int:
+        return self._length
+
+    def column(self, name: str, start: Optional[int] = None, stop: Optional[int] = None) -> np.ndarray:
+        """Raw column slice, NaN where the session had no value"""
+        return self.columns[name][start:stop]
+
+    def valid(
+        self,
+        name: str,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        nonzero: bool = False
+    ) -> np.ndarray:
+        """Present values of a column slice; ``nonzero`` also drops zeros (falsy values)"""
+        values = self.column(name, start, stop)
+        mask = ~np.isnan(values)
+        if nonzero:
+            mask &= values != 0
+        return values[mask]
+
+    def reduce_windows(self, keys: Iterable[WindowKey]) -> None:
+        """Reduce every window in ``keys`` not reduced yet, together in one grouped pass"""
+        keys = [key for key in dict.fromkeys(keys) if key not in self._windows]
+        if not keys:
+            return
+        parts = [self.valid(*key) for key in keys]
+        groups = np.repeat(np.arange(len(keys)), [len(part) for part in parts])
+        stats = GroupedStats.of(np.concatenate(parts), groups, len(keys))
+        for position, key in enumerate(keys):
+            self._windows[key] = stats.at(position)
+
+    def window(
+        self,
+        name: str,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        nonzero: bool = False
+    ) -> WindowStats:
+        """Statistics for a window of nights, computed once per frame"""
+        key = (name, start, stop, nonzero)
+        if key not in self._windows:
+            self.reduce_windows([key])
+        return self._windows[key]
+
+    def trend(
+        self,
+        name: str,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        last: Optional[int] = None
+    ) -> float:
+        """OLS slope of the last ``last`` present values in a window of nights"""
+        values = self.valid(name, start, stop)
+        return ols_slope(values[-last:] if last else values)
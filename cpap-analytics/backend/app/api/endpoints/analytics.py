@@ -3,13 +3,40 @@ CPAP Analytics Platform - Analytics Endpoints
 API endpoints for CPAP data analytics and insights
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-from datetime import datetime, date
+from datetime import MAXYEAR, MINYEAR, datetime, date, timedelta
+from itertools import groupby
 from pydantic import BaseModel
+import calendar
+import numpy as np
+
+from app.analytics.session_frame import ols_slope
+from app.core.database import get_db
+from app.core.query_budget import query_budget
+from app.core.security import get_current_active_user
+from app.models.session_rollup import SessionRollup
+from app.models.user import User as UserModel
+from app.services.night_profiles import range_profile
+from app.services.rollups import COMPLIANT_HOURS, covering_rollups, period_rollups, period_end, period_start
+from app.services.session_sketches import range_percentiles
 
 router = APIRouter()
 
+# Trend granularity -> rollup period
+GRANULARITIES = {
+    "daily": SessionRollup.PERIOD_DAY,
+    "weekly": SessionRollup.PERIOD_WEEK,
+    "monthly": SessionRollup.PERIOD_MONTH
+}
+
+# Weekly AHI slope (events/hour per week) treated as a real change
+AHI_TREND_THRESHOLD = 0.1
+
+# Hours of use counted as a full night for sleep efficiency
+TARGET_SLEEP_HOURS = 8.0
+
 class TrendData(BaseModel):
     """Trend data model"""
     date: date
@@ -32,44 +59,143 @@ class SleepQualityMetrics(BaseModel):
     leak_rate_average: float
     sleep_efficiency: float
 
+def _value(value: Optional[float], digits: int = 1) -> float:
+    """Round a rollup statistic for a response (0 when there is no data)"""
+    return round(value, digits) if value is not None else 0.0
+
+def _trend_value(rollup: SessionRollup, metric: str) -> Optional[float]:
+    if metric == "ahi":
+        return rollup.mean("ahi")
+    if metric == "usage_hours":
+        return rollup.usage_hours
+    if metric == "pressure":
+        return rollup.mean("pressure")
+    if metric == "leak_rate":
+        return rollup.mean("leak")
+    return rollup.compliance_rate
+
+def _ahi_trend(weeks: List[SessionRollup]) -> str:
+    """Direction of the weekly average AHI"""
+    weekly_ahi = [week.mean("ahi") for week in weeks if week.ahi_count]
+    slope = ols_slope(np.array(weekly_ahi, dtype=np.float64))
+    if slope < -AHI_TREND_THRESHOLD:
+        return "improving"
+    if slope > AHI_TREND_THRESHOLD:
+        return "worsening"
+    return "stable"
+
+def _period_summary(rollup: SessionRollup) -> Dict[str, float]:
+    return {
+        "compliance_rate": _value(rollup.compliance_rate),
+        "average_ahi": _value(rollup.mean("ahi")),
+        "average_usage": _value(rollup.usage_hours)
+    }
+
 @router.get("/compliance", response_model=ComplianceMetrics)
-async def get_compliance_metrics(
+@query_budget(2)
+def get_compliance_metrics(
     start_date: Optional[date] = None,
-    end_date: Optional[date] = None
+    end_date: Optional[date] = None,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ):
     """Get CPAP compliance metrics"""
-    # Mock data - in real implementation, this would calculate from database
+    totals = SessionRollup.combine(covering_rollups(db, current_user.id, start_date, end_date))
     return ComplianceMetrics(
-        compliance_rate=94.3,
-        total_nights=90,
-        compliant_nights=85,
-        average_usage_hours=7.8,
-        target_hours=4.0
+        compliance_rate=_value(totals.compliance_rate),
+        total_nights=totals.night_count,
+        compliant_nights=totals.compliant_nights,
+        average_usage_hours=_value(totals.usage_hours),
+        target_hours=COMPLIANT_HOURS
     )
 
 @router.get("/sleep-quality", response_model=SleepQualityMetrics)
-async def get_sleep_quality_metrics(
+@query_budget(3)
+def get_sleep_quality_metrics(
     start_date: Optional[date] = None,
-    end_date: Optional[date] = None
+    end_date: Optional[date] = None,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ):
-    """Get sleep quality metrics"""
-    # Mock data
+    """
+    Get sleep quality metrics.
+
+    pressure_optimization is the share of nights whose AHI mean is below 5
+    and sleep_efficiency the average usage as a share of an 8 hour night.
+    The AHI trend runs over ISO weeks clipped to the requested range.
+    """
+    days = period_rollups(db, current_user.id, SessionRollup.PERIOD_DAY, start_date, end_date)
+    # Weeks built from the range's days, so nights outside it are not counted
+    weeks = [
+        SessionRollup.combine(week_days)
+        for _, week_days in groupby(days, key=lambda day: period_start(day.period_start, SessionRollup.PERIOD_WEEK))
+    ]
+    totals = SessionRollup.combine(covering_rollups(db, current_user.id, start_date, end_date))
+
+    ahi_days = [day for day in days if day.ahi_count]
+    controlled = sum(1 for day in ahi_days if day.mean("ahi") < 5)
+    usage = totals.usage_hours
     return SleepQualityMetrics(
-        average_ahi=3.2,
-        ahi_trend="improving",
-        pressure_optimization=87.5,
-        leak_rate_average=1.2,
-        sleep_efficiency=88.7
+        average_ahi=_value(totals.mean("ahi"), 2),
+        ahi_trend=_ahi_trend(weeks),
+        pressure_optimization=_value(controlled / len(ahi_days) * 100 if ahi_days else None),
+        leak_rate_average=_value(totals.mean("leak")),
+        sleep_efficiency=_value(min(usage / TARGET_SLEEP_HOURS, 1.0) * 100 if usage is not None else None)
     )
 
+@router.get("/percentiles")
+@query_budget(2)
+def get_percentiles(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Get p50/p95/p99 of leak (L/min) and pressure (cmH2O) over every sample
+    of the nights in a date range, merged from per-night quantile sketches
+    (within 1% of the exact values).
+    """
+    return range_percentiles(db, current_user.id, start_date, end_date)
+
+@router.get("/hourly-profile")
+@query_budget(2)
+def get_hourly_profile(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    days: int = Query(90, ge=1, le=3660),
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Get mean leak, share of large leak and respiratory events per hour of
+    the night, by hours since mask on and by clock hour. Without a
+    start_date the profile covers the ``days`` days up to end_date (today
+    by default).
+    """
+    if start_date is None:
+        end_date = end_date or date.today()
+        start_date = end_date - timedelta(days=days - 1)
+    profile = range_profile(db, current_user.id, start_date, end_date)
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat() if end_date else None,
+        "nights": profile.nights,
+        "since_mask_on": profile.summary("since_mask_on"),
+        "clock_hour": profile.summary("clock_hour")
+    }
+
 @router.get("/trends/{metric}")
-async def get_trend_data(
+@query_budget(2)
+def get_trend_data(
     metric: str,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    granularity: str = "daily"
+    granularity: str = "daily",
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ) -> List[TrendData]:
-    """Get trend data for a specific metric"""
+    """Get trend data for a specific metric, one point per day, week or month"""
     
     # Validate metric
     valid_metrics = ["ahi", "usage_hours", "pressure", "leak_rate", "compliance"]
@@ -78,29 +204,24 @@ async def get_trend_data(
             status_code=400,
             detail=f"Invalid metric. Valid options: {', '.join(valid_metrics)}"
         )
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid granularity. Valid options: {', '.join(GRANULARITIES)}"
+        )
     
-    # Mock trend data
-    mock_data = []
-    for i in range(30):
-        trend_date = date(2024, 3, i + 1) if i < 31 else date(2024, 4, i - 30)
-        if metric == "ahi":
-            value = 3.5 - (i * 0.02)  # Improving trend
-        elif metric == "usage_hours":
-            value = 7.0 + (i * 0.03)  # Improving trend
-        elif metric == "pressure":
-            value = 12.0 + (i * 0.01)
-        elif metric == "leak_rate":
-            value = 2.0 - (i * 0.01)  # Improving trend
-        else:  # compliance
-            value = 90.0 + (i * 0.1)
-            
-        mock_data.append(TrendData(
-            date=trend_date,
+    trend = []
+    for rollup in period_rollups(db, current_user.id, GRANULARITIES[granularity], start_date, end_date):
+        value = _trend_value(rollup, metric)
+        if value is None:
+            continue
+        trend.append(TrendData(
+            date=rollup.period_start,
             value=round(value, 2),
             metric=metric
         ))
     
-    return mock_data[:30]  # Return 30 days of data
+    return trend
 
 @router.get("/insights")
 async def get_insights() -> Dict[str, Any]:
@@ -134,59 +255,105 @@ async def get_insights() -> Dict[str, Any]:
     }
 
 @router.get("/reports/monthly")
-async def get_monthly_report(year: int = 2024, month: int = 3) -> Dict[str, Any]:
-    """Generate monthly CPAP usage report"""
+@query_budget(4)
+def get_monthly_report(
+    # The month after the report's must still be a valid date
+    year: Optional[int] = Query(None, ge=MINYEAR, le=MAXYEAR - 1),
+    month: Optional[int] = None,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """Generate monthly CPAP usage report (defaults to the current month)"""
+    today = date.today()
+    year = year or today.year
+    month = month or today.month
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="Invalid month. Valid options: 1-12")
+    
+    month_start = date(year, month, 1)
+    month_last = period_end(month_start, SessionRollup.PERIOD_MONTH) - timedelta(days=1)
+    total_nights = calendar.monthrange(year, month)[1]
+    
+    summary = SessionRollup.combine(
+        period_rollups(db, current_user.id, SessionRollup.PERIOD_MONTH, month_start, month_start)
+    )
+    days = period_rollups(db, current_user.id, SessionRollup.PERIOD_DAY, month_start, month_last)
+    weeks = period_rollups(db, current_user.id, SessionRollup.PERIOD_WEEK, month_start, month_last)
+    
+    highlights = []
+    ahi_weeks = [week for week in weeks if week.ahi_count]
+    if ahi_weeks:
+        best = min(ahi_weeks, key=lambda week: week.mean("ahi"))
+        week_last = best.period_start + timedelta(days=6)
+        highlights.append(
+            f"Best AHI week: {best.period_start:%B %d}-{week_last:%B %d} (avg {best.mean('ahi'):.1f})"
+        )
+    if days:
+        longest = max(days, key=lambda day: day.duration_sum)
+        highlights.append(f"Longest usage night: {longest.period_start:%B %d} ({longest.duration_sum:.1f} hours)")
+    consistent_weeks = [week for week in weeks if week.stdev("duration") is not None]
+    if consistent_weeks:
+        steadiest = min(consistent_weeks, key=lambda week: week.stdev("duration"))
+        highlights.append(f"Most consistent week: week of {steadiest.period_start:%B %d}")
+    
+    compliance_rate = summary.compliant_nights / total_nights * 100
+    average_ahi = summary.mean("ahi")
+    average_leak = summary.mean("leak")
+    recommendations = []
+    if compliance_rate < 70:
+        recommendations.append(f"Aim for at least {COMPLIANT_HOURS:.0f} hours of use on 70% of nights")
+    if average_ahi is not None and average_ahi >= 5:
+        recommendations.append("Discuss pressure settings with your sleep specialist")
+    if average_leak is not None and average_leak > 24:
+        recommendations.append("Check mask fit and cushions for leaks")
+    if not recommendations and summary.night_count:
+        recommendations.append("Continue current treatment settings")
+    
     return {
         "report_period": f"{year}-{month:02d}",
         "summary": {
-            "total_nights": 31,
-            "usage_nights": 29,
-            "compliance_rate": 93.5,
-            "average_ahi": 3.1,
-            "average_usage_hours": 7.8,
-            "total_usage_hours": 226.2
+            "total_nights": total_nights,
+            "usage_nights": summary.night_count,
+            "compliance_rate": round(compliance_rate, 1),
+            "average_ahi": _value(average_ahi),
+            "average_usage_hours": _value(summary.usage_hours),
+            "total_usage_hours": round(summary.duration_sum, 1)
         },
-        "highlights": [
-            "Best AHI week: March 15-21 (avg 2.8)",
-            "Longest usage night: March 20 (9.2 hours)",
-            "Most consistent week: March 8-14"
-        ],
-        "recommendations": [
-            "Continue current treatment settings",
-            "Monitor mask seal during first hour of sleep",
-            "Consider sleep position optimization"
-        ],
+        "highlights": highlights,
+        "recommendations": recommendations,
         "generated_at": datetime.now().isoformat()
     }
 
 @router.get("/compare")
-async def compare_periods(
+@query_budget(3)
+def compare_periods(
     period1_start: date,
     period1_end: date,
     period2_start: date,
-    period2_end: date
+    period2_end: date,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """Compare two time periods"""
+    first = _period_summary(SessionRollup.combine(covering_rollups(db, current_user.id, period1_start, period1_end)))
+    second = _period_summary(SessionRollup.combine(covering_rollups(db, current_user.id, period2_start, period2_end)))
+    
     return {
         "comparison": {
             "period1": {
                 "start": period1_start.isoformat(),
                 "end": period1_end.isoformat(),
-                "compliance_rate": 91.2,
-                "average_ahi": 3.8,
-                "average_usage": 7.2
+                **first
             },
             "period2": {
                 "start": period2_start.isoformat(),
                 "end": period2_end.isoformat(),
-                "compliance_rate": 94.3,
-                "average_ahi": 3.1,
-                "average_usage": 7.8
+                **second
             },
             "improvements": {
-                "compliance_rate": "+3.1%",
-                "ahi_reduction": "-0.7",
-                "usage_increase": "+0.6 hours"
+                "compliance_rate": f"{second['compliance_rate'] - first['compliance_rate']:+.1f}%",
+                "ahi_reduction": f"{second['average_ahi'] - first['average_ahi']:+.1f}",
+                "usage_increase": f"{second['average_usage'] - first['average_usage']:+.1f} hours"
             }
         }
     }
@@ -11,6 +11,7 @@ from datetime import datetime
 from pydantic import BaseModel, EmailStr
 
 from app.core.database import get_db
+from app.core.query_budget import query_budget
 from app.core.security import (
     authenticate_user, 
     create_user_token, 
@@ -51,7 +52,8 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 @router.post('/register')
-async def register(
+@query_budget(4)
+def register(
     user_data: RegisterRequest,
     db: Session = Depends(get_db)
 ):
@@ -106,7 +108,8 @@ async def register(
         )
 
 @router.post('/login')
-async def login(
+@query_budget(3)
+def login(
     login_data: LoginRequest,
     db: Session = Depends(get_db)
 ):
@@ -154,6 +157,7 @@ async def login(
         )
 
 @router.get('/profile')
+@query_budget(1)
 async def get_profile(
     current_user: UserModel = Depends(get_current_active_user)
 ):
@@ -175,7 +179,8 @@ async def get_profile(
         )
 
 @router.put('/profile')
-async def update_profile(
+@query_budget(4)
+def update_profile(
     profile_data: ProfileUpdateRequest,
     current_user: UserModel = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -3,11 +3,20 @@ CPAP Analytics Platform - CPAP Data Endpoints
 API endpoints for managing CPAP data uploads, processing, and retrieval
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
 import pandas as pd
 from datetime import datetime, date
 
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.query_budget import query_budget
+from app.core.responses import FastJSONResponse
+from app.core.security import get_current_active_user
+from app.models.user import User as UserModel
+from app.services.session_listing import InvalidCursor, list_sessions
+
 router = APIRouter()
 
 # Sample data models (in a real app, these would be in separate models file)
@@ -46,32 +55,25 @@ async def get_cpap_summary():
         date_range_end=date(2024, 3, 31)
     )
 
-@router.get("/sessions", response_model=List[CPAPSession])
-async def get_cpap_sessions(
+@router.get("/sessions")
+@query_budget(2)
+def get_cpap_sessions(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    limit: int = 100
+    limit: int = Query(settings.SESSIONS_PAGE_SIZE, ge=1, le=settings.SESSIONS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ):
-    """Get CPAP session data with optional date filtering"""
-    # Mock data - in real implementation, this would query the database
-    return [
-        CPAPSession(
-            date=date(2024, 3, 30),
-            duration_hours=8.2,
-            ahi=2.8,
-            pressure_95th_percentile=12.8,
-            mask_seal="Good",
-            large_leak_rate=0.5
-        ),
-        CPAPSession(
-            date=date(2024, 3, 29),
-            duration_hours=7.8,
-            ahi=3.1,
-            pressure_95th_percentile=13.2,
-            mask_seal="Good",
-            large_leak_rate=1.2
-        )
-    ]
+    """
+    Get the current user's sessions, newest first, one page at a time.
+    Pass the returned ``next_cursor`` to fetch the following page.
+    """
+    try:
+        page = list_sessions(db, current_user.id, limit, cursor, start_date, end_date)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(page)
 
 @router.post("/upload")
 async def upload_cpap_data(file: UploadFile = File(...)):
@@ -1,64 +1,70 @@
 """
-CPAP Analytics Platform - Sessions Endpoints (Mock)
-Temporary mock analytics endpoint to get frontend working
+CPAP Analytics Platform - Sessions Endpoints
+Dashboard analytics and insights for the current user's sessions, and
+downsampled views of their stored waveforms
 """
 
-from fastapi import APIRouter, Depends
-from datetime import datetime, timedelta, date
-from typing import Dict, Any
-import random
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func, desc
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, Any, Optional
 
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.etags import not_modified, user_data_etag, validator_headers
+from app.core.query_budget import query_budget
+from app.core.responses import FastJSONResponse
 from app.core.security import get_current_active_user
+from app.models.session import Session as SessionModel
 from app.models.user import User as UserModel
-from app.analytics import generate_insights
+from app.services.data_version import get_data_version
+from app.services.insight_cache import get_user_insights
+from app.services.session_serializer import serialize_sessions
+from app.services.waveform_store import NightWaveforms, WaveformStore
+from app.services.waveform_view import downsample_window
 
 router = APIRouter()
 
+# Sessions listed on the dashboard, which also form its trend charts
+RECENT_SESSIONS = 30
+
 @router.get('/analytics')
-async def get_analytics(
-    current_user: UserModel = Depends(get_current_active_user)
+@query_budget(4)
+def get_analytics(
+    request: Request,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
-    """Get mock analytics data for current user"""
+    """Get analytics data for current user"""
+    user_id = current_user.id
     
-    # Write to a debug file to prove this code is executing
-    with open('ANALYTICS_CALLED.txt', 'w') as f:
-        f.write(f"ANALYTICS CALLED AT {datetime.now()}\n")
-        f.write(f"User ID: {current_user.id}\n")
+    # Unchanged since the client's copy - answer 304 without building anything
+    etag = user_data_etag('analytics', user_id, get_data_version(db, user_id))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
     
-    print("==========================================")
-    print("🔥 SESSIONS_MOCK.PY IS BEING USED! 🔥")
-    print("==========================================")
+    # Aggregate in SQL; the user's rows come from ix_sessions_user_id_start_time
+    stats = db.query(
+        func.count(SessionModel.id).label('total_sessions'),
+        func.avg(SessionModel.ahi).label('avg_ahi'),
+        func.avg(SessionModel.quality_score).label('avg_quality'),
+        func.avg(SessionModel.duration_minutes).label('avg_duration'),
+        func.avg(SessionModel.mask_leak_95).label('avg_leak')
+    ).filter(SessionModel.user_id == user_id).one()
     
-    # Generate mock recent sessions
-    recent_sessions = []
-    print(f"DEBUG: Starting to generate 30 sessions")
-    for i in range(30):
-        print(f"DEBUG: Generating session {i+1}")  
-        session_date = date.today() - timedelta(days=i)
-        duration_hours = round(random.uniform(6.0, 9.0), 1)
-        ahi = round(random.uniform(2.0, 8.0), 1)
-        quality_score = round(random.uniform(75.0, 95.0), 1)
-        
-        recent_sessions.append({
-            'id': 30 - i,
-            'user_id': current_user.id,
-            'date': session_date.isoformat(),
-            'duration_hours': duration_hours,
-            'ahi': ahi,
-            'mask_leak': round(random.uniform(0.5, 15.0), 1),
-            'pressure_avg': round(random.uniform(10.0, 15.0), 1),
-            'pressure_95': round(random.uniform(12.0, 17.0), 1),
-            'quality_score': quality_score,
-            'central_apneas': random.randint(0, 5),
-            'obstructive_apneas': random.randint(0, 10),
-            'hypopneas': random.randint(0, 15),
-            'created_at': datetime.utcnow().isoformat()
-        })
+    # Most recent sessions, newest first, serialized from column tuples
+    recent_sessions = serialize_sessions(
+        db.query(SessionModel)
+        .filter(SessionModel.user_id == user_id)
+        .order_by(desc(SessionModel.start_time))
+        .limit(RECENT_SESSIONS)
+    )
     
-    # Generate trends (same data in different format) - FIXED TO RETURN ALL 30
-    trends = []
-    for session in recent_sessions:
-        trends.append({
+    # Trend points for the same nights, in the shape the dashboard charts use
+    trends = [
+        {
             'date': session['date'],
             'ahi': session['ahi'],
             'quality_score': session['quality_score'],
@@ -71,62 +77,102 @@ async def get_analytics(
             },
             'leakRate': session['mask_leak'],
             'pressure': session['pressure_avg']
-        })
-    
-    # Calculate summary averages
-    avg_ahi = round(sum(s['ahi'] for s in recent_sessions) / len(recent_sessions), 2)
-    avg_quality = round(sum(s['quality_score'] for s in recent_sessions) / len(recent_sessions), 1)
-    avg_duration = round(sum(s['duration_hours'] for s in recent_sessions) / len(recent_sessions), 1)
-    avg_leak = round(sum(s['mask_leak'] for s in recent_sessions) / len(recent_sessions), 1)
+        }
+        for session in recent_sessions
+    ]
     
-    # Return mock analytics data
-    return {
+    return FastJSONResponse({
         'summary': {
-            'total_sessions': 30,
-            'avg_ahi': avg_ahi,
-            'avg_quality': avg_quality,
-            'avg_duration': avg_duration,
-            'avg_leak': avg_leak
+            'total_sessions': stats.total_sessions,
+            'avg_ahi': round(stats.avg_ahi, 2) if stats.avg_ahi is not None else 0,
+            'avg_quality': round(stats.avg_quality, 1) if stats.avg_quality is not None else 0,
+            'avg_duration': round(stats.avg_duration / 60, 1) if stats.avg_duration is not None else 0,
+            'avg_leak': round(stats.avg_leak, 1) if stats.avg_leak is not None else 0
         },
         'trends': trends,
         'recent_sessions': recent_sessions
-    }
+    }, headers=validator_headers(etag))
 
 @router.get('/insights')
-async def get_insights(
-    current_user: UserModel = Depends(get_current_active_user)
+@query_budget(3)
+def get_insights(
+    request: Request,
+    response: Response,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """Get intelligent insights and recommendations for current user"""
     
-    # Generate mock sessions for insights analysis (same data as analytics)
-    recent_sessions = []
-    for i in range(30):
-        session_date = date.today() - timedelta(days=i)
-        duration_hours = round(random.uniform(6.0, 9.0), 1)
-        ahi = round(random.uniform(2.0, 8.0), 1)
-        quality_score = round(random.uniform(75.0, 95.0), 1)
-        
-        recent_sessions.append({
-            'id': 30 - i,
-            'user_id': current_user.id,
-            'date': session_date.isoformat(),
-            'duration_hours': duration_hours,
-            'ahi': ahi,
-            'mask_leak': round(random.uniform(0.5, 15.0), 1),
-            'pressure_avg': round(random.uniform(10.0, 15.0), 1),
-            'pressure_95': round(random.uniform(12.0, 17.0), 1),
-            'quality_score': quality_score,
-            'central_apneas': random.randint(0, 5),
-            'obstructive_apneas': random.randint(0, 10),
-            'hypopneas': random.randint(0, 15),
-            'created_at': datetime.utcnow().isoformat()
-        })
+    # The version is read first, so a night imported meanwhile only makes the tag older
+    etag = user_data_etag('insights', current_user.id, get_data_version(db, current_user.id))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers.update(validator_headers(etag))
     
-    # Generate intelligent insights
-    insights = generate_insights(recent_sessions)
+    # Generate intelligent insights, folding in only nights added since the last request
+    insights = get_user_insights(db, current_user.id)
     
     return {
         'insights': insights,
         'total_insights': len(insights),
         'generated_at': datetime.utcnow().isoformat()
-    }
\ No newline at end of file
+    }
+
+def _open_night(db: Session, user_id: int, session_id: int) -> NightWaveforms:
+    """Stored waveforms of one of the user's sessions, or 404"""
+    night_id = db.query(SessionModel.session_id).filter(
+        SessionModel.id == session_id,
+        SessionModel.user_id == user_id
+    ).scalar()
+    night = WaveformStore().open_night(user_id, night_id) if night_id else None
+    if night is None:
+        raise HTTPException(status_code=404, detail="No waveforms stored for this session")
+    return night
+
+@router.get('/{session_id}/waveforms')
+@query_budget(2)
+def list_waveforms(
+    session_id: int,
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """List the stored signals of a session"""
+    night = _open_night(db, current_user.id, session_id)
+    return {
+        'session_id': session_id,
+        'start_time': night.start_time.isoformat(),
+        'signals': [
+            {
+                'name': name,
+                'unit': night.info(name)['unit'],
+                'sample_rate': night.info(name)['sample_rate'],
+                'start': night.info(name)['start_offset'],
+                'duration': night.duration_seconds(name)
+            }
+            for name in night.signals
+        ]
+    }
+
+@router.get('/{session_id}/waveforms/{signal}')
+@query_budget(2)
+def get_waveform(
+    session_id: int,
+    signal: str,
+    start: Optional[float] = Query(None, ge=0, description="Seconds from the start of the night"),
+    end: Optional[float] = Query(None, ge=0, description="Seconds from the start of the night"),
+    width: int = Query(1000, ge=10, le=settings.WAVEFORM_MAX_WIDTH, description="Chart width in pixels"),
+    method: str = Query('minmax', pattern='^(minmax|lttb)$'),
+    current_user: UserModel = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Downsampled points of one signal of a session for a chart of the given width"""
+    night = _open_night(db, current_user.id, session_id)
+    if signal not in night.signals:
+        raise HTTPException(status_code=404, detail=f"Session has no stored signal {signal!r}")
+    if start is not None and end is not None and end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    
+    view = downsample_window(night, signal, start, end, width, method)
+    view['session_id'] = session_id
+    return FastJSONResponse(view)
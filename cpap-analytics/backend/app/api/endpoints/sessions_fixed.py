@@ -25,9 +25,15 @@ async def get_analytics(
     try:
         user_id = current_user.id
         
-        # Get all sessions for the user
-        sessions = db.query(SessionModel).filter(SessionModel.user_id == user_id).all()
-        total_sessions = len(sessions)
+        # Aggregate in SQL; the user's rows come from ix_sessions_user_id_start_time
+        stats = db.query(
+            func.count(SessionModel.id).label('total_sessions'),
+            func.avg(SessionModel.ahi).label('avg_ahi'),
+            func.avg(SessionModel.quality_score).label('avg_quality'),
+            func.avg(SessionModel.duration_minutes).label('avg_duration'),
+            func.avg(SessionModel.mask_leak_95).label('avg_leak')
+        ).filter(SessionModel.user_id == user_id).one()
+        total_sessions = stats.total_sessions
         
         if total_sessions == 0:
             return {
@@ -42,29 +48,22 @@ async def get_analytics(
                 'recent_sessions': []
             }
         
-        # Calculate averages manually from sessions
-        total_ahi = sum(s.ahi for s in sessions if s.ahi is not None)
-        total_quality = sum(s.quality_score for s in sessions if s.quality_score is not None)
-        total_duration_minutes = sum(s.duration_minutes for s in sessions if s.duration_minutes is not None)
-        total_leak = sum(s.mask_leak_95 for s in sessions if s.mask_leak_95 is not None)
+        avg_ahi = round(stats.avg_ahi, 2) if stats.avg_ahi is not None else 0
+        avg_quality = round(stats.avg_quality, 1) if stats.avg_quality is not None else 0
+        avg_duration_hours = round(stats.avg_duration / 60, 1) if stats.avg_duration is not None else 0
+        avg_leak = round(stats.avg_leak, 1) if stats.avg_leak is not None else 0
         
-        count_ahi = sum(1 for s in sessions if s.ahi is not None)
-        count_quality = sum(1 for s in sessions if s.quality_score is not None)
-        count_duration = sum(1 for s in sessions if s.duration_minutes is not None)
-        count_leak = sum(1 for s in sessions if s.mask_leak_95 is not None)
+        # Get recent sessions (last 30) - a backwards walk of the index
+        recent_sessions = db.query(SessionModel).filter(
+            SessionModel.user_id == user_id
+        ).order_by(desc(SessionModel.start_time)).limit(30).all()
         
-        avg_ahi = round(total_ahi / count_ahi, 2) if count_ahi > 0 else 0
-        avg_quality = round(total_quality / count_quality, 1) if count_quality > 0 else 0
-        avg_duration_hours = round((total_duration_minutes / count_duration) / 60, 1) if count_duration > 0 else 0
-        avg_leak = round(total_leak / count_leak, 1) if count_leak > 0 else 0
-        
-        # Get recent sessions (last 30)
-        recent_sessions = sorted(sessions, key=lambda s: s.start_time if s.start_time else datetime.min, reverse=True)[:30]
-        
-        # Get trend data (last 30 days)
+        # Get trend data (last 30 days) - an index range scan, already in order
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        trend_sessions = [s for s in sessions if s.start_time and s.start_time >= thirty_days_ago]
-        trend_sessions.sort(key=lambda s: s.start_time)
+        trend_sessions = db.query(SessionModel).filter(
+            SessionModel.user_id == user_id,
+            SessionModel.start_time >= thirty_days_ago
+        ).order_by(SessionModel.start_time).all()
         
         trends = []
         for session in trend_sessions:
@@ -6,12 +6,13 @@ API endpoints for user management and authentication
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, case
 from typing import List, Optional
 from datetime import datetime, date
 from pydantic import BaseModel, EmailStr
 
 from app.core.database import get_db
+from app.core.query_budget import query_budget
 from app.core.security import (
     authenticate_user, 
     create_user_token, 
@@ -19,6 +20,7 @@ from app.core.security import (
     get_current_active_user,
     get_password_hash
 )
+from app.core.user_cache import user_cache
 from app.models.user import User as UserModel
 from app.models.device import Device
 from app.models.session import Session as SessionModel
@@ -57,7 +59,8 @@ class TokenResponse(BaseModel):
     user: UserResponse
 
 @router.post("/login", response_model=TokenResponse)
-async def login_user(
+@query_budget(3)
+def login_user(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -95,7 +98,8 @@ async def login_user(
     )
 
 @router.post("/register", response_model=UserResponse)
-async def register_user(
+@query_budget(4)
+def register_user(
     user_data: UserCreate,
     db: Session = Depends(get_db)
 ):
@@ -138,6 +142,7 @@ async def register_user(
     return UserResponse.from_orm(new_user)
 
 @router.get("/me", response_model=UserResponse)
+@query_budget(1)
 async def get_current_user_profile(
     current_user: UserModel = Depends(get_current_active_user)
 ):
@@ -145,7 +150,8 @@ async def get_current_user_profile(
     return UserResponse.from_orm(current_user)
 
 @router.put("/me", response_model=UserResponse)
-async def update_user_profile(
+@query_budget(4)
+def update_user_profile(
     profile_data: dict,
     current_user: UserModel = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -167,6 +173,8 @@ async def update_user_profile(
         update_data["updated_at"] = datetime.utcnow()
         db.query(UserModel).filter(UserModel.id == current_user.id).update(update_data)
         db.commit()
+        # Bulk updates bypass the ORM events that invalidate cached principals
+        user_cache.invalidate(current_user.id)
         db.refresh(current_user)
     
     return UserResponse.from_orm(current_user)
@@ -213,7 +221,8 @@ async def update_user_preferences(
     }
 
 @router.get("/profile")
-async def get_detailed_profile(
+@query_budget(3)
+def get_detailed_profile(
     current_user: UserModel = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -222,21 +231,19 @@ async def get_detailed_profile(
     # Get user's devices
     devices = db.query(Device).filter(Device.user_id == current_user.id).all()
     
-    # Get session statistics using SQLAlchemy aggregation functions
+    # Get session statistics in one pass over the user's rows of ix_sessions_user_id_start_time
     session_stats = db.query(
         func.count(SessionModel.id).label('total_sessions'),
         func.avg(SessionModel.ahi).label('avg_ahi'),
         func.avg(SessionModel.duration_minutes).label('avg_duration'),
         func.min(SessionModel.start_time).label('first_session'),
-        func.max(SessionModel.start_time).label('last_session')
+        func.max(SessionModel.start_time).label('last_session'),
+        # Compliance rate - sessions with 4+ hours (240+ minutes)
+        func.sum(case((SessionModel.duration_minutes >= 240, 1), else_=0)).label('compliant_sessions')
     ).filter(SessionModel.user_id == current_user.id).first()
     
     if session_stats and session_stats.total_sessions > 0:
-        # Calculate compliance rate - sessions with 4+ hours (240+ minutes)
-        compliant_sessions = db.query(func.count(SessionModel.id)).filter(
-            SessionModel.user_id == current_user.id,
-            SessionModel.duration_minutes >= 240
-        ).scalar() or 0
+        compliant_sessions = session_stats.compliant_sessions or 0
         
         total_sessions = session_stats.total_sessions
         avg_ahi = float(session_stats.avg_ahi or 0)
@@ -28,15 +28,60 @@ class Settings:
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./cpap_analytics.db")
+    DATABASE_PROFILE: str = os.getenv("DATABASE_PROFILE", "development")  # "development" or "production"
+    
+    # SQLite tuning (production profile)
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))         # Wait for locks instead of failing
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))            # Page cache per connection
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))     # Bytes of the file memory-mapped
+    
+    # Worker threads for sync (database-bound) endpoints and dependencies
+    THREADPOOL_WORKERS: int = int(os.getenv("THREADPOOL_WORKERS", "40"))
+    
+    # Connection pool (production profile, non-SQLite databases)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))      # Seconds to wait for a connection
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))    # Seconds before a connection is replaced
     
     # File Storage
-    UPLOAD_DIR: str = "uploads"
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
     ALLOWED_FILE_TYPES: List[str] = [".csv", ".txt", ".dat"]
     
+    # Background upload processing
+    UPLOAD_WORKERS: int = int(os.getenv("UPLOAD_WORKERS", "2"))        # Concurrent upload jobs
+    PARSER_WORKERS: int = int(os.getenv("PARSER_WORKERS", "1"))        # Processes per SD card import
+    PARSER_CHUNK_SIZE: int = int(os.getenv("PARSER_CHUNK_SIZE", "16"))  # Files per parser task
+    MAX_EXTRACTED_SIZE: int = int(os.getenv("MAX_EXTRACTED_SIZE", str(4 * 1024 * 1024 * 1024)))  # Uncompressed bytes per SD card archive
+    MAX_ARCHIVE_MEMBERS: int = int(os.getenv("MAX_ARCHIVE_MEMBERS", "50000"))  # Entries per SD card archive
+    
+    # Decoded waveforms (flow, pressure, leak) stored per night
+    WAVEFORM_DIR: str = os.getenv("WAVEFORM_DIR", "waveforms")
+    WAVEFORM_CHUNK_SECONDS: int = int(os.getenv("WAVEFORM_CHUNK_SECONDS", "60"))  # Seconds of samples per compressed chunk
+    WAVEFORM_MAX_WIDTH: int = int(os.getenv("WAVEFORM_MAX_WIDTH", "4000"))         # Most points per requested waveform view
+    
+    # Session listing pages
+    SESSIONS_PAGE_SIZE: int = int(os.getenv("SESSIONS_PAGE_SIZE", "100"))          # Default sessions per page
+    SESSIONS_MAX_PAGE_SIZE: int = int(os.getenv("SESSIONS_MAX_PAGE_SIZE", "500"))  # Largest page a client may ask for
+    
+    # Access logging: errors and slow requests always, other requests sampled
+    ACCESS_LOG_SAMPLE_RATE: float = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.1"))
+    ACCESS_LOG_SLOW_MS: float = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+    
+    # /metrics is disabled unless a token is set; scrapers send it as a bearer token
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    USER_CACHE_TTL_SECONDS: int = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))      # Authenticated user reuse
+    USER_CACHE_MAX_ENTRIES: int = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+    
+    # bcrypt runs on its own bounded pool; calls beyond workers + queue get 503
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_QUEUED: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUED", "16"))
+    PASSWORD_HASH_RETRY_AFTER: int = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))  # Seconds
     
     # CPAP Data Processing
     SUPPORTED_CPAP_BRANDS: List[str] = [
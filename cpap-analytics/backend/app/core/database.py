@@ -2,19 +2,81 @@
 Database Configuration and Dependencies
 
 Handles SQLAlchemy database connection and session management.
+
+The engine is built from settings.DATABASE_PROFILE. The "production"
+profile runs SQLite in WAL mode (readers no longer block on a writer)
+with synchronous=NORMAL, a larger page cache, memory-mapped reads and a
+busy timeout applied on every connect, and sizes the connection pool for
+other databases. "development" keeps the driver defaults.
 """
 
-from typing import Generator
-from sqlalchemy import create_engine
+from typing import Any, Dict, Generator, List, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
 
+PROFILE_DEVELOPMENT = "development"
+PROFILE_PRODUCTION = "production"
+DATABASE_PROFILES = (PROFILE_DEVELOPMENT, PROFILE_PRODUCTION)
+
+def _check_profile(profile: str) -> None:
+    if profile not in DATABASE_PROFILES:
+        raise ValueError(f"Unknown database profile {profile!r}, expected one of {DATABASE_PROFILES}")
+
+def sqlite_pragmas(profile: str) -> List[str]:
+    """PRAGMA statements run on every new SQLite connection for a profile"""
+    _check_profile(profile)
+    if profile != PROFILE_PRODUCTION:
+        return []
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",  # Negative = KiB rather than pages
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}"
+    ]
+
+def engine_options(url: str, profile: str) -> Dict[str, Any]:
+    """Keyword arguments for create_engine() for a database URL and profile"""
+    _check_profile(profile)
+    if url.startswith("sqlite"):
+        # SQLite pools per file; connections are shared across request threads
+        return {"connect_args": {"check_same_thread": False}}
+    if profile != PROFILE_PRODUCTION:
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True
+    }
+
+def create_database_engine(url: Optional[str] = None, profile: Optional[str] = None, **kwargs) -> Engine:
+    """Create an engine configured for a profile (defaults come from settings)"""
+    url = url or settings.DATABASE_URL
+    profile = profile or settings.DATABASE_PROFILE
+    options = engine_options(url, profile)
+    options.update(kwargs)
+    new_engine = create_engine(url, **options)
+
+    pragmas = sqlite_pragmas(profile) if url.startswith("sqlite") else []
+    if pragmas:
+        @event.listens_for(new_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+            finally:
+                cursor.close()
+
+    return new_engine
+
 # Create SQLAlchemy engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+engine = create_database_engine()
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -27,6 +89,10 @@ def get_db() -> Generator[Session, None, None]:
     Database dependency for FastAPI
     
     Creates a new database session for each request and ensures it's closed after use.
+    
+    The session is synchronous: endpoints and dependencies that use it are
+    declared with plain ``def`` so FastAPI runs them on its worker threads
+    instead of blocking the event loop.
     """
     db = SessionLocal()
     try:
@@ -0,0 +1,44 @@
+"""
+Conditional GET
+
+Strong ETags for per-user responses that only change when the user's
+session data does. The tag combines the resource, the API version (so a
+deploy that changes a response invalidates clients' copies), the user
+and the user's data version; a matching If-None-Match is answered with
+304 before any of the response is computed.
+"""
+
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+
+# Clients may keep the response but must revalidate it on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def user_data_etag(resource: str, user_id: int, version: int) -> str:
+    """Strong ETag for ``resource`` computed from a user's data version"""
+    return f'"{resource}-{settings.APP_VERSION}-{user_id}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists ``etag`` (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def validator_headers(etag: str) -> Dict[str, str]:
+    """Headers sent with both the full response and a 304"""
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 if the client already has the ``etag`` representation, else None"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=validator_headers(etag))
+    return None
@@ -0,0 +1,120 @@
+"""
+Query Budgets
+
+Endpoints declare how many SQL statements one request may issue with
+@query_budget(n). The request middleware compares the statements counted
+for the request against the budget; an overrun is logged, counted in
+db_query_budget_exceeded_total and passed to any registered listeners
+(the test suite registers one that fails the running test). Budgets
+should not depend on how much data a user has, so an endpoint that
+starts issuing one query per row (N+1) breaks its budget as soon as a
+test has more than a handful of rows.
+
+QueryCounter counts statements directly for code outside a request.
+"""
+
+import logging
+import threading
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+db_query_budget_exceeded_total = metrics.registry.register(metrics.Counter(
+    "db_query_budget_exceeded_total", "Requests that issued more SQL statements than their route's budget",
+    ("route",)
+))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or block issued more SQL statements than allowed"""
+
+    def __init__(self, where: str, budget: int, queries: int, statements: Optional[List[str]] = None):
+        self.where = where
+        self.budget = budget
+        self.queries = queries
+        self.statements = statements or []
+        message = f"{where} issued {queries} SQL statements, budget is {budget}"
+        if self.statements:
+            message += ":\n" + "\n".join(f"  {statement}" for statement in self.statements)
+        super().__init__(message)
+
+
+def query_budget(limit: int) -> Callable:
+    """Declare the most SQL statements one request to the decorated endpoint may issue"""
+    def decorate(endpoint: Callable) -> Callable:
+        endpoint.query_budget = limit
+        return endpoint
+    return decorate
+
+
+def budget_of(endpoint: Optional[Callable]) -> Optional[int]:
+    """Budget declared on an endpoint function, if any"""
+    return getattr(endpoint, "query_budget", None)
+
+
+_listeners: List[Callable[[QueryBudgetExceeded], None]] = []
+_listeners_lock = threading.Lock()
+
+
+def add_listener(listener: Callable[[QueryBudgetExceeded], None]) -> None:
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[QueryBudgetExceeded], None]) -> None:
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def check_request(route: str, endpoint: Optional[Callable], queries: int) -> None:
+    """Report a request that exceeded its endpoint's budget"""
+    budget = budget_of(endpoint)
+    if budget is None or queries <= budget:
+        return
+    exceeded = QueryBudgetExceeded(route, budget, queries)
+    db_query_budget_exceeded_total.inc(route=route)
+    logger.warning(str(exceeded))
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(exceeded)
+
+
+class QueryCounter:
+    """
+    Context manager counting SQL statements executed on an engine (all
+    engines by default) while active, optionally failing past ``budget``.
+
+        with QueryCounter(budget=2) as counter:
+            process_cpap_file(stream, user_id, db)
+    """
+
+    def __init__(self, engine=Engine, budget: Optional[int] = None, where: str = "block"):
+        self.engine = engine
+        self.budget = budget
+        self.where = where
+        self.statements: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.statements.append(statement)
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._capture)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._capture)
+        if exc_type is None and self.budget is not None and self.count > self.budget:
+            raise QueryBudgetExceeded(self.where, self.budget, self.count, self.statements)
@@ -0,0 +1,44 @@
+"""
+JSON Responses
+
+FastJSONResponse renders with orjson when it is installed, which encodes
+dates, datetimes and numpy scalars and arrays in C, and falls back to the standard
+library otherwise. Endpoints returning large payloads build them from
+plain values and return the response directly, which also skips
+FastAPI's jsonable_encoder pass over every nested dict.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Encode the types orjson handles natively (naive datetimes as isoformat())"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if hasattr(value, "tolist"):  # numpy scalar or array
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson if available"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+            default=_default
+        ).encode("utf-8")
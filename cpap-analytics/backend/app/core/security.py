@@ -4,8 +4,10 @@ Security and Authentication Module
 Handles JWT token creation, password hashing, and authentication dependencies.
 """
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Callable, Optional, TypeVar, Union
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
@@ -13,6 +15,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.user_cache import user_cache
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -20,13 +23,52 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # JWT Security
 security = HTTPBearer()
 
+T = TypeVar("T")
+
+class PasswordHashPool:
+    """
+    Dedicated, size-limited executor for bcrypt work.
+    
+    At most ``workers`` hashes run at once and ``max_queued`` more may wait;
+    beyond that a call fails immediately with 503 and Retry-After, so a
+    login burst cannot tie up every request thread for seconds.
+    """
+    
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._slots = threading.BoundedSemaphore(workers + max_queued)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+    
+    def run(self, func: Callable[..., T], *args) -> T:
+        """Run ``func(*args)`` on the pool and wait for the result"""
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent sign-ins, please retry",
+                headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER)},
+            )
+        try:
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+password_hash_pool = PasswordHashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUED)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain password against a hashed password"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify a plain password against a hashed password (on the password hash pool)"""
+    return password_hash_pool.run(pwd_context.verify, plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+    """Hash a password (on the password hash pool)"""
+    return password_hash_pool.run(pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
@@ -64,7 +106,7 @@ def authenticate_user(db: Session, email: str, password: str) -> Union[bool, "Us
     
     return user
 
-async def get_current_user(
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> "UserModel":
@@ -94,11 +136,18 @@ async def get_current_user(
     except Exception:
         raise credentials_exception
     
+    # Repeat requests with the same token are served from the principal cache
+    user = user_cache.get(user_id, token, db)
+    if user is not None:
+        return user
+    
     # Get user from database
+    generation = user_cache.generation(user_id)
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise credentials_exception
     
+    user_cache.put(user_id, token, user, generation)
     return user
 
 async def get_current_active_user(current_user: "UserModel" = Depends(get_current_user)) -> "UserModel":
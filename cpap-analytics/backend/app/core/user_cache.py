@@ -0,0 +1,129 @@
+"""
+Authenticated User Cache
+
+Bounded TTL/LRU cache of the user row behind a bearer token, so
+get_current_user resolves the principal without a database query on
+repeat requests. Entries are keyed by (user_id, token) and hold a
+snapshot of the row's column values; a cached principal is attached to
+the request's session without loading it, so endpoints can still modify
+and commit it.
+
+Entries for a user are dropped once a transaction that updated or
+deleted the row through the ORM (profile edits, password changes,
+deactivation) commits, and a row loaded before that commit is not
+cached; bulk query().update() calls must invalidate explicitly. The
+cache is per process, so changes made elsewhere are picked up after at
+most USER_CACHE_TTL_SECONDS.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.core.config import settings
+from app.models.user import User
+
+CacheKey = Tuple[int, str]
+
+# Users whose row changed in the session's current transaction
+_CHANGED_KEY = "user_cache_changed"
+
+
+class UserCache:
+    """Thread-safe LRU map of (user_id, token) -> user column values, with expiry"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries if max_entries is not None else settings.USER_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.USER_CACHE_TTL_SECONDS
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[CacheKey]] = {}
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, token: str, db: Session) -> Optional[User]:
+        """Cached user attached to ``db`` without a query, or None on a miss"""
+        key = (user_id, token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+
+        user = User(**values)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    def generation(self, user_id: int) -> int:
+        """Number of times the user's entries were invalidated; read it before loading the row"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, user_id: int, token: str, user: User, generation: Optional[int] = None) -> None:
+        """Remember the column values of a freshly loaded user, unless invalidated since ``generation``"""
+        values = {column.key: getattr(user, column.key) for column in inspect(User).column_attrs}
+        key = (user_id, token)
+        with self._lock:
+            if generation is not None and self._generations.get(user_id, 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, values)
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop every cached token of a user"""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: CacheKey) -> None:
+        self._entries.pop(key, None)
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed(db: Session, flush_context) -> None:
+    """Remember the users updated or deleted by this flush"""
+    changed = chain(db.deleted, (obj for obj in db.dirty if db.is_modified(obj, include_collections=False)))
+    user_ids = {obj.id for obj in changed if isinstance(obj, User) and obj.id is not None}
+    if user_ids:
+        db.info.setdefault(_CHANGED_KEY, set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(db: Session) -> None:
+    """Profile, password or active flag changed - cached principals are stale"""
+    for user_id in db.info.pop(_CHANGED_KEY, ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed(db: Session) -> None:
+    """Rolled back changes leave the cached principals valid"""
+    db.info.pop(_CHANGED_KEY, None)
@@ -7,6 +7,7 @@ from app.core.database import engine, Base, SessionLocal
 from app.models.user import User
 from app.models.session import Session
 from app.core.security import get_password_hash
+from app.services.rollups import rebuild_rollups
 from datetime import datetime, date, timedelta, time
 import random
 
@@ -104,6 +105,8 @@ def create_sample_sessions():
             db.add(session)
             sessions_created += 1
         
+        db.flush()
+        rebuild_rollups(db, user.id)
         db.commit()
         print(f"Created {sessions_created} sample sessions for user {user.username}")
         
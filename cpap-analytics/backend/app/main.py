@@ -3,21 +3,38 @@ CPAP Analytics Platform - FastAPI Backend
 Main application entry point
 """
 
-from fastapi import FastAPI, Request
+from anyio import to_thread
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 import os
+import json
 import logging
+import random
+import secrets
+import time
 from pathlib import Path
 
 from app.api.routes import router as api_router
+from app.core import metrics, query_budget
 from app.core.config import settings
+from app.core.database import engine, get_db
+from app.core.responses import FastJSONResponse
+from app.services.upload_jobs import resume_upload_jobs, upload_queue
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("app.access")
+
+# Scrape-time gauges for the app's own engine and upload workers
+metrics.register_pool_metrics(engine)
+metrics.registry.register(metrics.Gauge(
+    "upload_queue_depth", "Upload jobs queued or running",
+    callback=lambda: {(): float(upload_queue.depth)}
+))
 
 # Create FastAPI app instance
 app = FastAPI(
@@ -25,17 +42,53 @@ app = FastAPI(
     description="Backend API for CPAP data analysis and visualization",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
-# Request logging middleware
+def _route_template(request: Request) -> str:
+    """Route path template, so /status/1 and /status/2 share one series"""
+    route = request.scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+
+# Request metrics and sampled access logging middleware
 @app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all incoming requests"""
-    logger.info(f"🔥 REQUEST: {request.method} {request.url.path} - Headers: {dict(request.headers)}")
-    response = await call_next(request)
-    logger.info(f"🔥 RESPONSE: {response.status_code} for {request.url.path}")
-    return response
+async def record_requests(request: Request, call_next):
+    """Record latency, status and database work of every request"""
+    stats = metrics.RequestStats()
+    token = metrics.current_request_stats.set(stats)
+    metrics.http_requests_in_flight.inc()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.http_requests_in_flight.dec()
+        metrics.current_request_stats.reset(token)
+        
+        route = _route_template(request)
+        metrics.http_requests_total.inc(method=request.method, route=route, status=str(status_code))
+        metrics.http_request_duration_seconds.observe(elapsed, method=request.method, route=route)
+        metrics.db_queries_per_request.observe(stats.queries, route=route)
+        metrics.db_query_seconds_per_request.observe(stats.query_seconds, route=route)
+        query_budget.check_request(route, getattr(request.scope.get("route"), "endpoint", None), stats.queries)
+        
+        # Errors and slow requests are always logged, the rest sampled; never headers
+        duration_ms = elapsed * 1000
+        if (status_code >= 500 or duration_ms >= settings.ACCESS_LOG_SLOW_MS
+                or random.random() < settings.ACCESS_LOG_SAMPLE_RATE):
+            access_logger.info(json.dumps({
+                "method": request.method,
+                "route": route,
+                "path": request.url.path,
+                "status": status_code,
+                "duration_ms": round(duration_ms, 2),
+                "db_queries": stats.queries,
+                "db_ms": round(stats.query_seconds * 1000, 2)
+            }))
 
 # Configure CORS
 app.add_middleware(
@@ -49,6 +102,31 @@ app.add_middleware(
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
+# Database-bound endpoints are plain functions, which FastAPI runs on
+# AnyIO worker threads so blocking queries never stall the event loop
+@app.on_event("startup")
+async def size_threadpool():
+    """Size the worker thread pool used for sync endpoints and dependencies"""
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_WORKERS
+
+# Uploads queued or running when the app last stopped are processed again
+@app.on_event("startup")
+async def resume_uploads():
+    """Re-queue uploads left pending or processing by the previous run"""
+    # Resolved like request sessions, so an overridden database is used too
+    sessions = app.dependency_overrides.get(get_db, get_db)()
+    try:
+        bind = next(sessions).get_bind()
+    finally:
+        sessions.close()
+    resume_upload_jobs(bind)
+
+# Stop background upload workers with the app
+@app.on_event("shutdown")
+async def shutdown_upload_queue():
+    """Let running upload jobs finish without accepting new ones"""
+    upload_queue.shutdown(wait=False)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -61,6 +139,24 @@ async def health_check():
         }
     )
 
+# Metrics endpoint
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """
+    Prometheus text exposition of request, database and queue metrics.
+
+    Not found unless METRICS_TOKEN is configured; scrapes must send it as
+    a bearer token.
+    """
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {settings.METRICS_TOKEN}".encode()
+    if not secrets.compare_digest(request.headers.get("authorization", "").encode(), expected):
+        raise HTTPException(
+            status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"}
+        )
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 # Root endpoint
 @app.get("/")
 async def root():
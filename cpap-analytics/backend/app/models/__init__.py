@@ -7,5 +7,12 @@ SQLAlchemy models for the CPAP Analytics platform.
 from .session import Session
 from .user import User
 from .device import Device
+from .ingest_manifest import IngestManifestEntry
+from .file_upload import FileUpload
+from .session_rollup import SessionRollup
+from .user_data_version import UserDataVersion
+from .session_sketch import SessionSketch
+from .session_profile import SessionProfile
 
-__all__ = ["Session", "User", "Device"]
+__all__ = ["Session", "User", "Device", "IngestManifestEntry", "FileUpload", "SessionRollup", "UserDataVersion",
+           "SessionSketch", "SessionProfile"]
@@ -0,0 +1,74 @@
+"""
+File Upload Database Model
+
+Tracks uploaded CPAP data files and the progress of their background
+processing job.
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from datetime import datetime
+from typing import Dict, Any
+from app.core.database import Base
+
+class FileUpload(Base):
+    """Uploaded file and its processing job state"""
+    
+    __tablename__ = "file_uploads"
+    
+    # Processing states (match the frontend FileUpload type)
+    STATUS_PENDING = "pending"
+    STATUS_PROCESSING = "processing"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Ownership
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=True)
+    
+    # File information
+    filename = Column(String(500), nullable=False)           # Stored path under UPLOAD_DIR
+    original_filename = Column(String(255), nullable=False)
+    file_size = Column(Integer, default=0)
+    file_type = Column(String(20), nullable=False)
+    
+    # Job state
+    processing_status = Column(String(20), default=STATUS_PENDING, nullable=False)
+    upload_date = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    
+    # Progress counters
+    files_total = Column(Integer, default=0)
+    files_parsed = Column(Integer, default=0)
+    sessions_imported = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    error_message = Column(Text, nullable=True)
+    
+    def __repr__(self):
+        return f"<FileUpload(id={self.id}, file={self.original_filename}, status={self.processing_status})>"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert upload to dictionary for API responses"""
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "filename": self.original_filename,
+            "original_filename": self.original_filename,
+            "file_size": self.file_size,
+            "file_type": self.file_type,
+            "processing_status": self.processing_status,
+            "upload_date": self.upload_date.isoformat() if self.upload_date is not None else None,
+            "started_at": self.started_at.isoformat() if self.started_at is not None else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at is not None else None,
+            "progress": {
+                "files_total": self.files_total or 0,
+                "files_parsed": self.files_parsed or 0,
+                "sessions_imported": self.sessions_imported or 0,
+                "errors": self.error_count or 0
+            },
+            "sessions_imported": self.sessions_imported or 0,
+            "error_message": self.error_message
+        }
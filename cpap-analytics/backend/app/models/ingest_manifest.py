@@ -0,0 +1,55 @@
+"""
+Ingest Manifest Database Model
+
+Records every SD card file imported for a device so re-uploads of the
+same card only decode new or changed files.
+"""
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint
+from datetime import datetime
+from typing import Dict, Any
+from app.core.database import Base
+
+class IngestManifestEntry(Base):
+    """One imported SD card file (path is relative to the card's DATALOG)"""
+    
+    __tablename__ = "ingest_manifest"
+    __table_args__ = (
+        UniqueConstraint("device_id", "relative_path", name="uq_ingest_manifest_device_path"),
+    )
+    
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Ownership
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    # File identity
+    relative_path = Column(String(500), nullable=False)
+    file_size = Column(Integer, nullable=False)
+    mtime = Column(Float, nullable=False)        # st_mtime in seconds
+    checksum = Column(String(64), nullable=False)  # SHA-256 of file contents
+    
+    # Session the file contributed to (matches sessions.session_id)
+    session_id = Column(String(255), nullable=True)
+    
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<IngestManifestEntry(device_id={self.device_id}, path={self.relative_path})>"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert manifest entry to dictionary"""
+        return {
+            "id": self.id,
+            "device_id": self.device_id,
+            "relative_path": self.relative_path,
+            "file_size": self.file_size,
+            "mtime": self.mtime,
+            "checksum": self.checksum,
+            "session_id": self.session_id,
+            "updated_at": self.updated_at.isoformat() if self.updated_at is not None else None
+        }
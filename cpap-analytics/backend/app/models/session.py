@@ -5,20 +5,75 @@ Represents CPAP therapy sessions in the database.
 Uses existing database schema but provides Flask-compatible interface.
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index, UniqueConstraint
 from datetime import datetime
 from app.core.database import Base
 
+def compute_quality_score(ahi, duration_minutes, mask_leak_95):
+    """
+    Therapy quality score (0-100) from raw column values.
+
+    Kept separate from the model so bulk imports can score rows without
+    building ORM instances.
+    """
+    try:
+        # Check if required fields are present and not None
+        if ahi is None or duration_minutes is None or mask_leak_95 is None:
+            return None
+        
+        # Convert to float to ensure proper calculation
+        ahi = float(ahi)
+        duration_hours = float(duration_minutes) / 60  # Convert to hours
+        leak = float(mask_leak_95)
+        
+        # AHI score (lower is better, target < 5)
+        if ahi <= 5:
+            ahi_score = 100
+        elif ahi <= 15:
+            ahi_score = 100 - ((ahi - 5) * 5)  # Decrease by 5 points per unit above 5
+        else:
+            ahi_score = max(0, 50 - ((ahi - 15) * 2))  # Steeper decline above 15
+        
+        # Duration score (target 7+ hours)
+        if duration_hours >= 7:
+            duration_score = 100
+        elif duration_hours >= 4:
+            duration_score = (duration_hours / 7.0) * 100
+        else:
+            duration_score = max(0, (duration_hours / 4.0) * 50)  # Penalty for very short usage
+        
+        # Leak score (lower is better, target < 24 L/min)
+        if leak <= 24:
+            leak_score = 100 - (leak / 24.0) * 20  # Linear decrease up to 24
+        else:
+            leak_score = max(0, 80 - ((leak - 24) * 2))  # Steeper penalty above 24
+        
+        # Weighted average (AHI is most important)
+        quality_score = (ahi_score * 0.5 + duration_score * 0.3 + leak_score * 0.2)
+        
+        return round(min(100, max(0, quality_score)), 1)
+        
+    except (TypeError, ValueError, ZeroDivisionError) as e:
+        print(f"Error calculating quality score: {e}")
+        return None
+
 class Session(Base):
     """CPAP therapy session model - Compatible with existing DB schema"""
     
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Per-user range scans and ordering on start_time; unique so imports
+        # can INSERT .. ON CONFLICT (user_id, start_time) instead of check-then-insert
+        Index("ix_sessions_user_id_start_time", "user_id", "start_time", unique=True),
+        # Device session ids (resmed_20250101_223000) repeat across users
+        UniqueConstraint("user_id", "session_id", name="uq_sessions_user_id_session_id"),
+    )
     
     # Primary key
     id = Column(Integer, primary_key=True, index=True)
     
     # Session identification (matching existing DB schema)
-    session_id = Column(String(255), unique=True, index=True, nullable=True)
+    session_id = Column(String(255), index=True, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=True)
     
@@ -85,46 +140,7 @@ class Session(Base):
     
     def calculate_quality_score(self):
         """Calculate therapy quality score (0-100) based on session data"""
-        try:
-            # Check if required fields are present and not None
-            if self.ahi is None or self.duration_minutes is None or self.mask_leak_95 is None:
-                return None
-            
-            # Convert to float to ensure proper calculation
-            ahi = float(self.ahi)
-            duration_hours = float(self.duration_minutes) / 60  # Convert to hours
-            leak = float(self.mask_leak_95)
-            
-            # AHI score (lower is better, target < 5)
-            if ahi <= 5:
-                ahi_score = 100
-            elif ahi <= 15:
-                ahi_score = 100 - ((ahi - 5) * 5)  # Decrease by 5 points per unit above 5
-            else:
-                ahi_score = max(0, 50 - ((ahi - 15) * 2))  # Steeper decline above 15
-            
-            # Duration score (target 7+ hours)
-            if duration_hours >= 7:
-                duration_score = 100
-            elif duration_hours >= 4:
-                duration_score = (duration_hours / 7.0) * 100
-            else:
-                duration_score = max(0, (duration_hours / 4.0) * 50)  # Penalty for very short usage
-            
-            # Leak score (lower is better, target < 24 L/min)
-            if leak <= 24:
-                leak_score = 100 - (leak / 24.0) * 20  # Linear decrease up to 24
-            else:
-                leak_score = max(0, 80 - ((leak - 24) * 2))  # Steeper penalty above 24
-            
-            # Weighted average (AHI is most important)
-            quality_score = (ahi_score * 0.5 + duration_score * 0.3 + leak_score * 0.2)
-            
-            return round(min(100, max(0, quality_score)), 1)
-            
-        except (TypeError, ValueError, ZeroDivisionError) as e:
-            print(f"Error calculating quality score: {e}")
-            return None
+        return compute_quality_score(self.ahi, self.duration_minutes, self.mask_leak_95)
     
     def to_dict(self):
         """Convert session object to dictionary (Flask-compatible format)"""
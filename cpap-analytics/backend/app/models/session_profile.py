@@ -0,0 +1,37 @@
+"""
+Session Profile Database Model
+
+Hour-of-night leak and event profile (see app.analytics.night_profile)
+of each imported session, computed once from the high-resolution data so
+profiles over many nights are sums of these rows.
+"""
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, Index, UniqueConstraint
+from datetime import datetime
+from app.core.database import Base
+
+class SessionProfile(Base):
+    """Hourly leak and event totals of one session"""
+    
+    __tablename__ = "session_profiles"
+    __table_args__ = (
+        Index("ix_session_profiles_user_id_day", "user_id", "day"),
+        UniqueConstraint("user_id", "session_id", name="uq_session_profiles_user_id_session_id"),
+    )
+    
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Ownership; session_id matches sessions.session_id
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    session_id = Column(String(255), nullable=False)
+    day = Column(Date, nullable=False)  # Date of the session's start
+    
+    # NightProfile.to_json() as a JSON string
+    data = Column(Text, nullable=False)
+    
+    # Metadata
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<SessionProfile(user_id={self.user_id}, session_id={self.session_id}, day={self.day})>"
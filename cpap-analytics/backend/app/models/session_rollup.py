@@ -0,0 +1,160 @@
+"""
+Session Rollup Database Model
+
+Per-user aggregates of nightly sessions for one day, ISO week or month.
+Rows are maintained incrementally as sessions are imported, so analytics
+endpoints read O(periods) rollups instead of scanning raw sessions.
+"""
+
+import math
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, UniqueConstraint
+from datetime import datetime
+from typing import Dict, Any, Iterable, Optional
+from app.core.database import Base
+
+# Metrics aggregated per period (duration is in hours)
+ROLLUP_METRICS = ("ahi", "duration", "leak", "pressure")
+
+class SessionRollup(Base):
+    """Counts, sums, sums of squares and extremes of session metrics for one period"""
+
+    __tablename__ = "session_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", "period_start", name="uq_session_rollups_user_period"),
+    )
+
+    # Period types
+    PERIOD_DAY = "day"
+    PERIOD_WEEK = "week"    # ISO week, starting Monday
+    PERIOD_MONTH = "month"
+
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Ownership and period
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    period = Column(String(10), nullable=False)
+    period_start = Column(Date, nullable=False)
+
+    # Nights
+    session_count = Column(Integer, default=0, nullable=False)
+    night_count = Column(Integer, default=0, nullable=False)       # Days with at least one session
+    compliant_nights = Column(Integer, default=0, nullable=False)  # Days with >= 4 hours of use
+
+    # AHI (events/hour)
+    ahi_count = Column(Integer, default=0, nullable=False)
+    ahi_sum = Column(Float, default=0.0, nullable=False)
+    ahi_sumsq = Column(Float, default=0.0, nullable=False)
+    ahi_min = Column(Float, nullable=True)
+    ahi_max = Column(Float, nullable=True)
+
+    # Usage duration (hours)
+    duration_count = Column(Integer, default=0, nullable=False)
+    duration_sum = Column(Float, default=0.0, nullable=False)
+    duration_sumsq = Column(Float, default=0.0, nullable=False)
+    duration_min = Column(Float, nullable=True)
+    duration_max = Column(Float, nullable=True)
+
+    # Mask leak, 95th percentile (L/min)
+    leak_count = Column(Integer, default=0, nullable=False)
+    leak_sum = Column(Float, default=0.0, nullable=False)
+    leak_sumsq = Column(Float, default=0.0, nullable=False)
+    leak_min = Column(Float, nullable=True)
+    leak_max = Column(Float, nullable=True)
+
+    # Average pressure (cmH2O)
+    pressure_count = Column(Integer, default=0, nullable=False)
+    pressure_sum = Column(Float, default=0.0, nullable=False)
+    pressure_sumsq = Column(Float, default=0.0, nullable=False)
+    pressure_min = Column(Float, nullable=True)
+    pressure_max = Column(Float, nullable=True)
+
+    # Metadata
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def empty(cls, **kwargs) -> "SessionRollup":
+        """
+        New rollup with every counter at zero (column defaults only apply on
+        insert). Extremes are set explicitly too, so new rollups share one
+        column set and the ORM can insert them in a single batch.
+        """
+        rollup = cls(session_count=0, night_count=0, compliant_nights=0, **kwargs)
+        for metric in ROLLUP_METRICS:
+            setattr(rollup, f"{metric}_count", 0)
+            setattr(rollup, f"{metric}_sum", 0.0)
+            setattr(rollup, f"{metric}_sumsq", 0.0)
+            setattr(rollup, f"{metric}_min", None)
+            setattr(rollup, f"{metric}_max", None)
+        return rollup
+
+    @classmethod
+    def combine(cls, rollups: Iterable["SessionRollup"]) -> "SessionRollup":
+        """Merge rollups into one transient (unsaved) rollup covering all of them"""
+        total = cls.empty()
+        for rollup in rollups:
+            total.session_count += rollup.session_count
+            total.night_count += rollup.night_count
+            total.compliant_nights += rollup.compliant_nights
+            for metric in ROLLUP_METRICS:
+                for suffix in ("count", "sum", "sumsq"):
+                    field = f"{metric}_{suffix}"
+                    setattr(total, field, getattr(total, field) + getattr(rollup, field))
+                total._merge_extremes(metric, getattr(rollup, f"{metric}_min"), getattr(rollup, f"{metric}_max"))
+        return total
+
+    def _merge_extremes(self, metric: str, low: Optional[float], high: Optional[float]) -> None:
+        current_min = getattr(self, f"{metric}_min")
+        current_max = getattr(self, f"{metric}_max")
+        if low is not None and (current_min is None or low < current_min):
+            setattr(self, f"{metric}_min", low)
+        if high is not None and (current_max is None or high > current_max):
+            setattr(self, f"{metric}_max", high)
+
+    def mean(self, metric: str) -> Optional[float]:
+        """Mean of a metric over the period (None without values)"""
+        count = getattr(self, f"{metric}_count")
+        return getattr(self, f"{metric}_sum") / count if count else None
+
+    def stdev(self, metric: str) -> Optional[float]:
+        """Sample standard deviation of a metric from its sum and sum of squares"""
+        count = getattr(self, f"{metric}_count")
+        if count < 2:
+            return None
+        total = getattr(self, f"{metric}_sum")
+        variance = (getattr(self, f"{metric}_sumsq") - total * total / count) / (count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    @property
+    def usage_hours(self) -> Optional[float]:
+        """Average usage per night with data"""
+        return self.duration_sum / self.night_count if self.night_count else None
+
+    @property
+    def compliance_rate(self) -> Optional[float]:
+        """Percentage of nights with data that reached 4 hours of use"""
+        return self.compliant_nights / self.night_count * 100 if self.night_count else None
+
+    def __repr__(self):
+        return f"<SessionRollup(user_id={self.user_id}, {self.period} {self.period_start}, sessions={self.session_count})>"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert rollup to dictionary"""
+        data = {
+            "period": self.period,
+            "period_start": self.period_start.isoformat() if self.period_start is not None else None,
+            "session_count": self.session_count,
+            "night_count": self.night_count,
+            "compliant_nights": self.compliant_nights,
+            "compliance_rate": self.compliance_rate,
+            "usage_hours": self.usage_hours
+        }
+        for metric in ROLLUP_METRICS:
+            data[metric] = {
+                "count": getattr(self, f"{metric}_count"),
+                "mean": self.mean(metric),
+                "stdev": self.stdev(metric),
+                "min": getattr(self, f"{metric}_min"),
+                "max": getattr(self, f"{metric}_max")
+            }
+        return data
@@ -0,0 +1,38 @@
+"""
+Session Sketch Database Model
+
+Quantile sketches (see app.analytics.quantile_sketch) of a night's
+high-resolution leak and pressure samples. Percentiles over any date
+range are read by merging the nightly sketches instead of the waveforms.
+"""
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, LargeBinary, Index, UniqueConstraint
+from datetime import datetime
+from app.core.database import Base
+
+class SessionSketch(Base):
+    """Serialized leak and pressure sketches of one session"""
+    
+    __tablename__ = "session_sketches"
+    __table_args__ = (
+        Index("ix_session_sketches_user_id_day", "user_id", "day"),
+        UniqueConstraint("user_id", "session_id", name="uq_session_sketches_user_id_session_id"),
+    )
+    
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Ownership; session_id matches sessions.session_id
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    session_id = Column(String(255), nullable=False)
+    day = Column(Date, nullable=False)  # Date of the session's start
+    
+    # QuantileSketch.to_bytes(); leak in L/min, pressure in cmH2O
+    leak = Column(LargeBinary, nullable=True)
+    pressure = Column(LargeBinary, nullable=True)
+    
+    # Metadata
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<SessionSketch(user_id={self.user_id}, session_id={self.session_id}, day={self.day})>"
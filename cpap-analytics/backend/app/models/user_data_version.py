@@ -0,0 +1,25 @@
+"""
+User Data Version Database Model
+
+A per-user counter bumped in every transaction that inserts, updates or
+deletes one of the user's sessions. Responses derived from a user's
+sessions use it as their ETag, so an unchanged version means an
+unchanged response.
+"""
+
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+from app.core.database import Base
+
+class UserDataVersion(Base):
+    """Current version of one user's session data"""
+    
+    __tablename__ = "user_data_versions"
+    
+    # One row per user, created on the first session write
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, default=1, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<UserDataVersion(user_id={self.user_id}, version={self.version})>"
@@ -7,6 +7,7 @@ Currently supports:
 - Philips DreamStation (planned)
 """
 
-from .resmed import ResMedParser
+from .resmed import ResMedParser, ParseResult
+from .edf import EDFReader, EDFError
 
-__all__ = ["ResMedParser"]
+__all__ = ["ResMedParser", "ParseResult", "EDFReader", "EDFError"]
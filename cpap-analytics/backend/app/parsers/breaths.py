@@ -0,0 +1,131 @@
+"""
+Breath Segmentation
+
+Splits a night of patient flow (L/s, inspiration positive) into breaths
+and derives respiratory rate, tidal volume and minute ventilation from
+them, all with whole-array NumPy operations.
+
+A breath runs from one inspiration onset to the next. Onsets are the
+upward zero crossings of flow, but only those that follow a real
+expiration: flow must have gone below -threshold since the last
+inspiration and above +threshold after the crossing (hysteresis), so
+sensor noise around zero does not split breaths. The hysteresis state is
+forward filled with ``np.maximum.accumulate`` over sample indices. Tidal
+volume is the inspired volume, the integral of flow from the onset to the
+following downward crossing, read off one cumulative sum.
+
+Breaths shorter than MIN_BREATH_SECONDS or longer than MAX_BREATH_SECONDS
+(apneas, mask off) are kept in the arrays but left out of the nightly
+averages.
+"""
+
+from dataclasses import dataclass
+from typing import Dict
+
+import numpy as np
+
+# Hysteresis as a fraction of the night's 95th percentile absolute flow
+THRESHOLD_FRACTION = 0.1
+
+# Floor for the hysteresis, in L/s, so a flat (mask off) night finds no breaths
+MIN_THRESHOLD = 0.02
+
+# Plausible breath durations (60 down to 3 breaths/min)
+MIN_BREATH_SECONDS = 1.0
+MAX_BREATH_SECONDS = 20.0
+
+
+@dataclass
+class Breaths:
+    """Breath-by-breath arrays of one night; indices are samples of the flow signal"""
+    sample_rate: float
+    start: np.ndarray             # inspiration onset
+    inspiration_end: np.ndarray   # expiration onset
+    end: np.ndarray               # next breath's inspiration onset
+    tidal_volume: np.ndarray      # inspired volume, L
+
+    def __len__(self) -> int:
+        return int(self.start.size)
+
+    @property
+    def duration(self) -> np.ndarray:
+        """Seconds per breath"""
+        return (self.end - self.start) / self.sample_rate
+
+    @property
+    def inspiratory_time(self) -> np.ndarray:
+        return (self.inspiration_end - self.start) / self.sample_rate
+
+    @property
+    def respiratory_rate(self) -> np.ndarray:
+        """Breaths per minute, breath by breath"""
+        return 60.0 / self.duration
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Mask of breaths with a plausible duration"""
+        duration = self.duration
+        return (duration >= MIN_BREATH_SECONDS) & (duration <= MAX_BREATH_SECONDS)
+
+
+def _crossings_before(crossings: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Last crossing at or before each position"""
+    return crossings[np.searchsorted(crossings, positions, side="right") - 1]
+
+
+def segment_breaths(flow: np.ndarray, sample_rate: float) -> Breaths:
+    """Breaths in a flow signal (physical L/s, inspiration positive)"""
+    flow = np.asarray(flow, dtype=np.float64).reshape(-1)
+    empty = np.empty(0, dtype=np.int64)
+    if flow.size < 3 or sample_rate <= 0:
+        return Breaths(sample_rate, empty, empty, empty, np.empty(0))
+
+    threshold = max(MIN_THRESHOLD, THRESHOLD_FRACTION * float(np.percentile(np.abs(flow), 95)))
+
+    # Hysteresis state: +1 after flow rose above +threshold, -1 after it fell below -threshold
+    state = np.zeros(flow.size, dtype=np.int8)
+    state[flow > threshold] = 1
+    state[flow < -threshold] = -1
+    last_set = np.where(state != 0, np.arange(flow.size), 0)
+    np.maximum.accumulate(last_set, out=last_set)
+    state = state[last_set]
+
+    change = np.diff(state)
+    inspirations = np.flatnonzero(change == 2) + 1   # -1 -> +1
+    expirations = np.flatnonzero(change == -2) + 1   # +1 -> -1
+    if inspirations.size < 2:
+        return Breaths(sample_rate, empty, empty, empty, np.empty(0))
+
+    positive = flow > 0
+    rising = np.flatnonzero(~positive[:-1] & positive[1:]) + 1
+    falling = np.flatnonzero(positive[:-1] & ~positive[1:]) + 1
+
+    # Every inspiration after the first expiration has a rising crossing before it,
+    # and between two inspirations there is exactly one expiration
+    onsets = _crossings_before(rising, inspirations)
+    start, end = onsets[:-1], onsets[1:]
+    expiration = expirations[np.searchsorted(expirations, inspirations[:-1])]
+    inspiration_end = _crossings_before(falling, expiration)
+
+    inspired = np.concatenate(([0.0], np.cumsum(np.clip(flow, 0.0, None)))) / sample_rate
+    tidal_volume = inspired[inspiration_end] - inspired[start]
+    return Breaths(sample_rate, start, inspiration_end, end, tidal_volume)
+
+
+def breath_summary(breaths: Breaths) -> Dict[str, float]:
+    """
+    Nightly respiratory rate (breaths/min), tidal volume (mL) and minute
+    ventilation (L/min) over the plausible breaths; empty if there are none.
+    """
+    valid = breaths.valid
+    count = int(np.count_nonzero(valid))
+    if count == 0:
+        return {}
+    breathing_minutes = breaths.duration[valid].sum() / 60
+    volume = breaths.tidal_volume[valid]
+    return {
+        "breaths": count,
+        "resp_rate_avg": round(count / breathing_minutes, 2),
+        "tidal_volume_avg": round(float(volume.mean()) * 1000, 1),
+        "minute_vent_avg": round(float(volume.sum()) / breathing_minutes, 2)
+    }
@@ -3,15 +3,31 @@ ResMed AirSense 10/11 Data Parser
 
 Parses data from ResMed SD card files in EDF format.
 Supports summary statistics and detailed session data.
+
+Quantile sketches and hourly profiles of a night are built by callables
+passed to the parser (see ResMedParser), so parsing does not depend on the
+analytics that read them.
 """
 
 import os
-import struct
 import datetime
+import functools
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional, BinaryIO
+from typing import Any, List, Dict, Optional, Iterable, Callable, Tuple
 import numpy as np
-from dataclasses import dataclass
+from dataclasses import dataclass, fields, replace
+
+from .breaths import breath_summary, segment_breaths
+from .edf import EDFReader, EDFSignal, is_edf_file
+from .stitching import TherapyDay, group_therapy_days, merge_overlapping
+
+# (distinct sample values in reporting units, how often each occurs) -> serialized sketch
+SketchBuilder = Callable[[np.ndarray, np.ndarray], bytes]
+
+# (start_time, duration_seconds, leak=, leak_rate=, events=) -> hourly profile
+# with a combine_partial(other) method, e.g. NightProfile.for_session
+ProfileBuilder = Callable[..., Any]
 
 
 @dataclass
@@ -31,9 +47,13 @@ class CPAPSession:
     pressure_min: float   # cmH2O
     pressure_95: float    # 95th percentile pressure
     pressure_max: float
+    pressure_avg: float = 0.0     # cmH2O
     minute_vent_avg: float = 0.0  # L/min
     resp_rate_avg: float = 0.0    # breaths/min
     tidal_volume_avg: float = 0.0 # mL
+    leak_sketch: Optional[bytes] = None      # Quantile sketch of leak samples (L/min)
+    pressure_sketch: Optional[bytes] = None  # Quantile sketch of pressure samples (cmH2O)
+    profile: Optional[Any] = None            # Hourly leak and event totals
     
     def quality_score(self) -> float:
         """Calculate session quality score (0-100)"""
@@ -44,6 +64,59 @@ class CPAPSession:
         
         return (ahi_score * 0.5) + (leak_score * 0.3) + (duration_score * 0.2)
 
+    def merge(self, other: "CPAPSession") -> "CPAPSession":
+        """
+        Combine two partial sessions decoded from different files of the same
+        night (e.g. PLD leak/pressure and EVE events). Metrics missing (zero)
+        on this session are taken from ``other``.
+        """
+        updates = self._missing_metrics(other, skipped=("profile",))
+        if self.profile is not None and other.profile is not None:
+            updates["profile"] = self.profile.combine_partial(other.profile)
+        elif self.profile is None:
+            updates["profile"] = other.profile
+
+        start_time = min(self.start_time, other.start_time)
+        end_time = max(self.end_time, other.end_time)
+        return replace(
+            self,
+            start_time=start_time,
+            end_time=end_time,
+            duration_minutes=max(self.duration_minutes, other.duration_minutes),
+            **updates
+        )
+
+    def merge_duplicate(self, other: "CPAPSession") -> "CPAPSession":
+        """
+        Combine two overlapping recordings of the same therapy (BRP and EDF
+        files of one night, the same night from two uploads). Both saw the
+        same events, so nothing is added up: metrics and the hourly profile
+        come from the longer recording (a truncated copy saw only part of
+        the events), with those it is missing taken from the shorter one.
+        The result keeps this session's id and spans both recordings.
+        """
+        base, extra = (other, self) if other.duration_minutes > self.duration_minutes else (self, other)
+        start_time = min(self.start_time, other.start_time)
+        end_time = max(self.end_time, other.end_time)
+        return replace(
+            base,
+            session_id=self.session_id,
+            start_time=start_time,
+            end_time=end_time,
+            duration_minutes=(end_time - start_time).total_seconds() / 60,
+            **base._missing_metrics(extra)
+        )
+
+    def _missing_metrics(self, other: "CPAPSession", skipped: Iterable[str] = ()) -> Dict[str, Any]:
+        """Metrics missing (zero or None) on this session that ``other`` has"""
+        updates = {}
+        for field in fields(self):
+            if field.name in ("session_id", "start_time", "end_time", "duration_minutes") or field.name in skipped:
+                continue
+            if not getattr(self, field.name) and getattr(other, field.name):
+                updates[field.name] = getattr(other, field.name)
+        return updates
+
     def to_dict(self) -> Dict:
         """Convert session to dictionary for API responses"""
         return {
@@ -66,6 +139,7 @@ class CPAPSession:
                     "95_percentile": self.mask_leak_95
                 },
                 "pressure": {
+                    "average": self.pressure_avg,
                     "min": self.pressure_min,
                     "95_percentile": self.pressure_95,
                     "max": self.pressure_max
@@ -80,30 +154,63 @@ class CPAPSession:
         }
 
 
+@dataclass
+class ParseResult:
+    """Outcome of parsing a single SD card file"""
+    file_path: Path
+    session: Optional[CPAPSession] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
 class ResMedParser:
     """Parser for ResMed AirSense 10/11 SD card data"""
+
+    # File suffixes (case-insensitive) that hold session data
+    SESSION_FILE_SUFFIXES = ('.edf', '.brp')
     
-    # ResMed file signatures
-    FILE_SIGNATURES = {
-        b'BRP': 'summary',
-        b'XDA': 'event',
-        b'SAD': 'detailed'
+    # EDF file types, keyed by the suffix of the file stem (e.g. 20250101_223000_PLD)
+    EDF_FILE_TYPES = {
+        'BRP': 'detailed',  # High-resolution flow and pressure (25 Hz)
+        'PLD': 'detailed',  # Pressure, leak and ventilation (0.5 Hz)
+        'SAD': 'detailed',  # SpO2 and pulse (1 Hz)
+        'EVE': 'summary',   # Respiratory event annotations
+        'CSL': 'summary'    # Cheyne-Stokes respiration annotations
+    }
+
+    # Event annotation text -> CPAPSession counter
+    EVENT_TYPES = {
+        'obstructive apnea': 'obstructive_apneas',
+        'central apnea': 'central_apneas',
+        'hypopnea': 'hypopneas',
+        'apnea': 'total_apneas'  # Unclassified apnea
     }
     
-    def __init__(self, sd_card_path: str):
+    def __init__(self, sd_card_path: str, sketch_builder: Optional[SketchBuilder] = None,
+                 profile_builder: Optional[ProfileBuilder] = None):
         """
         Initialize parser with SD card path
         
         Args:
             sd_card_path: Path to SD card mount point
+            sketch_builder: Builds the leak and pressure sketches of a night;
+                without one, sessions carry no sketches
+            profile_builder: Builds the hourly profile of a night; without
+                one, sessions carry no profile
         """
         self.sd_path = Path(sd_card_path)
+        self.sketch_builder = sketch_builder
+        self.profile_builder = profile_builder
         self.data_path = self.sd_path / 'DATALOG'
         
         if not self.data_path.exists():
             raise ValueError(f"No DATALOG directory found at {sd_card_path}")
             
         self.sessions: List[CPAPSession] = []
+        self.parse_errors: List[ParseResult] = []
         
     def validate_sd_card(self) -> bool:
         """Validate that this is a ResMed SD card"""
@@ -113,184 +220,314 @@ class ResMedParser:
                 return False
                 
             # Check for ResMed identifier files
-            resmed_files = list(self.data_path.glob('*.edf')) + list(self.data_path.glob('*.BRP'))
-            return len(resmed_files) > 0
+            return next(self._iter_session_files(), None) is not None
             
         except Exception:
             return False
+
+    def _iter_session_files(self) -> Iterable[Path]:
+        """
+        Walk DATALOG once, yielding every session file.
+
+        AirSense 10 cards keep files directly in DATALOG, AirSense 11 cards
+        in per-night DATALOG/YYYYMMDD folders; both layouts are covered.
+        """
+        for root, dirs, files in os.walk(self.data_path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(self.SESSION_FILE_SUFFIXES):
+                    yield Path(root) / name
+
+    def scan_session_files(self) -> List[Path]:
+        """All session files on the card in deterministic (path) order"""
+        return list(self._iter_session_files())
     
-    def parse_all_sessions(self) -> List[CPAPSession]:
+    def parse_all_sessions(self, max_workers: int = 1, chunk_size: int = 16) -> List[CPAPSession]:
         """
         Parse all therapy sessions from SD card
         
+        Args:
+            max_workers: Number of worker processes; 1 parses in-process
+            chunk_size: Files handed to a worker per task when max_workers > 1
+
         Returns:
-            List of CPAPSession objects sorted by date
+            List of CPAPSession objects sorted by date. Files that failed to
+            parse are available afterwards in ``self.parse_errors``.
         """
-        sessions = []
-        
-        # Find all session files
-        for file_path in self.data_path.glob('*.edf'):
-            try:
-                session = self._parse_session_file(file_path)
-                if session:
-                    sessions.append(session)
-            except Exception as e:
-                print(f"Warning: Error reading {file_path}: {e}")
-                continue
-                
-        # Also check for .BRP files (summary data)
-        for file_path in self.data_path.glob('*.BRP'):
-            try:
-                session = self._parse_session_file(file_path)
-                if session:
-                    sessions.append(session)
-            except Exception as e:
-                print(f"Warning: Error reading {file_path}: {e}")
-                continue
+        results = self.parse_files(self.scan_session_files(), max_workers, chunk_size)
+        self.parse_errors = [result for result in results if not result.ok]
+        sessions = [result.session for result in results if result.session is not None]
                 
-        # Sort by date and remove duplicates
+        # Sort by date, combine per-file partial sessions and remove duplicates
         sessions.sort(key=lambda x: x.start_time)
+        sessions = self.merge_partial_sessions(sessions)
         self.sessions = self._deduplicate_sessions(sessions)
         return self.sessions
-    
-    def _parse_session_file(self, file_path: Path) -> Optional[CPAPSession]:
-        """Parse a single session file"""
+
+    def parse_files(self, file_paths: List[Path], max_workers: int = 1, chunk_size: int = 16,
+                    progress: Optional[Callable[[ParseResult], None]] = None) -> List[ParseResult]:
+        """
+        Parse the given files, optionally on a process pool.
+
+        Decoding is CPU-bound, so large cards benefit from ``max_workers`` > 1.
+        Results are returned in the same order as ``file_paths`` regardless of
+        which worker finished first. ``progress`` is called with each result
+        as it becomes available.
+        """
+        if max_workers <= 1 or len(file_paths) <= 1:
+            return self._collect(map(self._parse_file_result, file_paths), progress)
+
+        # Builders must be picklable (module-level functions or classmethods)
+        worker = functools.partial(
+            _parse_file_in_worker, str(self.sd_path), self.sketch_builder, self.profile_builder
+        )
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(worker, file_paths, chunksize=max(1, chunk_size))
+            return self._collect(results, progress)
+
+    @staticmethod
+    def _collect(results: Iterable[ParseResult],
+                 progress: Optional[Callable[[ParseResult], None]]) -> List[ParseResult]:
+        collected = []
+        for result in results:
+            collected.append(result)
+            if progress:
+                progress(result)
+        return collected
+
+    def _parse_file_result(self, file_path: Path) -> ParseResult:
+        """Parse one file, capturing any error in the result instead of raising"""
         try:
-            with open(file_path, 'rb') as f:
-                # Read file header
-                header = f.read(4)
-                if not header:
-                    return None
-                    
-                # For .BRP files, signature might be different
-                if file_path.suffix.upper() == '.BRP':
-                    return self._parse_brp_file(f, file_path)
-                elif header[:3] in self.FILE_SIGNATURES:
-                    file_type = self.FILE_SIGNATURES[header[:3]]
-                    if file_type == 'summary':
-                        return self._parse_summary_data(f, file_path)
-                    elif file_type == 'detailed':
-                        return self._parse_detailed_data(f, file_path)
-                        
+            return ParseResult(file_path=file_path, session=self._parse_session_file(file_path))
         except Exception as e:
-            print(f"Error parsing {file_path}: {e}")
-            return None
+            return ParseResult(file_path=file_path, error=f"{type(e).__name__}: {e}")
+    
+    def _parse_session_file(self, file_path: Path) -> Optional[CPAPSession]:
+        """
+        Parse a single session file
+
+        Returns None for files without session data, including bare .BRP
+        files that are not EDF; decoding errors are raised so callers can
+        report them per file.
+        """
+        with open(file_path, 'rb') as f:
+            # Read file header
+            header = f.read(8)
+
+        if is_edf_file(header):
+            with EDFReader(file_path) as edf:
+                if self._edf_file_type(file_path) == 'summary':
+                    return self._parse_summary_data(edf, file_path)
+                return self._parse_detailed_data(edf, file_path)
             
         return None
+
+    def _edf_file_type(self, file_path: Path) -> str:
+        """Classify an EDF file by its ResMed stem suffix (defaults to detailed)"""
+        suffix = file_path.stem.rsplit('_', 1)[-1].upper()
+        return self.EDF_FILE_TYPES.get(suffix, 'detailed')
+
+    @staticmethod
+    def session_id_for(file_path: Path) -> str:
+        """Session ID shared by all files of one session (20250101_223000_PLD -> resmed_20250101_223000)"""
+        stem = file_path.stem
+        prefix, _, suffix = stem.rpartition('_')
+        if prefix and suffix.upper() in ResMedParser.EDF_FILE_TYPES:
+            stem = prefix
+        return f"resmed_{stem}"
     
-    def _parse_brp_file(self, file_handle: BinaryIO, file_path: Path) -> Optional[CPAPSession]:
-        """Parse .BRP summary file (simplified implementation)"""
-        try:
-            # Reset to beginning
-            file_handle.seek(0)
-            
-            # This is a simplified parser - real implementation would need
-            # full ResMed format specification
-            
-            # Extract date from filename (common pattern: YYYYMMDD.BRP)
-            filename = file_path.stem
-            try:
-                session_date = datetime.datetime.strptime(filename, '%Y%m%d')
-            except ValueError:
-                # Fallback to file modification time
-                session_date = datetime.datetime.fromtimestamp(file_path.stat().st_mtime)
-            
-            # Generate session ID
-            session_id = f"resmed_{filename}"
-            
-            # For now, return a placeholder session with minimal data
-            # Real implementation would parse binary format
-            session = CPAPSession(
-                session_id=session_id,
-                start_time=session_date.replace(hour=22, minute=30),  # Typical bedtime
-                end_time=session_date.replace(hour=6, minute=30) + datetime.timedelta(days=1),
-                duration_minutes=480,  # 8 hours default
-                ahi=2.5,  # Placeholder
-                total_apneas=12,
-                obstructive_apneas=8,
-                central_apneas=2,
-                hypopneas=2,
-                mask_leak_avg=8.5,
-                mask_leak_95=15.2,
-                pressure_min=8.0,
-                pressure_95=11.5,
-                pressure_max=13.2
-            )
-            
-            return session
-            
-        except Exception as e:
-            print(f"Error parsing BRP file {file_path}: {e}")
+    def _parse_summary_data(self, edf: EDFReader, file_path: Path) -> Optional[CPAPSession]:
+        """Parse respiratory event annotations (EVE/CSL) into event counts and AHI"""
+        duration_seconds = edf.header.duration_seconds
+        if duration_seconds <= 0:
             return None
+
+        counts = {name: 0 for name in self.EVENT_TYPES.values()}
+        onsets = {name: [] for name in self.EVENT_TYPES.values()}
+        for annotation in edf.annotations():
+            counter = self.EVENT_TYPES.get(annotation.text.strip().lower())
+            if counter:
+                counts[counter] += 1
+                onsets[counter].append(annotation.onset)
+        # Before classified apneas are added in, total_apneas holds the unclassified ones
+        onsets['unclassified_apneas'] = onsets.pop('total_apneas')
+
+        # Classified apneas also count towards the apnea total
+        counts['total_apneas'] += counts['obstructive_apneas'] + counts['central_apneas']
+        hours = duration_seconds / 3600
+
+        return CPAPSession(
+            session_id=self.session_id_for(file_path),
+            start_time=edf.start_time,
+            end_time=edf.end_time,
+            duration_minutes=duration_seconds / 60,
+            ahi=round((counts['total_apneas'] + counts['hypopneas']) / hours, 2),
+            total_apneas=counts['total_apneas'],
+            obstructive_apneas=counts['obstructive_apneas'],
+            central_apneas=counts['central_apneas'],
+            hypopneas=counts['hypopneas'],
+            mask_leak_avg=0.0,
+            mask_leak_95=0.0,
+            pressure_min=0.0,
+            pressure_95=0.0,
+            pressure_max=0.0,
+            profile=self._profile(edf.start_time, duration_seconds, events=onsets)
+        )
     
-    def _parse_summary_data(self, file_handle: BinaryIO, file_path: Path) -> Optional[CPAPSession]:
-        """Parse summary statistics file"""
-        try:
-            # Skip to data section (this offset would need to be determined
-            # from ResMed specification)
-            file_handle.seek(0x200)
-            
-            # Read session data (example structure - would need real format)
-            data_size = struct.calcsize('<IIfffffffffff')
-            raw_data = file_handle.read(data_size)
-            
-            if len(raw_data) < data_size:
-                return None
-                
-            data = struct.unpack('<IIfffffffffff', raw_data)
-            
-            start_timestamp = data[0]
-            duration_seconds = data[1]
-            
-            # Create session ID from file path
-            session_id = f"resmed_{file_path.stem}"
-            
-            session = CPAPSession(
-                session_id=session_id,
-                start_time=datetime.datetime.fromtimestamp(start_timestamp),
-                end_time=datetime.datetime.fromtimestamp(start_timestamp + duration_seconds),
-                duration_minutes=duration_seconds / 60,
-                ahi=data[2],
-                total_apneas=int(data[3]),
-                obstructive_apneas=int(data[4]),
-                central_apneas=int(data[5]),
-                hypopneas=int(data[6]),
-                mask_leak_avg=data[7],
-                mask_leak_95=data[8],
-                pressure_min=data[9],
-                pressure_95=data[10],
-                pressure_max=data[11],
-                minute_vent_avg=data[12] if len(data) > 12 else 0.0,
-                resp_rate_avg=15.0,    # Would come from detailed data
-                tidal_volume_avg=500.0  # Would come from detailed data
-            )
-            
-            return session
-            
-        except Exception as e:
-            print(f"Error parsing summary data: {e}")
+    def _parse_detailed_data(self, edf: EDFReader, file_path: Path) -> Optional[CPAPSession]:
+        """
+        Parse signal data (BRP/PLD/SAD) into nightly leak, pressure and
+        ventilation statistics.
+
+        Statistics are computed on the int16 digital views and only the
+        resulting scalars are scaled to physical units.
+        Files without ventilation channels (BRP) get respiratory rate, tidal
+        volume and minute ventilation from breaths found in their flow.
+        Leak and pressure are also kept as quantile sketches, so percentiles
+        over many nights can be merged later, and leak is binned by hour
+        into the session's profile (when the parser has the builders).
+        """
+        duration_seconds = edf.header.duration_seconds
+        if duration_seconds <= 0:
             return None
-    
-    def _parse_detailed_data(self, file_handle: BinaryIO, file_path: Path) -> Optional[CPAPSession]:
-        """Parse detailed waveform data (not implemented in this version)"""
-        # Detailed data parsing would require extensive knowledge of ResMed format
-        # This is a placeholder for future implementation
-        print(f"Detailed data parsing not yet implemented for {file_path}")
-        return None
+
+        leak_signal = edf.find_signal('leak')
+        pressure_signal = edf.find_signal('maskpress', 'press')
+        leak_histogram = self._histogram(leak_signal)
+        pressure_histogram = self._histogram(pressure_signal)
+        leak = self._signal_summary(leak_signal, leak_histogram)
+        pressure = self._signal_summary(pressure_signal, pressure_histogram)
+        minute_vent = self._signal_summary(edf.find_signal('minvent'))
+        resp_rate = self._signal_summary(edf.find_signal('resprate'))
+        tidal_volume = self._signal_summary(edf.find_signal('tidvol'))
+        # Files without the device's own ventilation channels (BRP) carry flow
+        breathing = {} if resp_rate else self._breath_summary(edf.find_signal('flow'))
+
+        return CPAPSession(
+            session_id=self.session_id_for(file_path),
+            start_time=edf.start_time,
+            end_time=edf.end_time,
+            duration_minutes=duration_seconds / 60,
+            ahi=0.0,
+            total_apneas=0,
+            obstructive_apneas=0,
+            central_apneas=0,
+            hypopneas=0,
+            mask_leak_avg=leak.get('avg', 0.0),
+            mask_leak_95=leak.get('p95', 0.0),
+            pressure_min=pressure.get('min', 0.0),
+            pressure_95=pressure.get('p95', 0.0),
+            pressure_max=pressure.get('max', 0.0),
+            pressure_avg=pressure.get('avg', 0.0),
+            minute_vent_avg=minute_vent.get('avg', breathing.get('minute_vent_avg', 0.0)),
+            resp_rate_avg=resp_rate.get('avg', breathing.get('resp_rate_avg', 0.0)),
+            tidal_volume_avg=tidal_volume.get('avg', breathing.get('tidal_volume_avg', 0.0)),
+            leak_sketch=self._signal_sketch(leak_signal, leak_histogram),
+            pressure_sketch=self._signal_sketch(pressure_signal, pressure_histogram),
+            profile=self._leak_profile(leak_signal, edf.start_time, duration_seconds)
+        )
+
+    # Physical dimension -> factor converting to the units CPAPSession reports
+    # (leak/ventilation in L/min, tidal volume in mL)
+    UNIT_FACTORS = {
+        'l/s': 60.0,
+        'l': 1000.0
+    }
+
+    def _histogram(self, signal: Optional[EDFSignal]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Distinct int16 samples of a signal (ascending) and how often each occurs"""
+        if signal is None or len(signal) == 0:
+            return None
+        digital = signal.digital.reshape(-1)
+        low = int(digital.min())
+        counts = np.bincount(digital.astype(np.int64) - low)
+        present = np.flatnonzero(counts)
+        return present + low, counts[present]
+
+    def _unit_factor(self, signal: EDFSignal) -> float:
+        return self.UNIT_FACTORS.get(signal.header.physical_dimension.lower(), 1.0)
+
+    def _reporting_units(self, signal: EDFSignal, values: Any) -> Any:
+        """Digital values (or statistics of them) scaled to the units CPAPSession reports"""
+        return signal.to_physical(values) * self._unit_factor(signal)
+
+    def _signal_summary(self, signal: Optional[EDFSignal],
+                        histogram: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict[str, float]:
+        """
+        Mean, 95th percentile, min and max of a signal in reporting units,
+        from its histogram (see _histogram) instead of sorting the samples.
+        The percentile interpolates linearly like np.percentile.
+        """
+        if histogram is None:
+            histogram = self._histogram(signal)
+        if histogram is None:
+            return {}
+
+        values, counts = histogram
+        total = int(counts.sum())
+        cumulative = np.cumsum(counts)
+        rank = 0.95 * (total - 1)
+        below, above = np.searchsorted(cumulative, [np.floor(rank), np.ceil(rank)], side='right')
+        p95 = values[below] + (values[above] - values[below]) * (rank - np.floor(rank))
+
+        def scale(value: float) -> float:
+            return round(float(self._reporting_units(signal, value)), 2)
+
+        return {
+            'avg': scale(np.dot(values, counts) / total),
+            'p95': scale(p95),
+            'min': scale(values[0]),
+            'max': scale(values[-1])
+        }
+
+    def _signal_sketch(self, signal: Optional[EDFSignal],
+                       histogram: Optional[Tuple[np.ndarray, np.ndarray]]) -> Optional[bytes]:
+        """Serialized quantile sketch of a signal's samples in reporting units"""
+        if self.sketch_builder is None or histogram is None:
+            return None
+        values, counts = histogram
+        return self.sketch_builder(self._reporting_units(signal, values), counts)
+
+    def _profile(self, start_time: datetime.datetime, duration_seconds: float, **samples: Any) -> Optional[Any]:
+        """Hourly profile of a session, if the parser has a profile builder"""
+        if self.profile_builder is None:
+            return None
+        return self.profile_builder(start_time, duration_seconds, **samples)
+
+    def _leak_profile(self, leak: Optional[EDFSignal], start_time: datetime.datetime,
+                      duration_seconds: float) -> Optional[Any]:
+        """Hourly leak profile of a session (None without a leak signal)"""
+        if leak is None or len(leak) == 0:
+            return None
+        return self._profile(
+            start_time, duration_seconds,
+            leak=leak.physical() * self._unit_factor(leak), leak_rate=leak.sample_rate
+        )
+
+    def _breath_summary(self, flow: Optional[EDFSignal]) -> Dict[str, float]:
+        """Respiratory rate, tidal volume and minute ventilation from the breaths in a flow signal"""
+        if flow is None or len(flow) == 0:
+            return {}
+        values = flow.physical()
+        if flow.header.physical_dimension.lower() == 'l/min':
+            values /= 60
+        return breath_summary(segment_breaths(values, flow.sample_rate))
+
+    def merge_partial_sessions(self, sessions: List[CPAPSession]) -> List[CPAPSession]:
+        """Combine sessions decoded from different files of the same recording"""
+        merged: Dict[str, CPAPSession] = {}
+        for session in sessions:
+            existing = merged.get(session.session_id)
+            merged[session.session_id] = existing.merge(session) if existing else session
+        return list(merged.values())
     
     def _deduplicate_sessions(self, sessions: List[CPAPSession]) -> List[CPAPSession]:
-        """Remove duplicate sessions based on start time"""
-        seen_times = set()
-        unique_sessions = []
-        
-        for session in sessions:
-            # Round to nearest hour to catch near-duplicates
-            time_key = session.start_time.replace(minute=0, second=0, microsecond=0)
-            if time_key not in seen_times:
-                seen_times.add(time_key)
-                unique_sessions.append(session)
-                
-        return unique_sessions
+        """Merge sessions whose time ranges overlap (the same therapy read from different files)"""
+        return merge_overlapping(sessions)
+
+    def therapy_days(self) -> List[TherapyDay]:
+        """Parsed sessions grouped into noon-to-noon therapy days"""
+        return group_therapy_days(self.sessions)
     
     def get_device_info(self) -> Dict[str, str]:
         """Extract device information from SD card"""
@@ -316,3 +553,17 @@ class ResMedParser:
             self.parse_all_sessions()
             
         return [session.to_dict() for session in self.sessions]
+
+
+@functools.lru_cache(maxsize=None)
+def _worker_parser(sd_card_path: str, sketch_builder: Optional[SketchBuilder],
+                   profile_builder: Optional[ProfileBuilder]) -> ResMedParser:
+    """One parser per SD card per worker process"""
+    return ResMedParser(sd_card_path, sketch_builder, profile_builder)
+
+
+def _parse_file_in_worker(sd_card_path: str, sketch_builder: Optional[SketchBuilder],
+                          profile_builder: Optional[ProfileBuilder], file_path: Path) -> ParseResult:
+    """Process-pool entry point (must be a picklable module-level function)"""
+    parser = _worker_parser(sd_card_path, sketch_builder, profile_builder)
+    return parser._parse_file_result(Path(file_path))
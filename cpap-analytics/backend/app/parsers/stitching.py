@@ -0,0 +1,130 @@
+"""
+Session Stitching
+
+Cleans up the sessions decoded from a card (or several uploads of it)
+with one sort and one sweep:
+
+- merge_overlapping() merges sessions whose time ranges overlap. A device
+  records one session at a time, so overlapping sessions are the same
+  therapy seen through different files (BRP and EDF, the same night from
+  two uploads). Metrics missing on the earliest one are filled in from
+  the others without adding up events (CPAPSession.merge_duplicate).
+  Sessions that merely follow each other, such as mask-off/mask-on
+  segments, stay separate. overlap_groups() gives the groups themselves,
+  for callers that track where each merged session came from.
+- group_therapy_days() groups the merged segments into therapy days
+  running from noon to noon, so a night that crosses midnight, or is
+  split by a mask-off break, counts once, with its segment boundaries
+  kept.
+"""
+
+import datetime
+import functools
+import itertools
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    from .resmed import CPAPSession
+
+# Hour at which one therapy day ends and the next begins
+THERAPY_DAY_START_HOUR = 12
+
+
+def therapy_day(moment: datetime.datetime) -> datetime.date:
+    """Noon-to-noon day a moment belongs to (01:00 on the 2nd belongs to the 1st)"""
+    return (moment - datetime.timedelta(hours=THERAPY_DAY_START_HOUR)).date()
+
+
+def overlap_groups(sessions: Iterable["CPAPSession"]) -> List[List["CPAPSession"]]:
+    """
+    Sessions sorted by start and split into groups of overlapping sessions.
+    Touching sessions (one ends as the next starts) are in separate groups.
+    """
+    groups: List[List["CPAPSession"]] = []
+    group_end = None
+    for session in sorted(sessions, key=lambda s: (s.start_time, s.end_time)):
+        if groups and session.start_time < group_end:
+            groups[-1].append(session)
+            group_end = max(group_end, session.end_time)
+        else:
+            groups.append([session])
+            group_end = session.end_time
+    return groups
+
+
+def merge_overlapping(sessions: Iterable["CPAPSession"]) -> List["CPAPSession"]:
+    """Sessions sorted by start with every group of overlapping sessions merged into its earliest one"""
+    return [
+        functools.reduce(lambda merged, session: merged.merge_duplicate(session), group)
+        for group in overlap_groups(sessions)
+    ]
+
+
+@dataclass
+class TherapyDay:
+    """Non-overlapping session segments of one noon-to-noon day, in order"""
+    day: datetime.date
+    segments: List["CPAPSession"]
+
+    @property
+    def start_time(self) -> datetime.datetime:
+        return self.segments[0].start_time
+
+    @property
+    def end_time(self) -> datetime.datetime:
+        return max(segment.end_time for segment in self.segments)
+
+    @property
+    def usage_minutes(self) -> float:
+        return sum(segment.duration_minutes for segment in self.segments)
+
+    @property
+    def mask_off_minutes(self) -> float:
+        """Time between the segments"""
+        return sum(
+            (later.start_time - earlier.end_time).total_seconds() / 60
+            for earlier, later in zip(self.segments, self.segments[1:])
+        )
+
+    def event_counts(self) -> Dict[str, int]:
+        return {
+            name: sum(getattr(segment, name) for segment in self.segments)
+            for name in ("total_apneas", "obstructive_apneas", "central_apneas", "hypopneas")
+        }
+
+    @property
+    def ahi(self) -> float:
+        """Apneas and hypopneas per hour of use across all segments"""
+        hours = self.usage_minutes / 60
+        if hours <= 0:
+            return 0.0
+        counts = self.event_counts()
+        return round((counts["total_apneas"] + counts["hypopneas"]) / hours, 2)
+
+    def to_dict(self) -> Dict:
+        return {
+            "date": self.day.isoformat(),
+            "start_time": self.start_time.isoformat(),
+            "end_time": self.end_time.isoformat(),
+            "usage_minutes": round(self.usage_minutes, 1),
+            "mask_off_minutes": round(self.mask_off_minutes, 1),
+            "ahi": self.ahi,
+            "events": self.event_counts(),
+            "segments": [
+                {
+                    "session_id": segment.session_id,
+                    "start_time": segment.start_time.isoformat(),
+                    "end_time": segment.end_time.isoformat()
+                }
+                for segment in self.segments
+            ]
+        }
+
+
+def group_therapy_days(sessions: Iterable["CPAPSession"]) -> List[TherapyDay]:
+    """Merge overlapping sessions and group the segments into therapy days, oldest first"""
+    return [
+        TherapyDay(day=day, segments=list(segments))
+        for day, segments in itertools.groupby(merge_overlapping(sessions), key=lambda s: therapy_day(s.start_time))
+    ]
@@ -0,0 +1,11 @@
+"""
+Services for the CPAP Analytics Platform
+
+Business logic that coordinates parsers, models and analytics outside of
+the request handlers.
+"""
+
+from .sd_card_import import import_sd_card, ImportReport
+from .insight_cache import get_user_insights, insight_cache
+
+__all__ = ["import_sd_card", "ImportReport", "get_user_insights", "insight_cache"]
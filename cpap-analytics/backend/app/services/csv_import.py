@@ -0,0 +1,171 @@
+"""
+CSV Import Service
+
+Streams CPAP CSV exports (date,duration_hours,ahi,leak[,pressure]) into
+the sessions table with constant memory and batched inserts.
+"""
+
+import codecs
+import csv
+import logging
+from datetime import datetime, date, time, timedelta
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.session import Session as SessionModel, compute_quality_score
+from app.services.rollups import rollup_values, update_rollups
+
+logger = logging.getLogger(__name__)
+
+CSV_READ_CHUNK_SIZE = 64 * 1024  # Bytes read from the upload per iteration
+CSV_INSERT_BATCH_SIZE = 1000     # Rows per bulk insert
+
+# Dialects with INSERT .. ON CONFLICT DO NOTHING .. RETURNING
+_CONFLICT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _iter_lines(stream: BinaryIO, chunk_size: Optional[int] = None) -> Iterator[str]:
+    """Decode a binary stream chunk by chunk and yield complete lines"""
+    chunk_size = chunk_size or CSV_READ_CHUNK_SIZE
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    remainder = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            lines = (remainder + text).split('\n')
+            remainder = lines.pop()
+            yield from lines
+        if not chunk:
+            break
+    if remainder:
+        yield remainder
+
+
+def _existing_session_dates(db: Session, user_id: int, first: date, last: date) -> Set[date]:
+    """Session dates a user already has in ``[first, last]`` (a range scan of ix_sessions_user_id_start_time)"""
+    rows = db.query(SessionModel.start_time).filter(
+        SessionModel.user_id == user_id,
+        SessionModel.start_time >= datetime.combine(first, time.min),
+        SessionModel.start_time < datetime.combine(last + timedelta(days=1), time.min)
+    )
+    return {start_time.date() for (start_time,) in rows}
+
+
+def _parse_float(value: str):
+    value = value.strip()
+    return float(value) if value else None
+
+
+def _insert_new_sessions(db: Session, batch: List[Dict]) -> List[Dict]:
+    """
+    Insert session rows, skipping any whose (user_id, start_time) already
+    exists, and return the rollup columns of the rows actually written.
+
+    On SQLite and PostgreSQL this is a single INSERT .. ON CONFLICT DO
+    NOTHING, so two imports of the same export racing each other cannot
+    create duplicate nights. Other databases fall back to a plain bulk insert.
+    """
+    insert = _CONFLICT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        db.bulk_insert_mappings(SessionModel, batch)
+        return batch
+
+    statement = (
+        insert(SessionModel)
+        .on_conflict_do_nothing(index_elements=['user_id', 'start_time'])
+        .returning(
+            SessionModel.start_time,
+            SessionModel.duration_minutes,
+            SessionModel.ahi,
+            SessionModel.mask_leak_95,
+            SessionModel.pressure_avg
+        )
+    )
+    return [dict(row._mapping) for row in db.execute(statement, batch)]
+
+
+def _insert_batch(db: Session, user_id: int, batch: List[Dict]) -> int:
+    """Insert one batch of session rows, fold the new ones into the user's rollups and count them"""
+    # Nights stored at any time of day are kept, so the date check stays ahead of the insert
+    existing = _existing_session_dates(
+        db, user_id,
+        min(row['start_time'] for row in batch).date(),
+        max(row['start_time'] for row in batch).date()
+    )
+    batch = [row for row in batch if row['start_time'].date() not in existing]
+    if not batch:
+        return 0
+
+    inserted = _insert_new_sessions(db, batch)
+    update_rollups(db, user_id, added=[rollup_values(row) for row in inserted])
+    return len(inserted)
+
+
+def process_cpap_file(stream: BinaryIO, user_id: int, db: Session) -> int:
+    """
+    Stream an uploaded CPAP CSV export into the sessions table.
+
+    Expected columns: date,duration_hours,ahi,leak[,pressure]. The file is
+    read in fixed-size chunks, dates already stored are looked up per batch
+    with an index range scan and new rows are written with bulk inserts of
+    CSV_INSERT_BATCH_SIZE rows, so memory stays constant and cost grows linearly with file size.
+    """
+    sessions_imported = 0
+    
+    try:
+        seen_dates: Set[date] = set()
+        batch = []
+        
+        for line_number, parts in enumerate(csv.reader(_iter_lines(stream)), start=1):
+            if not parts or not any(part.strip() for part in parts):
+                continue
+            
+            # Skip header if present
+            if line_number == 1 and ('date' in parts[0].lower() or 'session' in parts[0].lower()):
+                continue
+            
+            if len(parts) < 4:  # Minimum required fields
+                continue
+                
+            try:
+                session_date = datetime.strptime(parts[0].strip(), '%Y-%m-%d').date()
+                duration_hours = _parse_float(parts[1])
+                ahi = _parse_float(parts[2])
+                leak = _parse_float(parts[3])
+                pressure = _parse_float(parts[4]) if len(parts) > 4 else None
+            except ValueError as e:
+                logger.debug(f"Skipping CSV line {line_number}: {e}")
+                continue
+            
+            # Skip dates repeated within the file (stored dates are checked per batch)
+            if session_date in seen_dates:
+                continue
+            seen_dates.add(session_date)
+            
+            duration_minutes = duration_hours * 60 if duration_hours is not None else None
+            batch.append({
+                'user_id': user_id,
+                'start_time': datetime.combine(session_date, time.min),
+                'duration_minutes': duration_minutes,
+                'ahi': ahi,
+                'mask_leak_95': leak,
+                'pressure_avg': pressure,
+                'quality_score': compute_quality_score(ahi, duration_minutes, leak)
+            })
+            
+            if len(batch) >= CSV_INSERT_BATCH_SIZE:
+                sessions_imported += _insert_batch(db, user_id, batch)
+                batch = []
+        
+        if batch:
+            sessions_imported += _insert_batch(db, user_id, batch)
+        
+        db.commit()
+        return sessions_imported
+    
+    except Exception as e:
+        db.rollback()
+        raise e
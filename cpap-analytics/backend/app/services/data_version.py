@@ -0,0 +1,92 @@
+"""
+User Data Versions
+
+Maintains user_data_versions, a counter per user that moves whenever the
+user's sessions change, so endpoints can answer a conditional GET from
+one primary key lookup instead of recomputing their response.
+
+Session rows inserted, edited or deleted through the ORM are picked up
+when the unit of work flushes. Writers that bypass the ORM (the CSV
+importer's INSERT .. ON CONFLICT) call mark_data_changed(); every
+importer does so through update_rollups(). A user's version is bumped at
+most once per transaction and rolls back with it.
+"""
+
+from datetime import datetime
+from itertools import chain
+from typing import Iterable
+
+from sqlalchemy import event, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.session import Session as SessionModel
+from app.models.user_data_version import UserDataVersion
+
+# Users already bumped in the session's current transaction
+_BUMPED_KEY = "data_version_bumped"
+
+# Dialects with INSERT .. ON CONFLICT DO UPDATE
+_UPSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def get_data_version(db: Session, user_id: int) -> int:
+    """Current version of a user's session data (0 before any session was stored)"""
+    version = db.query(UserDataVersion.version).filter(UserDataVersion.user_id == user_id).scalar()
+    return version or 0
+
+
+def _bump(connection: Connection, user_id: int) -> None:
+    now = datetime.utcnow()
+    insert = _UPSERTS.get(connection.dialect.name)
+    if insert is not None:
+        connection.execute(
+            insert(UserDataVersion)
+            .values(user_id=user_id, version=1, updated_at=now)
+            .on_conflict_do_update(
+                index_elements=['user_id'],
+                set_={'version': UserDataVersion.version + 1, 'updated_at': now}
+            )
+        )
+        return
+
+    result = connection.execute(
+        update(UserDataVersion)
+        .where(UserDataVersion.user_id == user_id)
+        .values(version=UserDataVersion.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(UserDataVersion.__table__.insert().values(user_id=user_id, version=1, updated_at=now))
+
+
+def _bump_once(db: Session, connection: Connection, user_ids: Iterable[int]) -> None:
+    bumped = db.info.setdefault(_BUMPED_KEY, set())
+    for user_id in sorted(set(user_ids) - bumped - {None}):
+        _bump(connection, user_id)
+        bumped.add(user_id)
+
+
+def mark_data_changed(db: Session, user_id: int) -> None:
+    """Bump a user's version for session rows written without the ORM; the caller commits"""
+    _bump_once(db, db.connection(), [user_id])
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_flushed_sessions(db: Session, flush_context) -> None:
+    """Bump the owners of session rows inserted, modified or deleted by this flush"""
+    changed = chain(
+        db.new,
+        db.deleted,
+        (obj for obj in db.dirty if db.is_modified(obj, include_collections=False))
+    )
+    user_ids = [obj.user_id for obj in changed if isinstance(obj, SessionModel)]
+    if user_ids:
+        _bump_once(db, db.connection(), user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset_bumped(db: Session) -> None:
+    """The next transaction bumps again"""
+    db.info.pop(_BUMPED_KEY, None)
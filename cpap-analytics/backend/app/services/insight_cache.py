@@ -0,0 +1,155 @@
+"""
+Insight State Cache
+
+Keeps an InsightState per user so /sessions/insights only reads the
+nights added since the previous request. States are invalidated once a
+transaction that edited or deleted a stored session through the ORM
+commits, and rebuilt when a new night sorts before nights already folded
+in (a backfilled import). A state rebuilt from reads that raced such a
+commit is not stored.
+
+The cache is per process; sessions changed by another process with raw
+SQL are only picked up after the state is evicted or invalidated here.
+"""
+
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.analytics.incremental import InsightState
+from app.models.session import Session as SessionModel
+
+# Users whose state is kept in memory (least recently used are evicted)
+MAX_CACHED_USERS = 10000
+
+# Users whose stored nights changed in the session's current transaction
+_CHANGED_KEY = "insight_cache_changed"
+
+
+class CachedInsightState:
+    """An InsightState plus the highest session id already folded into it"""
+
+    def __init__(self):
+        self.state = InsightState()
+        self.last_session_id = 0
+        # Held while folding and reading, so concurrent requests of one user do not interleave
+        self.lock = threading.Lock()
+
+
+class InsightStateCache:
+    """Thread-safe LRU map of user_id -> CachedInsightState"""
+
+    def __init__(self, max_users: int = MAX_CACHED_USERS):
+        self.max_users = max_users
+        self._states: "OrderedDict[int, CachedInsightState]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[CachedInsightState]:
+        with self._lock:
+            cached = self._states.get(user_id)
+            if cached is not None:
+                self._states.move_to_end(user_id)
+            return cached
+
+    def generation(self, user_id: int) -> int:
+        """Number of times the user's state was invalidated"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, user_id: int, cached: CachedInsightState, generation: Optional[int] = None) -> None:
+        """Store a state, unless the user was invalidated since ``generation`` was read"""
+        with self._lock:
+            if generation is not None and self._generations.get(user_id, 0) != generation:
+                return
+            self._states[user_id] = cached
+            self._states.move_to_end(user_id)
+            while len(self._states) > self.max_users:
+                self._states.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._states.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+
+insight_cache = InsightStateCache()
+
+
+def _session_key(session: SessionModel) -> tuple:
+    """Order nights are folded in, matching a (start_time, id) sort"""
+    return (session.start_time, session.id)
+
+
+def _fold(cached: CachedInsightState, sessions: List[SessionModel]) -> bool:
+    """Add sessions to the state; False if one sorts before nights already added"""
+    for session in sessions:
+        key = _session_key(session)
+        if not cached.state.can_add(key):
+            return False
+        cached.state.add(session.to_dict(), key)
+        cached.last_session_id = max(cached.last_session_id, session.id)
+    return True
+
+
+def _user_sessions(db: Session, user_id: int, after_id: int = 0) -> List[SessionModel]:
+    return (
+        db.query(SessionModel)
+        .filter(
+            SessionModel.user_id == user_id,
+            SessionModel.id > after_id,
+            SessionModel.start_time.isnot(None)
+        )
+        .order_by(SessionModel.start_time, SessionModel.id)
+        .all()
+    )
+
+
+def get_user_insights(db: Session, user_id: int) -> List[Dict[str, Any]]:
+    """
+    Insights for a user, identical to generate_insights() over all of the
+    user's sessions, updated from the nights added since the last call.
+    """
+    cached = insight_cache.get(user_id)
+    if cached is not None:
+        with cached.lock:
+            if _fold(cached, _user_sessions(db, user_id, cached.last_session_id)):
+                return cached.state.insights()
+        # Partly folded before a backfilled night; never serve it again
+        insight_cache.invalidate(user_id)
+
+    generation = insight_cache.generation(user_id)
+    cached = CachedInsightState()
+    _fold(cached, _user_sessions(db, user_id))
+    insight_cache.put(user_id, cached, generation)
+    return cached.state.insights()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed(db: Session, flush_context) -> None:
+    """Remember the owners of stored nights edited or deleted by this flush"""
+    changed = chain(db.deleted, (obj for obj in db.dirty if db.is_modified(obj, include_collections=False)))
+    user_ids = {obj.user_id for obj in changed if isinstance(obj, SessionModel) and obj.user_id is not None}
+    if user_ids:
+        db.info.setdefault(_CHANGED_KEY, set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(db: Session) -> None:
+    """Historical nights changed - the running states no longer match"""
+    for user_id in db.info.pop(_CHANGED_KEY, ()):
+        insight_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed(db: Session) -> None:
+    """Rolled back changes leave the cached states valid"""
+    db.info.pop(_CHANGED_KEY, None)
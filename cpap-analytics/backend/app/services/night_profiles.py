@@ -0,0 +1,42 @@
+"""
+Night Profile Service
+
+Stores the hour-of-night profile of every imported session and sums the
+stored profiles of a date range. The nightly profiles are the cache: a
+90-night profile is one indexed query and 90 small array additions.
+"""
+
+import json
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.analytics.night_profile import NightProfile
+from app.models.session_profile import SessionProfile
+from app.parsers.resmed import CPAPSession
+from app.services.session_rows import upsert_session_rows
+
+
+def store_night_profiles(db: Session, user_id: int, sessions: Iterable[CPAPSession]) -> None:
+    """Insert or replace the profiles of parsed sessions (sessions without one are skipped)"""
+    upsert_session_rows(
+        db, SessionProfile, user_id,
+        (session for session in sessions if session.profile is not None),
+        lambda session: {"data": json.dumps(session.profile.to_json())}
+    )
+
+
+def range_profile(
+    db: Session,
+    user_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> NightProfile:
+    """Sum of the profiles of sessions starting within ``[start, end]`` (inclusive, open ended if None)"""
+    query = db.query(SessionProfile.data).filter(SessionProfile.user_id == user_id)
+    if start is not None:
+        query = query.filter(SessionProfile.day >= start)
+    if end is not None:
+        query = query.filter(SessionProfile.day <= end)
+    return NightProfile.total(NightProfile.from_json(json.loads(data)) for data, in query)
@@ -0,0 +1,328 @@
+"""
+Session Rollup Service
+
+Maintains the session_rollups table (per user and day / ISO week / month)
+as sessions are imported, and reads the smallest set of rollups that
+covers a date range.
+
+Importers call update_rollups() with the rollup values of the sessions
+they inserted and, for rewritten sessions, the values the rows had
+before. Counts, sums and sums of squares are adjusted in place; minimums
+and maximums can only grow incrementally, so periods that lost a session
+have them recomputed from the sessions table.
+"""
+
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import exists, func, or_, and_
+from sqlalchemy.orm import Session
+
+from app.models.session import Session as SessionModel
+from app.models.session_rollup import SessionRollup, ROLLUP_METRICS
+from app.services.data_version import mark_data_changed
+
+# Nightly usage (hours) that counts as a compliant night
+COMPLIANT_HOURS = 4.0
+
+PERIODS = (SessionRollup.PERIOD_DAY, SessionRollup.PERIOD_WEEK, SessionRollup.PERIOD_MONTH)
+
+RollupKey = Tuple[str, date]
+
+
+def period_start(day: date, period: str) -> date:
+    """First day of the day / ISO week / month containing ``day``"""
+    if period == SessionRollup.PERIOD_WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == SessionRollup.PERIOD_MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def period_end(start: date, period: str) -> date:
+    """First day after the period starting at ``start``"""
+    if period == SessionRollup.PERIOD_WEEK:
+        return start + timedelta(days=7)
+    if period == SessionRollup.PERIOD_MONTH:
+        return start + timedelta(days=calendar.monthrange(start.year, start.month)[1])
+    return start + timedelta(days=1)
+
+
+def rollup_values(session: Any) -> Optional[Dict[str, Any]]:
+    """
+    Rollup inputs of a session row or insert mapping (None without a start time).
+
+    Pressure is only recorded by some importers; the column defaults to 0,
+    which is treated as missing.
+    """
+    get = session.get if isinstance(session, dict) else lambda name: getattr(session, name, None)
+    start_time = get("start_time")
+    if start_time is None:
+        return None
+    duration_minutes = get("duration_minutes")
+    return {
+        "day": start_time.date(),
+        "ahi": get("ahi"),
+        "duration": duration_minutes / 60 if duration_minutes is not None else None,
+        "leak": get("mask_leak_95"),
+        "pressure": get("pressure_avg") or None
+    }
+
+
+class _Delta:
+    """Pending change to one rollup row"""
+
+    def __init__(self):
+        self.sessions = 0
+        self.nights = 0
+        self.compliant = 0
+        self.count = defaultdict(int)
+        self.sum = defaultdict(float)
+        self.sumsq = defaultdict(float)
+        self.low: Dict[str, float] = {}
+        self.high: Dict[str, float] = {}
+        self.lost_sessions = False
+
+    def add(self, values: Dict[str, Any], sign: int) -> None:
+        self.sessions += sign
+        if sign < 0:
+            self.lost_sessions = True
+        for metric in ROLLUP_METRICS:
+            value = values[metric]
+            if value is None:
+                continue
+            self.count[metric] += sign
+            self.sum[metric] += sign * value
+            self.sumsq[metric] += sign * value * value
+            if sign > 0:
+                self.low[metric] = min(self.low.get(metric, value), value)
+                self.high[metric] = max(self.high.get(metric, value), value)
+
+    def merge(self, other: "_Delta") -> None:
+        self.sessions += other.sessions
+        self.lost_sessions |= other.lost_sessions
+        for metric in ROLLUP_METRICS:
+            self.count[metric] += other.count[metric]
+            self.sum[metric] += other.sum[metric]
+            self.sumsq[metric] += other.sumsq[metric]
+            if metric in other.low:
+                self.low[metric] = min(self.low.get(metric, other.low[metric]), other.low[metric])
+                self.high[metric] = max(self.high.get(metric, other.high[metric]), other.high[metric])
+
+    def apply(self, rollup: SessionRollup) -> None:
+        rollup.session_count += self.sessions
+        rollup.night_count += self.nights
+        rollup.compliant_nights += self.compliant
+        for metric in ROLLUP_METRICS:
+            for suffix, change in (("count", self.count), ("sum", self.sum), ("sumsq", self.sumsq)):
+                field = f"{metric}_{suffix}"
+                setattr(rollup, field, getattr(rollup, field) + change[metric])
+            if metric in self.low:
+                rollup._merge_extremes(metric, self.low[metric], self.high[metric])
+
+
+def _load_rollups(db: Session, user_id: int, keys: Iterable[RollupKey]) -> Dict[RollupKey, SessionRollup]:
+    """Existing rollup rows for the given (period, period_start) keys, in one query"""
+    starts_by_period: Dict[str, List[date]] = defaultdict(list)
+    for period, start in keys:
+        starts_by_period[period].append(start)
+
+    rows = []
+    if starts_by_period:
+        rows = db.query(SessionRollup).filter(
+            SessionRollup.user_id == user_id,
+            or_(*(
+                and_(SessionRollup.period == period, SessionRollup.period_start.in_(starts))
+                for period, starts in starts_by_period.items()
+            ))
+        )
+    return {(row.period, row.period_start): row for row in rows}
+
+
+def _is_compliant(rollup: SessionRollup) -> bool:
+    # Rounded so a night that went 4h -> 3h -> 4h through re-imports still counts
+    return rollup.session_count > 0 and round(rollup.duration_sum, 6) >= COMPLIANT_HOURS
+
+
+def _metric_columns():
+    """SQL expressions for each rollup metric (matching rollup_values)"""
+    return {
+        "ahi": SessionModel.ahi,
+        "duration": SessionModel.duration_minutes / 60.0,
+        "leak": SessionModel.mask_leak_95,
+        "pressure": func.nullif(SessionModel.pressure_avg, 0)
+    }
+
+
+def _refresh_extremes(db: Session, user_id: int, rollup: SessionRollup) -> None:
+    """Recompute min/max of a period from its sessions after a session was removed"""
+    columns = _metric_columns()
+    start = datetime.combine(rollup.period_start, datetime.min.time())
+    end = datetime.combine(period_end(rollup.period_start, rollup.period), datetime.min.time())
+    row = db.query(
+        *(func.min(column) for column in columns.values()),
+        *(func.max(column) for column in columns.values())
+    ).filter(
+        SessionModel.user_id == user_id,
+        SessionModel.start_time >= start,
+        SessionModel.start_time < end
+    ).one()
+    for i, metric in enumerate(columns):
+        setattr(rollup, f"{metric}_min", row[i])
+        setattr(rollup, f"{metric}_max", row[i + len(columns)])
+
+
+def update_rollups(
+    db: Session,
+    user_id: int,
+    added: Iterable[Optional[Dict[str, Any]]] = (),
+    removed: Iterable[Optional[Dict[str, Any]]] = ()
+) -> None:
+    """
+    Fold inserted sessions (``added``) and replaced or deleted sessions
+    (``removed``) into a user's rollups. Both are rollup_values() dicts;
+    ``None`` entries are ignored. Also bumps the user's data version. The
+    caller commits.
+    """
+    day_deltas: Dict[date, _Delta] = defaultdict(_Delta)
+    for values, sign in [(v, 1) for v in added] + [(v, -1) for v in removed]:
+        if values is not None:
+            day_deltas[values["day"]].add(values, sign)
+    if not day_deltas:
+        return
+
+    # Pending session rows must be visible to _refresh_extremes
+    db.flush()
+    mark_data_changed(db, user_id)
+
+    keys = {(period, period_start(day, period)) for day in day_deltas for period in PERIODS}
+    rollups = _load_rollups(db, user_id, keys)
+
+    # New rows are bulk inserted at the end rather than added to the session,
+    # which would insert them one statement at a time to fetch their ids
+    created: Dict[RollupKey, SessionRollup] = {}
+
+    def rollup_for(key: RollupKey) -> SessionRollup:
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = SessionRollup.empty(user_id=user_id, period=key[0], period_start=key[1])
+            created[key] = rollups[key] = rollup
+        return rollup
+
+    # Days first: whether a day gained or lost a (compliant) night is only
+    # known after its own totals change, and feeds its week and month
+    deltas: Dict[RollupKey, _Delta] = defaultdict(_Delta)
+    for day, delta in day_deltas.items():
+        rollup = rollup_for((SessionRollup.PERIOD_DAY, day))
+        had_night, was_compliant = rollup.session_count > 0, _is_compliant(rollup)
+        delta.apply(rollup)
+        has_night, is_compliant = rollup.session_count > 0, _is_compliant(rollup)
+        rollup.night_count = int(has_night)
+        rollup.compliant_nights = int(is_compliant)
+
+        for period in (SessionRollup.PERIOD_WEEK, SessionRollup.PERIOD_MONTH):
+            parent = deltas[(period, period_start(day, period))]
+            parent.merge(delta)
+            parent.nights += int(has_night) - int(had_night)
+            parent.compliant += int(is_compliant) - int(was_compliant)
+        deltas[(SessionRollup.PERIOD_DAY, day)] = delta
+
+    for key, delta in deltas.items():
+        rollup = rollup_for(key)
+        if key[0] != SessionRollup.PERIOD_DAY:
+            delta.apply(rollup)
+        if rollup.session_count <= 0:
+            if created.pop(key, None) is None:
+                db.delete(rollup)
+        elif delta.lost_sessions:
+            _refresh_extremes(db, user_id, rollup)
+
+    if created:
+        db.bulk_save_objects(list(created.values()))
+
+
+def rebuild_rollups(db: Session, user_id: int) -> None:
+    """Recreate a user's rollups from the sessions table (for existing data)"""
+    db.query(SessionRollup).filter(SessionRollup.user_id == user_id).delete(synchronize_session=False)
+    sessions = db.query(SessionModel).filter(SessionModel.user_id == user_id)
+    update_rollups(db, user_id, added=[rollup_values(session) for session in sessions])
+
+
+def backfill_rollups(db: Session) -> List[int]:
+    """
+    Build rollups for every user who has sessions but no rollups yet (data
+    stored before rollups existed). Returns the users rebuilt; the caller
+    commits. Run by scripts/backfill_rollups.py.
+    """
+    user_ids = [
+        user_id for user_id, in db.query(SessionModel.user_id).filter(
+            ~exists().where(SessionRollup.user_id == SessionModel.user_id)
+        ).distinct().order_by(SessionModel.user_id)
+    ]
+    for user_id in user_ids:
+        rebuild_rollups(db, user_id)
+    return user_ids
+
+
+def covering_rollups(
+    db: Session,
+    user_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> List[SessionRollup]:
+    """
+    Fewest rollups covering ``[start, end]`` (inclusive, open ended if None):
+    month rows for whole months and day rows for the partial months at
+    either end.
+    """
+    query = db.query(SessionRollup).filter(SessionRollup.user_id == user_id)
+
+    first_month = None if start is None else (start if start.day == 1 else period_end(start.replace(day=1), "month"))
+    end_month = None if end is None else (
+        end + timedelta(days=1) if (end + timedelta(days=1)).day == 1 else end.replace(day=1)
+    )
+    if first_month is not None and end_month is not None and first_month >= end_month:
+        # No whole month inside the range
+        return query.filter(
+            SessionRollup.period == SessionRollup.PERIOD_DAY,
+            SessionRollup.period_start >= start,
+            SessionRollup.period_start <= end
+        ).all()
+
+    months = [SessionRollup.period == SessionRollup.PERIOD_MONTH]
+    if first_month is not None:
+        months.append(SessionRollup.period_start >= first_month)
+    if end_month is not None:
+        months.append(SessionRollup.period_start < end_month)
+
+    edges = []
+    if start is not None:
+        edges.append(and_(SessionRollup.period_start >= start, SessionRollup.period_start < first_month))
+    if end is not None:
+        edges.append(and_(SessionRollup.period_start >= end_month, SessionRollup.period_start <= end))
+
+    conditions = [and_(*months)]
+    if edges:
+        conditions.append(and_(SessionRollup.period == SessionRollup.PERIOD_DAY, or_(*edges)))
+    return query.filter(or_(*conditions)).all()
+
+
+def period_rollups(
+    db: Session,
+    user_id: int,
+    period: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> List[SessionRollup]:
+    """Rollups of one period type whose period starts within ``[start, end]``, oldest first"""
+    query = db.query(SessionRollup).filter(
+        SessionRollup.user_id == user_id,
+        SessionRollup.period == period
+    )
+    if start is not None:
+        query = query.filter(SessionRollup.period_start >= period_start(start, period))
+    if end is not None:
+        query = query.filter(SessionRollup.period_start <= end)
+    return query.order_by(SessionRollup.period_start).all()
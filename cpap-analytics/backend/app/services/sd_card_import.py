@@ -0,0 +1,405 @@
+"""
+SD Card Import Service
+
+Imports a ResMed SD card into the sessions table for one device.
+
+A per-device manifest of (path, size, mtime, SHA-256) lets re-uploads of
+the same card skip every file that has not changed since the last import:
+files whose size and mtime match are skipped without reading them, files
+whose mtime changed are hashed and only decoded when their contents differ.
+The leak and pressure quantile sketches and the hour-of-night profile of
+every imported night are built during parsing by the builders this service
+hands the parser (session_parser) and stored in session_sketches and
+session_profiles.
+
+Recordings that overlap in time are the same therapy (BRP and EDF files
+of one night, the same night on two cards) and are stitched into one
+session, including with sessions stored by earlier imports: the earliest
+stored row is kept and any other overlapping stored rows are absorbed.
+
+With a WaveformStore, the signals of every imported night's BRP, PLD and
+SAD files are also written to the store.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.analytics.night_profile import NightProfile
+from app.analytics.quantile_sketch import QuantileSketch
+from app.models.device import Device
+from app.models.ingest_manifest import IngestManifestEntry
+from app.models.session import Session as SessionModel
+from app.models.session_profile import SessionProfile
+from app.models.session_sketch import SessionSketch
+from app.parsers.edf import EDFReader
+from app.parsers.resmed import ResMedParser, CPAPSession, ParseResult
+from app.parsers.stitching import merge_overlapping, overlap_groups
+from app.services.night_profiles import store_night_profiles
+from app.services.rollups import rollup_values, update_rollups
+from app.services.session_rows import delete_session_rows
+from app.services.session_sketches import store_session_sketches
+from app.services.waveform_store import WaveformSignal, WaveformStore
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# EDF files whose signals are stored as waveforms, and signals that are not
+WAVEFORM_FILE_TYPES = ('BRP', 'PLD', 'SAD')
+WAVEFORM_SKIPPED_SIGNALS = ('crc16', 'edf annotations')
+
+
+def sketch_samples(values: np.ndarray, counts: np.ndarray) -> bytes:
+    """Serialized QuantileSketch of distinct sample values counted ``counts`` times"""
+    return QuantileSketch().add(values, counts).to_bytes()
+
+
+def session_parser(sd_card_path: str) -> ResMedParser:
+    """Parser that also builds the quantile sketches and hourly profiles an import stores"""
+    return ResMedParser(sd_card_path, sketch_builder=sketch_samples, profile_builder=NightProfile.for_session)
+
+
+@dataclass
+class FileState:
+    """Current on-disk state of one SD card file"""
+    path: Path
+    relative_path: str
+    file_size: int
+    mtime: float
+    checksum: Optional[str] = None
+
+
+@dataclass
+class ImportReport:
+    """Summary of an SD card import"""
+    files_scanned: int = 0
+    files_to_parse: int = 0
+    files_parsed: int = 0
+    files_unchanged: int = 0
+    sessions_imported: int = 0
+    sessions_updated: int = 0
+    errors: List[ParseResult] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            "files_scanned": self.files_scanned,
+            "files_to_parse": self.files_to_parse,
+            "files_parsed": self.files_parsed,
+            "files_unchanged": self.files_unchanged,
+            "sessions_imported": self.sessions_imported,
+            "sessions_updated": self.sessions_updated,
+            "errors": [
+                {"file": str(result.file_path), "error": result.error} for result in self.errors
+            ]
+        }
+
+
+def file_checksum(path: Path) -> str:
+    """SHA-256 of a file, read in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_changed_files(
+    files: List[FileState],
+    manifest: Dict[str, IngestManifestEntry]
+) -> List[FileState]:
+    """
+    Return files that are new or whose contents changed.
+
+    Files with a matching size and mtime are trusted without hashing. When
+    only the mtime moved (e.g. the card was copied), the hash decides.
+    """
+    changed = []
+    for state in files:
+        entry = manifest.get(state.relative_path)
+        if entry is not None and entry.file_size == state.file_size and entry.mtime == state.mtime:
+            state.checksum = entry.checksum
+            continue
+
+        state.checksum = file_checksum(state.path)
+        if entry is None or entry.checksum != state.checksum:
+            changed.append(state)
+    return changed
+
+
+def _session_checksum(states: List[FileState]) -> str:
+    """Combined checksum of all files that make up one session"""
+    digest = hashlib.sha256()
+    for state in sorted(states, key=lambda s: s.relative_path):
+        digest.update(state.checksum.encode())
+    return digest.hexdigest()
+
+
+# CPAPSession attributes stored in sessions table columns of the same name
+SESSION_COLUMNS = (
+    "start_time", "end_time", "duration_minutes", "ahi",
+    "total_apneas", "obstructive_apneas", "central_apneas", "hypopneas",
+    "mask_leak_avg", "mask_leak_95", "pressure_min", "pressure_95", "pressure_max", "pressure_avg",
+    "minute_vent_avg", "resp_rate_avg", "tidal_volume_avg"
+)
+
+
+def _session_fields(session: CPAPSession) -> Dict:
+    """Map a parsed session onto sessions table columns"""
+    return {column: getattr(session, column) for column in SESSION_COLUMNS}
+
+
+def _stored_session(row: SessionModel) -> CPAPSession:
+    """A stored session row as a parsed session, so it can be stitched with new ones"""
+    return CPAPSession(
+        session_id=row.session_id,
+        **{column: getattr(row, column) or 0 for column in SESSION_COLUMNS}
+    )
+
+
+def _with_cached_data(db: Session, user_id: int, sessions: List[CPAPSession]) -> Dict[str, CPAPSession]:
+    """Stored ``sessions`` with their quantile sketches and hourly profile, by session_id"""
+    session_ids = [session.session_id for session in sessions]
+    if not session_ids:
+        return {}
+    sketches = {
+        row.session_id: row
+        for row in db.query(SessionSketch).filter(
+            SessionSketch.user_id == user_id, SessionSketch.session_id.in_(session_ids)
+        )
+    }
+    profiles = dict(
+        db.query(SessionProfile.session_id, SessionProfile.data).filter(
+            SessionProfile.user_id == user_id, SessionProfile.session_id.in_(session_ids)
+        )
+    )
+    loaded = {}
+    for session in sessions:
+        sketch = sketches.get(session.session_id)
+        profile = profiles.get(session.session_id)
+        loaded[session.session_id] = replace(
+            session,
+            leak_sketch=sketch.leak if sketch else None,
+            pressure_sketch=sketch.pressure if sketch else None,
+            profile=NightProfile.from_json(json.loads(profile)) if profile else None
+        )
+    return loaded
+
+
+def _store_waveforms(store: WaveformStore, user_id: int, session_id: str, states: List[FileState]) -> None:
+    """Write the signals of one night's waveform files to the store"""
+    signals: Dict[str, WaveformSignal] = {}
+    readers = []
+    try:
+        for state in sorted(states, key=lambda s: s.relative_path):
+            file_type = state.path.stem.rsplit('_', 1)[-1].upper()
+            if state.path.suffix.lower() != '.edf' or file_type not in WAVEFORM_FILE_TYPES:
+                continue
+            edf = EDFReader(state.path)
+            readers.append(edf)
+            for signal in edf.signals.values():
+                name = signal.header.base_label
+                if name not in WAVEFORM_SKIPPED_SIGNALS and name not in signals and len(signal):
+                    signals[name] = WaveformSignal.from_edf(signal, edf.start_time)
+        if signals:
+            store.write_night(user_id, session_id, signals.values())
+    finally:
+        for edf in readers:
+            edf.close()
+
+
+def import_sd_card(
+    db: Session,
+    user_id: int,
+    device_id: int,
+    sd_card_path: str,
+    max_workers: int = 1,
+    chunk_size: int = 16,
+    progress: Optional[Callable[[ImportReport], None]] = None,
+    waveform_store: Optional[WaveformStore] = None
+) -> ImportReport:
+    """
+    Incrementally import an SD card for a device.
+
+    Only sessions with at least one new or changed file are decoded; all
+    files of such a session are re-read so partial sessions (PLD without
+    its EVE events, etc.) are never written. ``progress`` is called with
+    the report after every decoded file. Waveforms of the imported nights
+    are written to ``waveform_store`` when one is given.
+    """
+    parser = session_parser(sd_card_path)
+    report = ImportReport()
+
+    files = []
+    for path in parser.scan_session_files():
+        stat = path.stat()
+        files.append(FileState(
+            path=path,
+            relative_path=path.relative_to(parser.data_path).as_posix(),
+            file_size=stat.st_size,
+            mtime=stat.st_mtime
+        ))
+    report.files_scanned = len(files)
+
+    manifest = {
+        entry.relative_path: entry
+        for entry in db.query(IngestManifestEntry).filter(IngestManifestEntry.device_id == device_id)
+    }
+    changed = find_changed_files(files, manifest)
+
+    # Re-read every sibling file of a changed session
+    changed_sessions: Set[str] = {parser.session_id_for(state.path) for state in changed}
+    to_parse = [state for state in files if parser.session_id_for(state.path) in changed_sessions]
+    report.files_unchanged = len(files) - len(to_parse)
+    report.files_to_parse = len(to_parse)
+
+    def on_result(result: ParseResult) -> None:
+        report.files_parsed += 1
+        if not result.ok:
+            report.errors.append(result)
+        if progress:
+            progress(report)
+
+    results = parser.parse_files([state.path for state in to_parse], max_workers, chunk_size, on_result)
+
+    states_by_session: Dict[str, List[FileState]] = {}
+    for state in to_parse:
+        states_by_session.setdefault(parser.session_id_for(state.path), []).append(state)
+
+    sessions = sorted(
+        (result.session for result in results if result.session is not None),
+        key=lambda s: s.start_time
+    )
+    # Files of one recording become one session
+    sessions = parser.merge_partial_sessions(sessions)
+    parsed_ids = {session.session_id for session in sessions}
+
+    # Stored rows of these recordings, and of other recordings of the same
+    # therapy overlapping them
+    rows: Dict[str, SessionModel] = {}
+    if sessions:
+        rows = {
+            row.session_id: row
+            for row in db.query(SessionModel).filter(
+                SessionModel.user_id == user_id,
+                or_(
+                    SessionModel.session_id.in_(parsed_ids),
+                    and_(
+                        SessionModel.session_id.isnot(None),
+                        SessionModel.start_time < max(s.end_time for s in sessions),
+                        SessionModel.end_time > min(s.start_time for s in sessions)
+                    )
+                )
+            )
+        }
+    # A re-parsed recording replaces its row; other stored rows take part in stitching
+    groups = [
+        group for group in overlap_groups(
+            sessions + [_stored_session(row) for session_id, row in rows.items() if session_id not in parsed_ids]
+        )
+        if any(session.session_id in parsed_ids for session in group)
+    ]
+    stored = _with_cached_data(
+        db, user_id, [session for group in groups for session in group if session.session_id not in parsed_ids]
+    )
+
+    imported: List[CPAPSession] = []
+    # Stitched session -> files of every recording stitched into it
+    imported_states: Dict[str, List[FileState]] = {}
+    imported_rows = []
+    replaced_values = []
+    absorbed_ids = []
+    for group in groups:
+        merged, = merge_overlapping(stored.get(session.session_id, session) for session in group)
+        states = [state for session in group for state in states_by_session.get(session.session_id, [])]
+
+        # The earliest stored row keeps the stitched session; later ones are absorbed
+        group_rows = [rows[session.session_id] for session in group if session.session_id in rows]
+        for absorbed in group_rows[1:]:
+            replaced_values.append(rollup_values(absorbed))
+            absorbed_ids.append(absorbed.session_id)
+            db.delete(absorbed)
+
+        if group_rows:
+            row = group_rows[0]
+            merged = replace(merged, session_id=row.session_id)
+            report.sessions_updated += 1
+            replaced_values.append(rollup_values(row))
+        else:
+            row = SessionModel(session_id=merged.session_id, user_id=user_id, device_id=device_id)
+            db.add(row)
+            report.sessions_imported += 1
+
+        values = _session_fields(merged)
+        values["raw_data_path"] = states[0].relative_path if states else None
+        values["checksum"] = _session_checksum(states) if states else None
+        for column, value in values.items():
+            setattr(row, column, value)
+        row.quality_score = row.calculate_quality_score()
+        imported.append(merged)
+        imported_states[merged.session_id] = states
+        imported_rows.append(row)
+
+    update_rollups(
+        db,
+        user_id,
+        added=[rollup_values(row) for row in imported_rows],
+        removed=replaced_values
+    )
+    store_session_sketches(db, user_id, imported)
+    store_night_profiles(db, user_id, imported)
+    if absorbed_ids:
+        delete_session_rows(db, SessionSketch, user_id, absorbed_ids)
+        delete_session_rows(db, SessionProfile, user_id, absorbed_ids)
+
+    # Record every successfully read file so it is skipped next time
+    failed = {result.file_path for result in report.errors}
+
+    if waveform_store is not None:
+        for session_id in absorbed_ids:
+            waveform_store.delete_night(user_id, session_id)
+        for session_id, all_states in imported_states.items():
+            states = [s for s in all_states if s.path not in failed]
+            try:
+                _store_waveforms(waveform_store, user_id, session_id, states)
+            except (OSError, ValueError) as e:
+                # Left out of the manifest so the next upload retries them
+                failed.update(state.path for state in states)
+                report.errors.append(ParseResult(
+                    file_path=states[0].path if states else Path(session_id),
+                    error=f"Storing waveforms failed: {type(e).__name__}: {e}"
+                ))
+    stitched_ids = {
+        state.path: session_id for session_id, states in imported_states.items() for state in states
+    }
+    for state in to_parse:
+        if state.path in failed:
+            continue
+        entry = manifest.get(state.relative_path)
+        if entry is None:
+            entry = IngestManifestEntry(
+                device_id=device_id,
+                user_id=user_id,
+                relative_path=state.relative_path
+            )
+            db.add(entry)
+        entry.file_size = state.file_size
+        entry.mtime = state.mtime
+        entry.checksum = state.checksum
+        entry.session_id = stitched_ids.get(state.path, parser.session_id_for(state.path))
+
+    # Files whose contents matched but mtime moved: refresh the stat fields
+    # so the next import can skip them without hashing
+    for state in files:
+        entry = manifest.get(state.relative_path)
+        if entry is not None and entry.mtime != state.mtime and entry.checksum == state.checksum:
+            entry.mtime = state.mtime
+
+    db.query(Device).filter(Device.id == device_id).update({"last_sync": datetime.utcnow()})
+    db.commit()
+    return report
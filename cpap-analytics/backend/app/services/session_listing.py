@@ -0,0 +1,81 @@
+"""
+Session Listing
+
+Pages through a user's sessions newest first with keyset pagination on
+(start_time, id). A page is an index range scan of
+ix_sessions_user_id_start_time that starts just below the previous
+page's last row (in SQLite the index also carries the rowid id), so every
+page costs the same no matter how deep it is. Cursors are opaque to
+clients: URL-safe base64 of the last row's start time and id.
+
+Sessions without a start time cannot be placed in the order and are not
+listed.
+"""
+
+import base64
+import binascii
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import desc, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.session import Session as SessionModel
+from app.services.session_serializer import SESSION_COLUMNS, session_columns, session_records
+
+CursorKey = Tuple[datetime, int]
+
+
+class InvalidCursor(ValueError):
+    """A cursor that was not produced by encode_cursor()"""
+
+
+def encode_cursor(start_time: datetime, session_id: int) -> str:
+    """Opaque cursor continuing after the session (start_time, session_id)"""
+    raw = f"{start_time.isoformat()}|{session_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> CursorKey:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start_time, session_id = raw.split("|")
+        return datetime.fromisoformat(start_time), int(session_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def list_sessions(
+    db: Session,
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> Dict[str, Any]:
+    """
+    One page of a user's sessions, newest first, optionally limited to
+    nights starting in ``[start_date, end_date]``. ``next_cursor`` is None
+    on the last page.
+    """
+    query = db.query(*SESSION_COLUMNS).filter(
+        SessionModel.user_id == user_id,
+        SessionModel.start_time.isnot(None)
+    )
+    if start_date is not None:
+        query = query.filter(SessionModel.start_time >= datetime.combine(start_date, time.min))
+    if end_date is not None:
+        query = query.filter(SessionModel.start_time < datetime.combine(end_date + timedelta(days=1), time.min))
+    if cursor is not None:
+        query = query.filter(tuple_(SessionModel.start_time, SessionModel.id) < tuple_(*decode_cursor(cursor)))
+
+    # One extra row tells whether another page follows
+    rows: List[tuple] = query.order_by(desc(SessionModel.start_time), desc(SessionModel.id)).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    last = rows[-1] if rows else None
+    return {
+        'sessions': session_records(session_columns(rows)),
+        'next_cursor': encode_cursor(last.start_time, last.id) if has_more else None
+    }
@@ -0,0 +1,53 @@
+"""
+Per-Session Rows
+
+Data derived from an imported session (quantile sketches, hour-of-night
+profiles) is stored one row per session in tables keyed by
+(user_id, session_id), with the day of the session's start for range
+queries. Session ids come from device file names and repeat across
+users, so rows are always looked up within one user.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Type
+
+from sqlalchemy.orm import Session
+
+from app.core.database import Base
+from app.parsers.resmed import CPAPSession
+
+
+def upsert_session_rows(
+    db: Session,
+    model: Type[Base],
+    user_id: int,
+    sessions: Iterable[CPAPSession],
+    values: Callable[[CPAPSession], Dict[str, Any]]
+) -> None:
+    """Insert or replace the ``model`` rows of a user's sessions with one lookup query"""
+    sessions = list(sessions)
+    if not sessions:
+        return
+
+    existing = {
+        row.session_id: row
+        for row in db.query(model).filter(
+            model.user_id == user_id,
+            model.session_id.in_([session.session_id for session in sessions])
+        )
+    }
+    for session in sessions:
+        row = existing.get(session.session_id)
+        if row is None:
+            row = model(user_id=user_id, session_id=session.session_id)
+            db.add(row)
+            existing[session.session_id] = row
+        row.day = session.start_time.date()
+        for column, value in values(session).items():
+            setattr(row, column, value)
+
+
+def delete_session_rows(db: Session, model: Type[Base], user_id: int, session_ids: List[str]) -> None:
+    """Delete the ``model`` rows of a user's sessions"""
+    db.query(model).filter(
+        model.user_id == user_id, model.session_id.in_(session_ids)
+    ).delete(synchronize_session=False)
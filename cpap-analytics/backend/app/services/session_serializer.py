@@ -0,0 +1,77 @@
+"""
+Session Serializer
+
+Builds session payloads in the Session.to_dict() format straight from
+selected column tuples: no ORM instances are loaded, each column is
+transformed in one pass and every record is assembled once with
+dict(zip(...)). Dates and datetimes are left as objects for
+FastJSONResponse to encode.
+"""
+
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy.orm import Query
+
+from app.models.session import Session as SessionModel, compute_quality_score
+
+# Selected in this order; SESSION_FIELDS names the fields of each record
+SESSION_COLUMNS = (
+    SessionModel.id,
+    SessionModel.user_id,
+    SessionModel.start_time,
+    SessionModel.duration_minutes,
+    SessionModel.ahi,
+    SessionModel.mask_leak_95,
+    SessionModel.pressure_avg,
+    SessionModel.pressure_95,
+    SessionModel.quality_score,
+    SessionModel.central_apneas,
+    SessionModel.obstructive_apneas,
+    SessionModel.hypopneas,
+    SessionModel.created_at
+)
+
+SESSION_FIELDS = (
+    'id', 'user_id', 'date', 'duration_hours', 'ahi', 'mask_leak', 'pressure_avg', 'pressure_95',
+    'quality_score', 'central_apneas', 'obstructive_apneas', 'hypopneas', 'created_at'
+)
+
+
+def session_columns(rows: Sequence[tuple]) -> Dict[str, List[Any]]:
+    """Rows of SESSION_COLUMNS as one list per SESSION_FIELDS entry, converted like to_dict()"""
+    if not rows:
+        return {field: [] for field in SESSION_FIELDS}
+    (ids, user_ids, start_times, durations, ahis, leaks, pressure_avgs, pressure_95s,
+     scores, central, obstructive, hypopneas, created) = map(list, zip(*rows))
+
+    # Scores are stored by the importers; only legacy rows are computed here
+    scores = [
+        score or compute_quality_score(ahi, duration, leak)
+        for score, ahi, duration, leak in zip(scores, ahis, durations, leaks)
+    ]
+    return {
+        'id': ids,
+        'user_id': user_ids,
+        'date': [start.date() if start is not None else None for start in start_times],
+        'duration_hours': [round(duration / 60, 1) if duration else None for duration in durations],
+        'ahi': ahis,
+        'mask_leak': leaks,
+        'pressure_avg': pressure_avgs,
+        'pressure_95': pressure_95s,
+        'quality_score': scores,
+        'central_apneas': central,
+        'obstructive_apneas': obstructive,
+        'hypopneas': hypopneas,
+        'created_at': created
+    }
+
+
+def session_records(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Columns from session_columns() as to_dict()-shaped records"""
+    return [dict(zip(SESSION_FIELDS, values)) for values in zip(*(columns[field] for field in SESSION_FIELDS))]
+
+
+def serialize_sessions(query: Query) -> List[Dict[str, Any]]:
+    """Records for the sessions a query selects, in its order"""
+    rows = query.with_entities(*SESSION_COLUMNS).all()
+    return session_records(session_columns(rows))
@@ -0,0 +1,107 @@
+"""
+Session Sketch Service
+
+Stores the nightly leak and pressure quantile sketches produced by the
+parser and answers percentiles over a date range by merging them. A
+range costs one indexed query and a merge of a few hundred bytes per
+night, however many samples the nights held.
+
+Sessions imported before the parser recorded a mean pressure get one
+from their pressure sketch with backfill_pressure_averages().
+"""
+
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.analytics.quantile_sketch import QuantileSketch
+from app.models.session import Session as SessionModel
+from app.models.session_sketch import SessionSketch
+from app.parsers.resmed import CPAPSession
+from app.services.rollups import rebuild_rollups
+from app.services.session_rows import upsert_session_rows
+
+# Sketched metrics -> CPAPSession attribute holding the serialized sketch
+SKETCH_FIELDS = {
+    "leak": "leak_sketch",
+    "pressure": "pressure_sketch"
+}
+
+DEFAULT_PERCENTILES = (50, 95, 99)
+
+
+def store_session_sketches(db: Session, user_id: int, sessions: Iterable[CPAPSession]) -> None:
+    """Insert or replace the sketches of parsed sessions (sessions without any are skipped)"""
+    upsert_session_rows(
+        db, SessionSketch, user_id,
+        (session for session in sessions if any(getattr(session, field) for field in SKETCH_FIELDS.values())),
+        lambda session: {metric: getattr(session, field) for metric, field in SKETCH_FIELDS.items()}
+    )
+
+
+def backfill_pressure_averages(db: Session) -> List[int]:
+    """
+    Fill the missing mean pressure of sessions that have a pressure sketch
+    (within the sketch's relative accuracy) and rebuild the rollups of
+    their users, so pressure trends cover device-imported nights. Returns
+    the users updated; the caller commits. Run by scripts/backfill_rollups.py.
+    """
+    rows = db.query(SessionModel, SessionSketch.pressure).join(
+        SessionSketch,
+        and_(SessionSketch.user_id == SessionModel.user_id, SessionSketch.session_id == SessionModel.session_id)
+    ).filter(
+        or_(SessionModel.pressure_avg.is_(None), SessionModel.pressure_avg == 0),
+        SessionSketch.pressure.isnot(None)
+    ).all()
+
+    user_ids = set()
+    for session, pressure in rows:
+        mean = QuantileSketch.from_bytes(pressure).mean()
+        if mean:
+            session.pressure_avg = round(mean, 2)
+            user_ids.add(session.user_id)
+
+    db.flush()
+    for user_id in sorted(user_ids):
+        rebuild_rollups(db, user_id)
+    return sorted(user_ids)
+
+
+def range_percentiles(
+    db: Session,
+    user_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES
+) -> Dict[str, Any]:
+    """
+    Percentiles of every sketched metric over the sessions starting within
+    ``[start, end]`` (inclusive, open ended if None), e.g.
+    ``{"sessions": 30, "leak": {"samples": ..., "min": ..., "p95": ..., "max": ...}, ...}``.
+    Statistics are None for metrics without samples.
+    """
+    columns = [getattr(SessionSketch, metric) for metric in SKETCH_FIELDS]
+    query = db.query(*columns).filter(SessionSketch.user_id == user_id)
+    if start is not None:
+        query = query.filter(SessionSketch.day >= start)
+    if end is not None:
+        query = query.filter(SessionSketch.day <= end)
+    rows = query.all()
+
+    result: Dict[str, Any] = {"sessions": len(rows)}
+    for position, metric in enumerate(SKETCH_FIELDS):
+        sketch = QuantileSketch.merged(
+            QuantileSketch.from_bytes(row[position]) for row in rows if row[position]
+        )
+        values = sketch.quantiles([p / 100 for p in percentiles])
+        stats: Dict[str, Any] = {
+            "samples": sketch.count,
+            "min": sketch.min if sketch.count else None,
+            "max": sketch.max if sketch.count else None
+        }
+        for percentile, value in zip(percentiles, values):
+            stats[f"p{percentile:g}"] = round(value, 2) if value is not None else None
+        result[metric] = stats
+    return result
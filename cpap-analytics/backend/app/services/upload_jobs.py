@@ -0,0 +1,296 @@
+"""
+Upload Job Queue
+
+Processes uploaded files off the request path on a small local worker
+pool. Job state and progress counters are stored in the file_uploads
+table so clients can poll /upload/status/{upload_id}. The stored file is
+removed once its job completes or fails, and uploads left pending or
+processing by a restart are queued again on startup.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.models.device import Device
+from app.models.file_upload import FileUpload
+from app.services.csv_import import process_cpap_file
+from app.services.sd_card_import import import_sd_card, ImportReport
+from app.services.waveform_store import WaveformStore
+
+logger = logging.getLogger(__name__)
+
+# File types decoded as SD card data; everything else goes through the CSV importer
+SD_CARD_FILE_TYPES = {"zip", "edf"}
+
+# Minimum seconds between progress writes while a job runs
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+# Error messages kept on the upload row
+MAX_REPORTED_ERRORS = 5
+
+
+class UploadJobQueue:
+    """Bounded thread pool running upload jobs, one job per upload row"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, upload_id: int, bind) -> Future:
+        """Queue an upload for processing using a session bound to ``bind``"""
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=bind)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="upload-job"
+                )
+            future = self._executor.submit(run_upload_job, upload_id, session_factory)
+            self._futures[upload_id] = future
+            future.add_done_callback(lambda _: self._forget(upload_id, future))
+        return future
+
+    def _forget(self, upload_id: int, future: Future) -> None:
+        with self._lock:
+            if self._futures.get(upload_id) is future:
+                del self._futures[upload_id]
+
+    @property
+    def depth(self) -> int:
+        """Jobs queued or running"""
+        with self._lock:
+            return len(self._futures)
+
+    def wait(self, upload_id: int, timeout: Optional[float] = None) -> None:
+        """Block until an upload's job finishes (no-op if it is not queued)"""
+        with self._lock:
+            future = self._futures.get(upload_id)
+        if future is not None:
+            future.result(timeout=timeout)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+upload_queue = UploadJobQueue(settings.UPLOAD_WORKERS)
+
+
+def resume_upload_jobs(bind, queue: UploadJobQueue = upload_queue) -> List[int]:
+    """
+    Queue uploads a previous run left pending or processing. Imports are
+    idempotent, so an interrupted job simply starts over; uploads whose
+    stored file is gone are marked failed. Returns the queued upload ids.
+    """
+    if not inspect(bind).has_table(FileUpload.__tablename__):
+        return []
+
+    db = sessionmaker(autocommit=False, autoflush=False, bind=bind)()
+    try:
+        interrupted = (
+            db.query(FileUpload)
+            .filter(FileUpload.processing_status.in_([FileUpload.STATUS_PENDING, FileUpload.STATUS_PROCESSING]))
+            .order_by(FileUpload.id)
+            .all()
+        )
+        resumed = []
+        for upload in interrupted:
+            if os.path.exists(upload.filename):
+                upload.processing_status = FileUpload.STATUS_PENDING
+                resumed.append(upload.id)
+            else:
+                upload.processing_status = FileUpload.STATUS_FAILED
+                upload.error_message = "Interrupted by a restart and the stored file is missing"
+                upload.completed_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+    for upload_id in resumed:
+        queue.submit(upload_id, bind)
+    if resumed:
+        logger.info(f"Resumed {len(resumed)} interrupted upload(s)")
+    return resumed
+
+
+def run_upload_job(upload_id: int, session_factory: Callable[[], Session]) -> None:
+    """Process one upload, recording progress and the final status on its row"""
+    db = session_factory()
+    try:
+        upload = db.get(FileUpload, upload_id)
+        if upload is None:
+            logger.warning(f"Upload {upload_id} no longer exists")
+            return
+
+        upload.processing_status = FileUpload.STATUS_PROCESSING
+        upload.started_at = datetime.utcnow()
+        db.commit()
+
+        if upload.file_type in SD_CARD_FILE_TYPES:
+            _process_sd_card_upload(db, upload, session_factory)
+        else:
+            _process_csv_upload(db, upload)
+
+        upload.processing_status = FileUpload.STATUS_COMPLETED
+        upload.completed_at = datetime.utcnow()
+        db.commit()
+        _remove_stored_file(upload)
+
+    except Exception as e:
+        logger.exception(f"Upload {upload_id} failed")
+        db.rollback()
+        upload = db.get(FileUpload, upload_id)
+        if upload is not None:
+            upload.processing_status = FileUpload.STATUS_FAILED
+            upload.error_message = str(e)
+            upload.error_count = (upload.error_count or 0) + 1
+            upload.completed_at = datetime.utcnow()
+            db.commit()
+            _remove_stored_file(upload)
+    finally:
+        db.close()
+
+
+def _remove_stored_file(upload: FileUpload) -> None:
+    """Delete a finished upload's file; until then it is kept for resume_upload_jobs"""
+    try:
+        Path(upload.filename).unlink(missing_ok=True)
+    except OSError:
+        logger.warning(f"Could not remove stored upload {upload.filename}", exc_info=True)
+
+
+def _process_csv_upload(db: Session, upload: FileUpload) -> None:
+    upload.files_total = 1
+    with open(upload.filename, "rb") as f:
+        imported = process_cpap_file(f, upload.user_id, db)
+    upload.files_parsed = 1
+    upload.sessions_imported = imported
+
+
+def _process_sd_card_upload(db: Session, upload: FileUpload, session_factory: Callable[[], Session]) -> None:
+    device = _resolve_device(db, upload)
+    # Progress is written from its own session; on SQLite an open write
+    # transaction here (a new placeholder device) would lock it out
+    db.commit()
+    progress_db = session_factory()
+    last_write = 0.0
+
+    def on_progress(report: ImportReport) -> None:
+        nonlocal last_write
+        now = time.monotonic()
+        if now - last_write < PROGRESS_INTERVAL_SECONDS:
+            return
+        last_write = now
+        progress_db.query(FileUpload).filter(FileUpload.id == upload.id).update({
+            "files_total": report.files_to_parse,
+            "files_parsed": report.files_parsed,
+            "error_count": len(report.errors)
+        })
+        progress_db.commit()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="sdcard_") as workdir:
+            sd_card_path = _prepare_sd_card(Path(upload.filename), upload.original_filename, Path(workdir))
+            report = import_sd_card(
+                db,
+                upload.user_id,
+                device.id,
+                str(sd_card_path),
+                max_workers=settings.PARSER_WORKERS,
+                chunk_size=settings.PARSER_CHUNK_SIZE,
+                progress=on_progress,
+                waveform_store=WaveformStore()
+            )
+    finally:
+        progress_db.close()
+
+    upload.files_total = report.files_scanned
+    upload.files_parsed = report.files_parsed
+    # Re-uploaded nights that changed are rewritten, so they count as imported
+    upload.sessions_imported = report.sessions_imported + report.sessions_updated
+    upload.error_count = len(report.errors)
+    if report.errors:
+        upload.error_message = "; ".join(
+            f"{result.file_path.name}: {result.error}" for result in report.errors[:MAX_REPORTED_ERRORS]
+        )
+
+
+def _prepare_sd_card(stored_path: Path, original_filename: str, workdir: Path) -> Path:
+    """Lay the upload out as an SD card (a directory containing DATALOG)"""
+    if stored_path.suffix.lower() == ".edf":
+        datalog = workdir / "DATALOG"
+        datalog.mkdir()
+        shutil.copyfile(stored_path, datalog / os.path.basename(original_filename))
+        return workdir
+
+    with zipfile.ZipFile(stored_path) as archive:
+        members = archive.infolist()
+        if len(members) > settings.MAX_ARCHIVE_MEMBERS:
+            raise ValueError(f"Archive has more than {settings.MAX_ARCHIVE_MEMBERS} entries")
+        # Declared sizes are enforced while extracting, so they bound the disk used
+        if sum(member.file_size for member in members) > settings.MAX_EXTRACTED_SIZE:
+            raise ValueError(f"Archive expands to more than {settings.MAX_EXTRACTED_SIZE} bytes")
+
+        root = workdir.resolve()
+        for member in members:
+            target = (workdir / member.filename).resolve()
+            if root not in target.parents and target != root:
+                raise ValueError(f"Unsafe path in archive: {member.filename}")
+        archive.extractall(workdir)
+        # Keep the card's own timestamps so the import manifest can skip
+        # unchanged files on re-upload without hashing them
+        for member in members:
+            if not member.is_dir():
+                mtime = time.mktime(member.date_time + (0, 0, -1))
+                os.utime(workdir / member.filename, (mtime, mtime))
+
+    for directory, subdirs, _ in os.walk(workdir):
+        if "DATALOG" in subdirs:
+            return Path(directory)
+    raise ValueError("No DATALOG directory found in archive")
+
+
+def _resolve_device(db: Session, upload: FileUpload) -> Device:
+    """Device the upload belongs to: explicit, primary, first, or a new placeholder"""
+    if upload.device_id is not None:
+        device = db.get(Device, upload.device_id)
+        if device is not None:
+            return device
+
+    device = (
+        db.query(Device)
+        .filter(Device.user_id == upload.user_id)
+        .order_by(Device.is_primary.desc(), Device.id)
+        .first()
+    )
+    if device is None:
+        device = Device(
+            serial_number=f"unregistered-{upload.user_id}",
+            device_type="resmed_airsense",
+            manufacturer="ResMed",
+            model="AirSense 10",
+            user_id=upload.user_id,
+            is_primary=True
+        )
+        db.add(device)
+        db.flush()
+
+    upload.device_id = device.id
+    return device
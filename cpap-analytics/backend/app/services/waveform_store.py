@@ -0,0 +1,266 @@
+"""
+Waveform Store
+
+Persists the decoded high-resolution signals of a night (flow, pressure,
+leak, ...) so they can be charted without keeping the SD card files.
+
+Each night is a directory holding one data file per signal and a small
+index.json. A signal is cut into fixed-duration chunks of its digital
+(int16) samples. Every chunk is delta encoded (wrapping int16 differences,
+so decoding is exact), its bytes are split into planes (all low bytes,
+then all high bytes) and the result is zlib compressed. Slowly varying
+signals leave mostly zero high bytes, so a night typically takes a
+fraction of the EDF size. The index records the byte range of every
+chunk, so reading a time slice only decompresses the chunks it overlaps.
+Samples are converted to physical units with the EDF calibration on read.
+
+Next to every signal a min/max pyramid (see app.analytics.downsampling)
+is saved, so charts of long windows never touch the samples.
+"""
+
+import json
+import os
+import re
+import shutil
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.analytics.downsampling import build_pyramid
+from app.core.config import settings
+from app.parsers.edf import EDFSignal
+
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 2
+ZLIB_LEVEL = 6
+
+
+def encode_chunk(samples: np.ndarray) -> bytes:
+    """Delta encode, split into byte planes and compress one chunk"""
+    deltas = np.empty_like(samples)
+    if samples.size:
+        deltas[0] = samples[0]
+        np.subtract(samples[1:], samples[:-1], out=deltas[1:])
+    planes = deltas.view(np.uint8).reshape(-1, samples.itemsize).T
+    return zlib.compress(planes.tobytes(), ZLIB_LEVEL)
+
+
+def decode_chunk(data: bytes, dtype: np.dtype) -> np.ndarray:
+    """Inverse of encode_chunk()"""
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(dtype.itemsize, -1)
+    deltas = np.ascontiguousarray(planes.T).view(dtype).reshape(-1)
+    return np.cumsum(deltas, dtype=dtype)
+
+
+@dataclass
+class WaveformSignal:
+    """Integer (digital) samples of one signal plus what is needed to scale and place them"""
+    name: str
+    samples: np.ndarray
+    sample_rate: float
+    start_time: datetime
+    gain: float = 1.0
+    offset: float = 0.0
+    unit: str = ""
+
+    @classmethod
+    def from_edf(cls, signal: EDFSignal, start_time: datetime) -> "WaveformSignal":
+        return cls(
+            name=signal.header.base_label,
+            samples=np.ascontiguousarray(signal.digital).reshape(-1).astype("<i2", copy=False),
+            sample_rate=signal.sample_rate,
+            start_time=start_time,
+            gain=signal.header.gain,
+            offset=signal.header.offset,
+            unit=signal.header.physical_dimension
+        )
+
+
+class NightWaveforms:
+    """Read access to the stored signals of one night"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path / INDEX_FILE) as f:
+            self.index: Dict[str, Any] = json.load(f)
+        self.start_time = datetime.fromisoformat(self.index["start_time"])
+        self._pyramids: Dict[str, List[Tuple[int, np.ndarray, np.ndarray]]] = {}
+
+    @property
+    def signals(self) -> List[str]:
+        return list(self.index["signals"])
+
+    def info(self, name: str) -> Dict[str, Any]:
+        """Index entry of a signal (rate, unit, calibration, chunk layout)"""
+        try:
+            return self.index["signals"][name]
+        except KeyError:
+            raise KeyError(f"No stored signal {name!r}; available: {', '.join(self.signals)}") from None
+
+    def duration_seconds(self, name: str) -> float:
+        info = self.info(name)
+        return info["start_offset"] + info["samples"] / info["sample_rate"]
+
+    def read_samples(self, name: str, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Digital samples ``[start, stop)``, decompressing only the chunks they span"""
+        info = self.info(name)
+        start, stop, _ = slice(start, stop).indices(info["samples"])
+        dtype = np.dtype(info["dtype"])
+        if stop <= start:
+            return np.empty(0, dtype=dtype)
+
+        chunk_samples = info["chunk_samples"]
+        first, last = start // chunk_samples, (stop - 1) // chunk_samples
+        chunks = info["chunks"][first:last + 1]
+        with open(self.path / info["file"], "rb") as f:
+            f.seek(chunks[0][0])
+            data = f.read(chunks[-1][0] + chunks[-1][1] - chunks[0][0])
+
+        base = chunks[0][0]
+        samples = np.concatenate([
+            decode_chunk(data[offset - base:offset - base + length], dtype) for offset, length in chunks
+        ])
+        skip = start - first * chunk_samples
+        return samples[skip:skip + stop - start]
+
+    def pyramid(self, name: str) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+        """Min/max pyramid levels of a signal (digital values), finest first"""
+        levels = self._pyramids.get(name)
+        if levels is None:
+            info = self.info(name)
+            pyramid = info.get("pyramid")
+            if pyramid is None:
+                # Written before pyramids were stored
+                levels = build_pyramid(self.read_samples(name))
+            else:
+                with np.load(self.path / pyramid["file"]) as arrays:
+                    levels = [
+                        (bucket, arrays[f"min{level}"], arrays[f"max{level}"])
+                        for level, bucket in enumerate(pyramid["buckets"])
+                    ]
+            self._pyramids[name] = levels
+        return levels
+
+    def read(
+        self,
+        name: str,
+        start_seconds: Optional[float] = None,
+        end_seconds: Optional[float] = None,
+        physical: bool = True
+    ) -> np.ndarray:
+        """
+        Samples of a signal between two offsets (seconds from the start of
+        the night), in physical units unless ``physical`` is False.
+        """
+        info = self.info(name)
+        rate, begins = info["sample_rate"], info["start_offset"]
+        start = 0 if start_seconds is None else max(0, int(np.floor((start_seconds - begins) * rate)))
+        stop = None if end_seconds is None else max(0, int(np.ceil((end_seconds - begins) * rate)))
+        samples = self.read_samples(name, start, stop)
+        if not physical:
+            return samples
+        return samples * info["gain"] + info["offset"]
+
+    def times(self, name: str, start: int, count: int) -> np.ndarray:
+        """Offsets in seconds from the start of the night of ``count`` samples from ``start``"""
+        info = self.info(name)
+        return info["start_offset"] + (start + np.arange(count, dtype=np.float64)) / info["sample_rate"]
+
+
+class WaveformStore:
+    """Directory of nights, one per (user, session), each written atomically"""
+
+    def __init__(self, root: Union[str, Path, None] = None, chunk_seconds: Optional[int] = None):
+        self.root = Path(root if root is not None else settings.WAVEFORM_DIR)
+        self.chunk_seconds = chunk_seconds or settings.WAVEFORM_CHUNK_SECONDS
+
+    def night_path(self, user_id: int, session_id: str) -> Path:
+        return self.root / str(user_id) / session_id
+
+    def has_night(self, user_id: int, session_id: str) -> bool:
+        return (self.night_path(user_id, session_id) / INDEX_FILE).exists()
+
+    def open_night(self, user_id: int, session_id: str) -> Optional[NightWaveforms]:
+        """Stored waveforms of a night, or None if there are none"""
+        path = self.night_path(user_id, session_id)
+        if not (path / INDEX_FILE).exists():
+            return None
+        return NightWaveforms(path)
+
+    def write_night(self, user_id: int, session_id: str, signals: Iterable[WaveformSignal]) -> Path:
+        """Store (or replace) the signals of a night"""
+        signals = [signal for signal in signals if signal.sample_rate > 0 and signal.samples.size]
+        if not signals:
+            raise ValueError(f"No samples to store for session {session_id}")
+
+        path = self.night_path(user_id, session_id)
+        staging = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        start_time = min(signal.start_time for signal in signals)
+        index = {
+            "version": FORMAT_VERSION,
+            "session_id": session_id,
+            "start_time": start_time.isoformat(),
+            "signals": {}
+        }
+        for signal in signals:
+            if signal.name in index["signals"]:
+                raise ValueError(f"Signal {signal.name!r} is stored twice for session {session_id}")
+            index["signals"][signal.name] = self._write_signal(staging, signal, start_time)
+        with open(staging / INDEX_FILE, "w") as f:
+            json.dump(index, f)
+
+        # Swap the finished directory in; readers see the old or the new night
+        previous = path.with_name(f".{path.name}.old-{os.getpid()}")
+        if path.exists():
+            os.replace(path, previous)
+        os.replace(staging, path)
+        shutil.rmtree(previous, ignore_errors=True)
+        return path
+
+    def delete_night(self, user_id: int, session_id: str) -> None:
+        shutil.rmtree(self.night_path(user_id, session_id), ignore_errors=True)
+
+    def _write_signal(self, directory: Path, signal: WaveformSignal, night_start: datetime) -> Dict[str, Any]:
+        samples = signal.samples
+        chunk_samples = max(1, int(round(self.chunk_seconds * signal.sample_rate)))
+        stem = re.sub(r"[^A-Za-z0-9_-]", "_", signal.name)
+        file_name = f"{stem}.bin"
+
+        chunks = []
+        offset = 0
+        with open(directory / file_name, "wb") as f:
+            for begin in range(0, samples.size, chunk_samples):
+                data = encode_chunk(samples[begin:begin + chunk_samples])
+                f.write(data)
+                chunks.append([offset, len(data)])
+                offset += len(data)
+
+        levels = build_pyramid(samples)
+        pyramid_name = f"{stem}.pyramid.npz"
+        arrays = {}
+        for level, (_, mins, maxs) in enumerate(levels):
+            arrays[f"min{level}"], arrays[f"max{level}"] = mins, maxs
+        np.savez(directory / pyramid_name, **arrays)
+
+        return {
+            "file": file_name,
+            "dtype": samples.dtype.str,
+            "sample_rate": signal.sample_rate,
+            "start_offset": (signal.start_time - night_start).total_seconds(),
+            "samples": int(samples.size),
+            "chunk_samples": chunk_samples,
+            "gain": signal.gain,
+            "offset": signal.offset,
+            "unit": signal.unit,
+            "stored_bytes": offset,
+            "chunks": chunks,
+            "pyramid": {"file": pyramid_name, "buckets": [bucket for bucket, _, _ in levels]}
+        }
@@ -0,0 +1,108 @@
+"""
+Waveform Views
+
+Turns a time window of a stored signal into about one point per pixel of
+the chart asking for it. Windows short enough to draw every sample are
+returned raw. Longer ones are answered from the night's min/max pyramid:
+"minmax" returns the low and high of every pixel column, "lttb" picks the
+points of the pyramid's extremes that best keep the curve's shape. Either
+way a whole night costs a few thousand precomputed buckets, not the
+hundreds of thousands of samples behind them.
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.analytics.downsampling import lttb, minmax_buckets, pixel_starts
+from app.services.waveform_store import NightWaveforms
+
+METHODS = ("minmax", "lttb")
+
+# LTTB chooses from at least this many pyramid buckets per output point
+LTTB_OVERSAMPLING = 4
+
+
+def _pick_level(night: NightWaveforms, name: str, samples_per_point: float):
+    """Coarsest pyramid level whose buckets are no wider than ``samples_per_point``"""
+    chosen = None
+    for level in night.pyramid(name):
+        if level[0] > samples_per_point:
+            break
+        chosen = level
+    return chosen
+
+
+def _physical(info: Dict[str, Any], values: np.ndarray) -> np.ndarray:
+    return (values * info["gain"] + info["offset"]).astype(np.float32)
+
+
+def downsample_window(
+    night: NightWaveforms,
+    name: str,
+    start_seconds: Optional[float] = None,
+    end_seconds: Optional[float] = None,
+    width: int = 1000,
+    method: str = "minmax"
+) -> Dict[str, Any]:
+    """
+    Points of signal ``name`` between two offsets (seconds from the start
+    of the night) for a chart ``width`` pixels wide. Times are offsets in
+    seconds, values are in the signal's physical unit.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}; use one of {', '.join(METHODS)}")
+
+    info = night.info(name)
+    rate, begins, total = info["sample_rate"], info["start_offset"], info["samples"]
+    start = 0 if start_seconds is None else min(total, max(0, int(np.floor((start_seconds - begins) * rate))))
+    stop = total if end_seconds is None else min(total, max(start, int(np.ceil((end_seconds - begins) * rate))))
+    count = stop - start
+
+    result: Dict[str, Any] = {
+        "signal": name,
+        "unit": info["unit"],
+        "sample_rate": rate,
+        "start": begins + start / rate,
+        "end": begins + stop / rate,
+        "samples": count
+    }
+
+    if count <= 2 * width:
+        samples = night.read_samples(name, start, stop)
+        result.update(method="raw", t=night.times(name, start, count), v=_physical(info, samples))
+        return result
+
+    if method == "minmax":
+        level = _pick_level(night, name, count / width)
+        if level is None:
+            bucket = 1
+            mins = maxs = night.read_samples(name, start, stop)
+            first = start
+        else:
+            # Whole buckets covering the window; edge buckets may reach slightly past it
+            bucket, level_mins, level_maxs = level
+            first, last = start // bucket, -(-stop // bucket)
+            mins, maxs = level_mins[first:last], level_maxs[first:last]
+            first *= bucket
+        starts = pixel_starts(mins.size, width)
+        low, high = minmax_buckets(mins, maxs, starts)
+        low, high = _physical(info, low), _physical(info, high)
+        if info["gain"] < 0:
+            low, high = high, low
+        result.update(method="minmax", t=begins + (first + starts * bucket) / rate, min=low, max=high)
+        return result
+
+    level = _pick_level(night, name, count / (width * LTTB_OVERSAMPLING))
+    if level is None:
+        values = night.read_samples(name, start, stop)
+        positions = start + np.arange(count, dtype=np.float64)
+    else:
+        # Both extremes of every bucket, placed at the bucket's middle
+        bucket, level_mins, level_maxs = level
+        first, last = start // bucket, -(-stop // bucket)
+        values = np.column_stack((level_mins[first:last], level_maxs[first:last])).reshape(-1)
+        positions = np.repeat((np.arange(first, last) + 0.5) * bucket, 2)
+    chosen = lttb(positions, values.astype(np.float64), width)
+    result.update(method="lttb", t=begins + positions[chosen] / rate, v=_physical(info, values[chosen]))
+    return result
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Rollup Backfill
+
+Builds session_rollups for users whose sessions were stored before
+rollups existed (or by anything that bypassed update_rollups), so the
+rollup-backed analytics endpoints see their data. Users that already
+have rollups are left alone unless named with --user, which rebuilds
+theirs from the sessions table.
+
+SD card sessions imported before the parser recorded a mean pressure
+first get one from their pressure sketch, and their users' rollups are
+rebuilt so pressure trends include them.
+
+Usage:
+    python scripts/backfill_rollups.py
+    python scripts/backfill_rollups.py --user 1 --user 2
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.database import Base, SessionLocal, engine
+from app.services.rollups import backfill_rollups, rebuild_rollups
+from app.services.session_sketches import backfill_pressure_averages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", type=int, action="append", default=[],
+                        help="rebuild this user's rollups even if they exist (repeatable)")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        filled = backfill_pressure_averages(db)
+        if args.user:
+            for user_id in args.user:
+                rebuild_rollups(db, user_id)
+            rebuilt = args.user
+        else:
+            rebuilt = backfill_rollups(db)
+        db.commit()
+
+    if filled:
+        print(f"Filled mean pressure and rebuilt rollups for {len(filled)} user(s): {', '.join(map(str, filled))}")
+    if rebuilt:
+        print(f"Rebuilt rollups for {len(rebuilt)} user(s): {', '.join(map(str, rebuilt))}")
+    else:
+        print("All users with sessions already have rollups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Batch Insights Benchmark
+
+Compares generate_insights_batch() over one columnar frame with looping
+generate_insights() per user, on synthetic nightly sessions, and checks
+that both produce the same insights.
+
+Usage:
+    python scripts/benchmark_batch_insights.py --users 40000 --nights 90
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# Add the parent directory to Python path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.analytics import generate_insights, generate_insights_batch
+
+
+def build_columns(users: int, nights: int, seed: int) -> dict:
+    """Synthetic sessions: one row per user per night, ~5% of metrics missing"""
+    rng = np.random.default_rng(seed)
+    rows = users * nights
+    first_night = date(2025, 1, 1)
+    night_dates = np.array([(first_night + timedelta(days=i)).isoformat() for i in range(nights)])
+
+    # Per-user baselines so users land in different insight branches
+    ahi_level = rng.uniform(1, 15, users).repeat(nights)
+    hours_level = rng.uniform(3, 9, users).repeat(nights)
+
+    columns = {
+        'user_id': np.arange(users).repeat(nights),
+        'date': np.tile(night_dates, users),
+        'duration_hours': np.round(np.clip(hours_level + rng.normal(0, 1, rows), 0, 12), 1),
+        'ahi': np.round(np.clip(ahi_level + rng.normal(0, 2, rows), 0, None), 1),
+        'quality_score': np.round(rng.uniform(60, 98, rows), 1),
+        'mask_leak': np.round(rng.uniform(0, 40, rows), 1),
+        'pressure_avg': np.round(rng.uniform(6, 16, rows), 1),
+    }
+    for name in ('duration_hours', 'ahi', 'mask_leak'):
+        columns[name][rng.random(rows) < 0.05] = np.nan
+    return columns
+
+
+def per_user_sessions(columns: dict, users: int, nights: int) -> list:
+    """The same data as one list of session dicts per user"""
+    names = [name for name in columns if name != 'user_id']
+    values = {name: columns[name].tolist() for name in names}
+    sessions = []
+    for user in range(users):
+        rows = range(user * nights, (user + 1) * nights)
+        sessions.append([
+            {name: (None if values[name][row] != values[name][row] else values[name][row]) for name in names}
+            for row in rows
+        ])
+    return sessions
+
+
+def without_timestamps(insights: list) -> list:
+    return [{key: value for key, value in insight.items() if key != 'timestamp'} for insight in insights]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=40000)
+    parser.add_argument('--nights', type=int, default=90)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"📊 Building {args.users} users x {args.nights} nights...")
+    columns = build_columns(args.users, args.nights, args.seed)
+    sessions = per_user_sessions(columns, args.users, args.nights)
+
+    start = time.perf_counter()
+    looped = [generate_insights(user_sessions) for user_sessions in sessions]
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = [insights for _, insights in generate_insights_batch(columns)]
+    batch_seconds = time.perf_counter() - start
+
+    mismatches = sum(
+        without_timestamps(a) != without_timestamps(b) for a, b in zip(looped, batched)
+    )
+
+    print(f"generate_insights loop:  {loop_seconds:8.2f}s ({loop_seconds / args.users * 1e3:.3f} ms/user)")
+    print(f"generate_insights_batch: {batch_seconds:8.2f}s ({batch_seconds / args.users * 1e3:.3f} ms/user)")
+    print(f"Speedup: {loop_seconds / batch_seconds:.1f}x")
+    if mismatches:
+        print(f"❌ {mismatches} users got different insights")
+        return 1
+    print("✅ Batch output matches the per-user loop")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
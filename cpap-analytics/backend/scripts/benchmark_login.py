@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Login Throughput Benchmark
+
+Fires a burst of concurrent logins at the app (in process, over ASGI)
+while a probe keeps calling /health, and reports login throughput, how
+many logins were shed with 503, and the probe's latency. bcrypt runs on
+the bounded password hash pool, so the probe should stay fast while the
+burst is absorbed or rejected. Note that the database connection pool
+(15 connections by default) also caps how many logins reach the hash
+pool at once.
+
+Usage:
+    python scripts/benchmark_login.py --logins 200 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+# Add the parent directory to Python path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core import security
+from app.core.config import settings
+from app.core.database import Base, create_database_engine, get_db
+from app.core.security import PasswordHashPool, get_password_hash
+from app.main import app
+from app.models.user import User
+
+USERNAME = "benchmark"
+PASSWORD = "benchmark-password"
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+async def burst(logins: int, concurrency: int) -> dict:
+    results = {"ok": 0, "shed": 0, "other": 0, "probe": []}
+    done = asyncio.Event()
+    limit = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark", timeout=120) as client:
+        async def login():
+            async with limit:
+                response = await client.post("/api/auth/login", json={"username": USERNAME, "password": PASSWORD})
+            key = {200: "ok", 503: "shed"}.get(response.status_code, "other")
+            results[key] += 1
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                results["probe"].append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        results["seconds"] = time.perf_counter() - started
+        done.set()
+        await probe_task
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent logins")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64, help="Logins in flight at once")
+    parser.add_argument("--workers", type=int, default=settings.PASSWORD_HASH_WORKERS)
+    parser.add_argument("--max-queued", type=int, default=settings.PASSWORD_HASH_MAX_QUEUED)
+    args = parser.parse_args()
+    security.password_hash_pool = PasswordHashPool(args.workers, args.max_queued)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_database_engine(f"sqlite:///{tmp}/benchmark.db", "production")
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine)
+        with SessionLocal() as db:
+            db.add(User(username=USERNAME, email="benchmark@example.com", hashed_password=get_password_hash(PASSWORD)))
+            db.commit()
+
+        def benchmark_db():
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = benchmark_db
+        results = asyncio.run(burst(args.logins, args.concurrency))
+        engine.dispose()
+
+    print(
+        f"{args.logins} logins, {args.concurrency} in flight, "
+        f"hash pool: {args.workers} workers + {args.max_queued} queued"
+    )
+    print(f"  accepted:   {results['ok']} ({results['ok'] / results['seconds']:.1f}/s)")
+    print(f"  shed (503): {results['shed']}")
+    print(f"  other:      {results['other']}")
+    print(f"  burst time: {results['seconds']:.2f}s")
+    print(
+        f"  /health p50 {percentile(results['probe'], 0.5) * 1000:.1f} ms, "
+        f"p99 {percentile(results['probe'], 0.99) * 1000:.1f} ms over {len(results['probe'])} probes"
+    )
+
+
+if __name__ == "__main__":
+    main()
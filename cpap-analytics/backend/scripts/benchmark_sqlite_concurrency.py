@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+SQLite Concurrency Benchmark
+
+Measures dashboard-style reader throughput while a writer keeps importing
+sessions, once per database profile. In the development profile SQLite
+uses a rollback journal, so every write transaction blocks readers; the
+production profile switches to WAL, where readers continue against the
+last committed snapshot.
+
+Usage:
+    python scripts/benchmark_sqlite_concurrency.py --readers 8 --seconds 5
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the parent directory to Python path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base, DATABASE_PROFILES, create_database_engine
+from app.models.session import Session as SessionModel
+from app.models.user import User
+
+
+def seed(SessionLocal, users: int, nights: int) -> None:
+    """Users with one session per night"""
+    first_night = datetime(2024, 1, 1, 22)
+    with SessionLocal() as db:
+        db.bulk_insert_mappings(User, [
+            {"id": i + 1, "username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"}
+            for i in range(users)
+        ])
+        db.bulk_insert_mappings(SessionModel, [
+            {
+                "user_id": user_id,
+                "start_time": first_night + timedelta(days=night),
+                "duration_minutes": 420 + night % 60,
+                "ahi": 2 + night % 5,
+                "mask_leak_95": 10 + night % 9
+            }
+            for user_id in range(1, users + 1)
+            for night in range(nights)
+        ])
+        db.commit()
+
+
+def run(profile: str, users: int, nights: int, readers: int, seconds: float, batch: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_database_engine(f"sqlite:///{tmp}/benchmark.db", profile)
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine)
+        seed(SessionLocal, users, nights)
+
+        stop = threading.Event()
+        counts = {"reads": 0, "read_errors": 0, "writes": 0, "write_errors": 0}
+        latencies = []
+        lock = threading.Lock()
+
+        def reader(seed_value: int) -> None:
+            rng = random.Random(seed_value)
+            reads = errors = 0
+            timings = []
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with SessionLocal() as db:
+                        db.query(
+                            func.count(SessionModel.id),
+                            func.avg(SessionModel.ahi),
+                            func.avg(SessionModel.duration_minutes)
+                        ).filter(SessionModel.user_id == rng.randint(1, users)).one()
+                    reads += 1
+                    timings.append(time.perf_counter() - started)
+                except OperationalError:
+                    errors += 1
+            with lock:
+                latencies.extend(timings)
+                counts["reads"] += reads
+                counts["read_errors"] += errors
+
+        def writer() -> None:
+            # Appends nights after the seeded ones, one upload-sized transaction at a time
+            next_night = datetime(2024, 1, 1, 22) + timedelta(days=nights)
+            while not stop.is_set():
+                rows = []
+                for i in range(batch):
+                    rows.append({
+                        "user_id": i % users + 1,
+                        "start_time": next_night + timedelta(days=i // users),
+                        "duration_minutes": 400,
+                        "ahi": 3.0
+                    })
+                next_night += timedelta(days=batch // users + 1)
+                try:
+                    with SessionLocal() as db:
+                        db.bulk_insert_mappings(SessionModel, rows)
+                        db.commit()
+                    counts["writes"] += 1
+                except OperationalError:
+                    counts["write_errors"] += 1
+
+        threads = [threading.Thread(target=writer)]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+
+    latencies.sort()
+    counts["read_p99_ms"] = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else float("nan")
+    counts["read_max_ms"] = latencies[-1] * 1000 if latencies else float("nan")
+    counts["reads_per_second"] = counts["reads"] / elapsed
+    counts["writes_per_second"] = counts["writes"] / elapsed
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite readers under a concurrent writer")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--nights", type=int, default=365)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--batch", type=int, default=2000, help="Sessions per write transaction")
+    args = parser.parse_args()
+
+    print(f"{args.users} users x {args.nights} nights, {args.readers} readers, 1 writer, {args.seconds:g}s")
+    print(
+        f"{'profile':<12} {'reads/s':>10} {'p99 ms':>8} {'max ms':>8} {'read errors':>12} "
+        f"{'writes/s':>10} {'write errors':>13}"
+    )
+    for profile in DATABASE_PROFILES:
+        result = run(profile, args.users, args.nights, args.readers, args.seconds, args.batch)
+        print(
+            f"{profile:<12} {result['reads_per_second']:>10.0f} {result['read_p99_ms']:>8.1f} "
+            f"{result['read_max_ms']:>8.1f} {result['read_errors']:>12} "
+            f"{result['writes_per_second']:>10.1f} {result['write_errors']:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
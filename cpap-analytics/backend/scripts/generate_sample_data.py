@@ -21,6 +21,7 @@ from app.core.database import engine
 from app.models.user import User
 from app.models.device import Device
 from app.models.session import Session
+from app.services.rollups import rebuild_rollups
 
 def generate_sample_sessions(user_id: int, device_id: int, num_sessions: int = 30):
     """Generate realistic CPAP session data"""
@@ -183,6 +184,9 @@ def main():
             # Save sessions to database
             for session in sessions:
                 db.add(session)
+            # Rebuilt rather than updated so sessions from earlier runs are covered too
+            db.flush()
+            rebuild_rollups(db, demo_user.id)
             
             db.commit()
             
@@ -6,10 +6,14 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
+from app.core import query_budget
+from app.core.config import settings
 from app.core.database import get_db, Base
 from app.models.user import User
 from app.models.session import Session as CPAPSession
 from app.core.security import get_password_hash
+from app.core.user_cache import user_cache
+from app.services.insight_cache import insight_cache
 
 
 # Test database setup
@@ -44,6 +48,34 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(scope="session", autouse=True)
+def waveform_dir(tmp_path_factory):
+    """Keep waveforms written by imports out of the working directory."""
+    previous = settings.WAVEFORM_DIR
+    settings.WAVEFORM_DIR = str(tmp_path_factory.mktemp("waveforms"))
+    yield settings.WAVEFORM_DIR
+    settings.WAVEFORM_DIR = previous
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budgets():
+    """Fail any test in which a request exceeds its endpoint's @query_budget."""
+    exceeded = []
+    query_budget.add_listener(exceeded.append)
+    yield exceeded
+    query_budget.remove_listener(exceeded.append)
+    if exceeded:
+        pytest.fail("\n".join(str(e) for e in exceeded), pytrace=False)
+
+
+@pytest.fixture
+def count_queries():
+    """Count SQL statements in a block: ``with count_queries(budget=3) as counter: ...``"""
+    def counter(budget=None, where="block"):
+        return query_budget.QueryCounter(engine, budget=budget, where=where)
+    return counter
+
+
 @pytest.fixture(scope="function")
 def db_session():
     """Create a fresh database session for each test."""
@@ -54,6 +86,9 @@ def db_session():
     finally:
         session.close()
         Base.metadata.drop_all(bind=engine)
+        # Ids restart with every fresh database
+        insight_cache.clear()
+        user_cache.clear()
 
 
 @pytest.fixture(scope="function")
@@ -119,4 +154,86 @@ def sample_cpap_sessions(db_session, test_user):
         db_session.add(session)
     
     db_session.commit()
-    return sessions
\ No newline at end of file
+    return sessions
+
+def write_edf(path, start_time, record_duration, signals, annotations=None, num_records=None):
+    """
+    Write a minimal EDF+ file for parser tests.
+
+    ``signals`` is a list of dicts with ``label``, ``samples`` (int16 digital
+    values), ``samples_per_record`` and optional ``physical_min``/``physical_max``/
+    ``digital_min``/``digital_max``/``dimension``. ``annotations`` is a list of
+    ``(onset, duration, text)`` tuples written to an ``EDF Annotations`` signal.
+    """
+    import numpy as np
+
+    signals = [dict(s) for s in signals]
+    if num_records is None:
+        num_records = max(
+            (len(s["samples"]) + s["samples_per_record"] - 1) // s["samples_per_record"] for s in signals
+        )
+
+    if annotations is not None:
+        # One annotation record per data record; the first carries the events
+        records = []
+        for index in range(num_records):
+            tal = f"+{index * record_duration:g}\x14\x14\x00".encode()
+            if index == 0:
+                for onset, duration, text in annotations:
+                    tal += f"+{onset:g}\x15{duration:g}\x14{text}\x14\x00".encode()
+            records.append(tal)
+        tal_bytes = (max(len(r) for r in records) + 1) // 2
+        records = [r.ljust(tal_bytes * 2, b"\x00") for r in records]
+        signals.append({
+            "label": "EDF Annotations",
+            "samples": np.frombuffer(b"".join(records), dtype="<i2"),
+            "samples_per_record": tal_bytes,
+            "physical_min": -1,
+            "physical_max": 1,
+            "digital_min": -32768,
+            "digital_max": 32767,
+        })
+
+    def field(value, width):
+        return str(value).ljust(width)[:width].encode("ascii")
+
+    ns = len(signals)
+    header = b"".join([
+        field(0, 8),
+        field("X X X X", 80),
+        field("Startdate X X X X", 80),
+        field(start_time.strftime("%d.%m.%y"), 8),
+        field(start_time.strftime("%H.%M.%S"), 8),
+        field(256 + ns * 256, 8),
+        field("EDF+C", 44),
+        field(num_records, 8),
+        field(record_duration, 8),
+        field(ns, 4),
+    ])
+    columns = [
+        ("label", 16, ""), ("transducer", 80, ""), ("dimension", 8, ""),
+        ("physical_min", 8, -32768), ("physical_max", 8, 32767),
+        ("digital_min", 8, -32768), ("digital_max", 8, 32767),
+        ("prefiltering", 80, ""), ("samples_per_record", 8, 1), ("reserved", 32, ""),
+    ]
+    for key, width, default in columns:
+        header += b"".join(field(s.get(key, default), width) for s in signals)
+
+    blocks = []
+    for s in signals:
+        per_record = s["samples_per_record"]
+        data = np.zeros(num_records * per_record, dtype="<i2")
+        samples = np.asarray(s["samples"], dtype="<i2")[:data.size]
+        data[:samples.size] = samples
+        blocks.append(data.reshape(num_records, per_record))
+
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(np.hstack(blocks).astype("<i2").tobytes())
+    return path
+
+
+@pytest.fixture
+def make_edf():
+    """Factory fixture wrapping ``write_edf``."""
+    return write_edf
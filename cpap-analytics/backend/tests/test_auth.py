@@ -1,5 +1,14 @@
+import threading
+import time
+
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.core import security
+from app.core.security import PasswordHashPool
+from app.core.user_cache import UserCache, user_cache
 
 
 @pytest.mark.unit
@@ -142,4 +151,140 @@ class TestAuthEndpoints:
     def test_logout_without_token(self, client: TestClient):
         """Test logout without token fails."""
         response = client.post("/api/auth/logout")
-        assert response.status_code == 401
\ No newline at end of file
+        assert response.status_code == 401
+
+
+class UserQueries:
+    """Counts SELECTs on the users table while active"""
+
+    def __init__(self, db_session):
+        self.engine = db_session.get_bind()
+        self.count = 0
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._capture)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._capture)
+
+
+@pytest.mark.unit
+@pytest.mark.auth
+class TestUserCache:
+    """Test caching of the authenticated user between requests."""
+
+    def test_repeat_requests_skip_user_query(self, client: TestClient, auth_headers, db_session):
+        """Only the first request with a token loads the user row."""
+        with UserQueries(db_session) as first:
+            assert client.get("/api/v1/users/me", headers=auth_headers).status_code == 200
+        with UserQueries(db_session) as repeat:
+            response = client.get("/api/v1/users/me", headers=auth_headers)
+
+        assert first.count == 1
+        assert repeat.count == 0
+        assert response.json()["username"] == "testuser"
+
+    def test_profile_update_invalidates(self, client: TestClient, auth_headers):
+        """A profile edit through the bulk update path is visible on the next request."""
+        client.get("/api/v1/users/me", headers=auth_headers)
+        response = client.put("/api/v1/users/me", json={"full_name": "Test Person"}, headers=auth_headers)
+        assert response.status_code == 200
+
+        assert client.get("/api/v1/users/me", headers=auth_headers).json()["full_name"] == "Test Person"
+
+    def test_password_change_through_cached_user(self, client: TestClient, auth_headers):
+        """A cached principal is attached to the request session, so changes are saved."""
+        client.get("/api/v1/users/me", headers=auth_headers)
+        response = client.put("/api/auth/profile", json={"password": "newpass456"}, headers=auth_headers)
+        assert response.status_code == 200
+        assert len(user_cache) == 0
+
+        login = client.post("/api/auth/login", json={"username": "testuser", "password": "newpass456"})
+        assert login.status_code == 200
+
+    def test_deactivation_invalidates(self, client: TestClient, auth_headers, db_session, test_user):
+        """A deactivated user is rejected on the next request."""
+        assert client.get("/api/v1/users/me", headers=auth_headers).status_code == 200
+
+        test_user.is_active = False
+        db_session.commit()
+
+        assert client.get("/api/v1/users/me", headers=auth_headers).status_code == 400
+
+    def test_deactivation_is_dropped_on_commit(self, client: TestClient, auth_headers, db_session, test_user):
+        """A flushed deactivation keeps the cached principal until it is committed."""
+        assert client.get("/api/v1/users/me", headers=auth_headers).status_code == 200
+
+        test_user.is_active = False
+        db_session.flush()
+        assert len(user_cache) == 1
+        db_session.commit()
+        assert len(user_cache) == 0
+
+    def test_user_loaded_before_an_invalidation_is_not_cached(self, test_user):
+        """A row read before a committed change is not stored."""
+        generation = user_cache.generation(test_user.id)
+        user_cache.invalidate(test_user.id)
+
+        user_cache.put(test_user.id, "token", test_user, generation)
+
+        assert len(user_cache) == 0
+
+    def test_expiry_and_bound(self, db_session, test_user):
+        """Entries expire after the TTL and the least recently used are evicted."""
+        cache = UserCache(max_entries=2, ttl_seconds=0.05)
+        cache.put(test_user.id, "a", test_user)
+        cache.put(test_user.id, "b", test_user)
+        cache.put(test_user.id, "c", test_user)
+        assert len(cache) == 2
+
+        db_session.expunge_all()
+        assert cache.get(test_user.id, "c", db_session).email == "test@example.com"
+        time.sleep(0.06)
+        assert cache.get(test_user.id, "c", db_session) is None
+
+
+@pytest.mark.unit
+@pytest.mark.auth
+class TestPasswordHashPool:
+    """Test the bounded executor used for bcrypt."""
+
+    def test_rejects_beyond_queue_depth(self):
+        """Calls beyond workers + queue fail fast with 503 instead of waiting."""
+        pool = PasswordHashPool(workers=1, max_queued=0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            release.wait(5)
+            return "hash"
+
+        worker = threading.Thread(target=pool.run, args=(slow_hash,))
+        worker.start()
+        started.wait(5)
+        try:
+            with pytest.raises(HTTPException) as excinfo:
+                pool.run(lambda: "never")
+            assert excinfo.value.status_code == 503
+            assert "Retry-After" in excinfo.value.headers
+        finally:
+            release.set()
+            worker.join()
+
+        assert pool.run(lambda: "free again") == "free again"
+
+    def test_login_when_saturated(self, client: TestClient, test_user, monkeypatch):
+        """A saturated pool answers login with 503 rather than hanging."""
+        full = PasswordHashPool(workers=1, max_queued=0)
+        full._slots.acquire()
+        monkeypatch.setattr(security, "password_hash_pool", full)
+
+        response = client.post("/api/auth/login", json={"username": "testuser", "password": "testpass123"})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"]
@@ -0,0 +1,91 @@
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.parsers import ResMedParser
+from app.parsers.breaths import breath_summary, segment_breaths
+
+RATE = 25
+
+
+def breathing(seconds, period=4.0, amplitude=0.5, noise=0.02, seed=0):
+    """Sinusoidal flow in L/s; each breath inspires amplitude * period / pi litres"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    return amplitude * np.sin(2 * np.pi * t / period) + np.random.default_rng(seed).normal(0, noise, t.size)
+
+
+@pytest.mark.unit
+@pytest.mark.parser
+class TestBreathSegmentation:
+    """Test breath detection on flow."""
+
+    def test_regular_breathing(self):
+        """Noisy 15/min breathing yields one breath per cycle and the analytic volumes."""
+        breaths = segment_breaths(breathing(600), RATE)
+
+        assert len(breaths) == 148  # the first cycle has no expiration before it
+        np.testing.assert_allclose(breaths.duration, 4.0, atol=0.2)
+        np.testing.assert_allclose(breaths.inspiratory_time, 2.0, atol=0.2)
+        np.testing.assert_allclose(breaths.tidal_volume, 2 / np.pi, rtol=0.05)
+
+        summary = breath_summary(breaths)
+        assert summary["resp_rate_avg"] == pytest.approx(15.0, abs=0.05)
+        assert summary["tidal_volume_avg"] == pytest.approx(2000 / np.pi, rel=0.01)
+        assert summary["minute_vent_avg"] == pytest.approx(15 * 2 / np.pi, rel=0.01)
+
+    def test_noise_does_not_split_breaths(self):
+        """Zero crossings from noise around end-expiration do not start new breaths."""
+        flow = breathing(120, noise=0.0)
+        flow[np.abs(flow) < 0.03] = np.resize([0.01, -0.01], np.count_nonzero(np.abs(flow) < 0.03))
+
+        assert len(segment_breaths(flow, RATE)) == 28
+
+    def test_apnea_left_out_of_averages(self):
+        """A 30 s pause is one implausibly long breath, excluded from the nightly rate."""
+        flow = breathing(600)
+        flow[5000:5750] = np.random.default_rng(1).normal(0, 0.01, 750)
+        breaths = segment_breaths(flow, RATE)
+
+        assert breaths.duration.max() > 30
+        assert np.count_nonzero(~breaths.valid) == 1
+        assert breath_summary(breaths)["resp_rate_avg"] == pytest.approx(15.0, abs=0.1)
+
+    def test_flat_signal(self):
+        """Mask-off (flat) flow has no breaths and no summary."""
+        breaths = segment_breaths(np.zeros(10_000), RATE)
+        assert len(breaths) == 0
+        assert breath_summary(breaths) == {}
+
+    def test_full_night_is_fast(self):
+        """Eight hours of 25 Hz flow segment in well under a second."""
+        flow = breathing(8 * 3600)
+        started = time.perf_counter()
+        breaths = segment_breaths(flow, RATE)
+        assert time.perf_counter() - started < 0.5
+        assert len(breaths) == 8 * 3600 // 4 - 2
+
+
+@pytest.mark.integration
+@pytest.mark.parser
+class TestFlowRespiration:
+    """Test respiratory metrics of BRP files."""
+
+    def test_brp_flow_gives_respiratory_metrics(self, tmp_path, make_edf):
+        """A BRP file without ventilation channels reports metrics from its flow."""
+        datalog = tmp_path / "DATALOG"
+        datalog.mkdir()
+        flow = np.round(breathing(3600, period=3.75) / 0.002).astype(np.int16)
+        make_edf(
+            datalog / "20250101_223000_BRP.edf", datetime(2025, 1, 1, 22, 30), record_duration=60,
+            signals=[{"label": "Flow.40ms", "samples": flow, "samples_per_record": 1500,
+                      "physical_min": -2, "physical_max": 2, "digital_min": -1000, "digital_max": 1000,
+                      "dimension": "L/s"}],
+        )
+
+        session, = ResMedParser(str(tmp_path)).parse_all_sessions()
+
+        assert session.resp_rate_avg == pytest.approx(16.0, abs=0.05)
+        assert session.tidal_volume_avg == pytest.approx(1875 / np.pi, rel=0.01)
+        assert session.minute_vent_avg == pytest.approx(16 * 1.875 / np.pi, rel=0.01)
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app.api.endpoints import sessions
+from app.main import app
+
+# Requests that must be in their blocking database call at the same time
+CONCURRENT_REQUESTS = 10
+
+# Seconds to wait for every request to arrive before declaring them serialised
+BARRIER_TIMEOUT = 5
+
+
+async def concurrent_requests(headers, count):
+    """Status codes of ``count`` concurrent /api/sessions/insights requests"""
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        responses = await asyncio.gather(*(
+            client.get("/api/sessions/insights", headers=headers) for _ in range(count)
+        ))
+        return [response.status_code for response in responses]
+
+
+@pytest.mark.integration
+@pytest.mark.api
+class TestBlockingQueries:
+    """Test that blocking database work does not stall the event loop."""
+
+    def test_blocking_calls_overlap(self, auth_headers, monkeypatch):
+        """Every request is inside its blocking call at once instead of waiting for the previous one."""
+        barrier = threading.Barrier(CONCURRENT_REQUESTS, timeout=BARRIER_TIMEOUT)
+
+        def blocking_insights(db, user_id):
+            # Serialised on the event loop, the first caller would wait here
+            # alone until the barrier times out and breaks
+            barrier.wait()
+            return []
+
+        monkeypatch.setattr(sessions, "get_user_insights", blocking_insights)
+
+        statuses = asyncio.run(concurrent_requests(auth_headers, CONCURRENT_REQUESTS))
+
+        assert statuses == [200] * CONCURRENT_REQUESTS
+        assert not barrier.broken
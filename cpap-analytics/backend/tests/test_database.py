@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import create_database_engine, engine_options
+
+
+def pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+
+@pytest.mark.unit
+class TestEngineProfiles:
+    """Test database engine profiles."""
+
+    def test_production_sqlite_pragmas(self, tmp_path):
+        """The production profile tunes every new SQLite connection."""
+        engine = create_database_engine(f"sqlite:///{tmp_path}/prod.db", "production")
+        try:
+            assert pragma(engine, "journal_mode") == "wal"
+            assert pragma(engine, "synchronous") == 1  # NORMAL
+            assert pragma(engine, "busy_timeout") == settings.SQLITE_BUSY_TIMEOUT_MS
+            assert pragma(engine, "cache_size") == -settings.SQLITE_CACHE_SIZE_KB
+            assert pragma(engine, "mmap_size") == settings.SQLITE_MMAP_SIZE
+        finally:
+            engine.dispose()
+
+    def test_development_keeps_driver_defaults(self, tmp_path):
+        """The development profile leaves SQLite in rollback-journal mode."""
+        engine = create_database_engine(f"sqlite:///{tmp_path}/dev.db", "development")
+        try:
+            assert pragma(engine, "journal_mode") == "delete"
+        finally:
+            engine.dispose()
+
+    def test_pool_sizing(self):
+        """Only the production profile sizes the pool, and never for SQLite."""
+        options = engine_options("postgresql://db/cpap", "production")
+        assert options["pool_size"] == settings.DB_POOL_SIZE
+        assert options["max_overflow"] == settings.DB_MAX_OVERFLOW
+        assert engine_options("postgresql://db/cpap", "development") == {}
+        assert "pool_size" not in engine_options("sqlite:///./cpap.db", "production")
+
+    def test_unknown_profile(self):
+        """A misspelt profile is an error rather than silently untuned."""
+        with pytest.raises(ValueError):
+            engine_options("sqlite:///./cpap.db", "prod")
@@ -0,0 +1,169 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.analytics.downsampling import PYRAMID_BASE, PYRAMID_FACTOR, build_pyramid, lttb
+from app.models.session import Session as SessionModel
+from app.services.waveform_store import WaveformSignal, WaveformStore
+from app.services.waveform_view import downsample_window
+
+NIGHT_START = datetime(2025, 1, 1, 22, 30)
+NIGHT_ID = "resmed_20250101_223000"
+
+
+def eight_hour_night(store, user_id=1):
+    """Breathing flow at 25 Hz with one 3-sample spike (a cough) at 5000 s"""
+    t = np.arange(8 * 3600 * 25) / 25
+    flow = (np.sin(2 * np.pi * t / 4.0) * 250 + np.random.default_rng(0).normal(0, 1, t.size)).astype("<i2")
+    flow[125000:125003] = 1500
+    store.write_night(user_id, NIGHT_ID, [
+        WaveformSignal("flow", flow, 25.0, NIGHT_START, gain=0.002, unit="L/s")
+    ])
+    return flow
+
+
+@pytest.mark.unit
+class TestDownsampling:
+    """Test the min/max pyramid and LTTB."""
+
+    def test_pyramid_levels_hold_bucket_extremes(self):
+        """Every level's buckets hold the min and max of the samples they cover."""
+        rng = np.random.default_rng(3)
+        samples = rng.integers(-1000, 1000, 100_003).astype("<i2")
+        levels = build_pyramid(samples)
+
+        assert levels[0][0] == PYRAMID_BASE
+        assert all(b == a * PYRAMID_FACTOR for (a, _, _), (b, _, _) in zip(levels, levels[1:]))
+        for bucket, mins, maxs in levels:
+            assert mins.size == -(-samples.size // bucket)
+            for index in (0, mins.size // 2, mins.size - 1):
+                covered = samples[index * bucket:(index + 1) * bucket]
+                assert (mins[index], maxs[index]) == (covered.min(), covered.max())
+
+    def test_lttb_keeps_ends_and_peaks(self):
+        """LTTB returns the requested count, first and last point included, and keeps an outlier."""
+        x = np.arange(10_000, dtype=np.float64)
+        y = np.sin(x / 300)
+        y[4321] = 5.0
+        chosen = lttb(x, y, 200)
+
+        assert chosen.size == 200
+        assert chosen[0] == 0 and chosen[-1] == x.size - 1
+        assert np.all(np.diff(chosen) > 0)
+        assert 4321 in chosen
+
+
+@pytest.mark.unit
+class TestWaveformView:
+    """Test windows of a stored night reduced to chart points."""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return WaveformStore(tmp_path)
+
+    def test_whole_night_minmax(self, store):
+        """A night reduces to at most one min/max pair per pixel and keeps the spike."""
+        flow = eight_hour_night(store)
+        view = downsample_window(store.open_night(1, NIGHT_ID), "flow", width=1000)
+
+        assert view["method"] == "minmax"
+        assert len(view["t"]) == len(view["min"]) == len(view["max"]) <= 1000
+        assert max(view["max"]) == pytest.approx(1500 * 0.002)
+        assert min(view["min"]) == pytest.approx(flow.min() * 0.002)
+        assert np.all(np.diff(view["t"]) > 0)
+
+    def test_minmax_window_covers_its_samples(self, store):
+        """Each pixel of a window bounds the raw samples it covers."""
+        flow = eight_hour_night(store)
+        view = downsample_window(store.open_night(1, NIGHT_ID), "flow", 3600, 7200, width=500)
+
+        assert view["start"] == 3600 and view["end"] == 7200
+        raw = flow[3600 * 25:7200 * 25] * 0.002
+        assert min(view["min"]) <= raw.min() + 1e-6
+        assert max(view["max"]) >= raw.max() - 1e-6
+        assert view["t"][0] <= 3600 < view["t"][1]
+
+    def test_lttb_window(self, store):
+        """LTTB returns exactly width points picked from the pyramid, spike included."""
+        eight_hour_night(store)
+        view = downsample_window(store.open_night(1, NIGHT_ID), "flow", width=800, method="lttb")
+
+        assert view["method"] == "lttb"
+        assert len(view["t"]) == len(view["v"]) == 800
+        assert max(view["v"]) == pytest.approx(1500 * 0.002)
+
+    def test_short_window_is_raw(self, store):
+        """Windows with few samples per pixel return every sample."""
+        flow = eight_hour_night(store)
+        view = downsample_window(store.open_night(1, NIGHT_ID), "flow", 100, 120, width=1000)
+
+        assert view["method"] == "raw"
+        np.testing.assert_allclose(view["v"], flow[2500:3000] * 0.002, rtol=1e-6)
+        assert view["t"][0] == pytest.approx(100)
+
+    def test_pyramid_built_for_old_nights(self, store):
+        """Nights stored without a pyramid get one built from their samples."""
+        eight_hour_night(store)
+        night = store.open_night(1, NIGHT_ID)
+        stored = night.pyramid("flow")
+        del night.index["signals"]["flow"]["pyramid"]
+        night._pyramids.clear()
+
+        rebuilt = night.pyramid("flow")
+        assert [bucket for bucket, _, _ in rebuilt] == [bucket for bucket, _, _ in stored]
+        np.testing.assert_array_equal(rebuilt[-1][2], stored[-1][2])
+
+
+@pytest.mark.api
+class TestWaveformEndpoints:
+    """Test the session waveform endpoints."""
+
+    @pytest.fixture
+    def session_id(self, db_session, test_user):
+        eight_hour_night(WaveformStore(), test_user.id)
+        session = SessionModel(user_id=test_user.id, session_id=NIGHT_ID, start_time=NIGHT_START)
+        db_session.add(session)
+        db_session.commit()
+        return session.id
+
+    def test_lists_signals(self, client, auth_headers, session_id):
+        """Stored signals are listed with their unit, rate and duration."""
+        response = client.get(f"/api/sessions/{session_id}/waveforms", headers=auth_headers)
+
+        assert response.status_code == 200
+        signal, = response.json()["signals"]
+        assert signal["name"] == "flow" and signal["unit"] == "L/s"
+        assert signal["duration"] == 8 * 3600
+
+    def test_returns_width_sized_view(self, client, auth_headers, session_id):
+        """A whole night comes back as a payload sized by the chart, not the samples."""
+        response = client.get(
+            f"/api/sessions/{session_id}/waveforms/flow",
+            params={"width": 1200, "method": "minmax"},
+            headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["samples"] == 8 * 3600 * 25
+        assert len(body["min"]) <= 1200
+        assert len(response.content) < 100_000
+
+        response = client.get(
+            f"/api/sessions/{session_id}/waveforms/flow",
+            params={"start": 600, "end": 1800, "width": 300, "method": "lttb"},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        assert len(response.json()["v"]) == 300
+
+    def test_missing_and_invalid(self, client, auth_headers, session_id):
+        """Unknown sessions and signals are 404s; bad parameters are rejected."""
+        base = f"/api/sessions/{session_id}/waveforms"
+        assert client.get(f"/api/sessions/{session_id + 1}/waveforms", headers=auth_headers).status_code == 404
+        assert client.get(f"{base}/pressure", headers=auth_headers).status_code == 404
+        assert client.get(f"{base}/flow", params={"method": "mean"}, headers=auth_headers).status_code == 422
+        assert client.get(f"{base}/flow", params={"width": 1}, headers=auth_headers).status_code == 422
+        assert client.get(f"{base}/flow", params={"start": 50, "end": 10}, headers=auth_headers).status_code == 400
+        assert client.get(base).status_code == 403
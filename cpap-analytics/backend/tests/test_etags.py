@@ -0,0 +1,122 @@
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.api.endpoints import sessions as sessions_endpoints
+from app.core.etags import etag_matches
+from app.models.session import Session as SessionModel
+from app.services.csv_import import process_cpap_file
+from app.services.data_version import get_data_version
+
+
+def add_nights(db_session, user_id, first, count):
+    rows = [
+        SessionModel(
+            user_id=user_id,
+            start_time=datetime(2025, 1, 1, 22, 30) + timedelta(days=night),
+            duration_minutes=450,
+            ahi=3.0,
+            mask_leak_95=12.0,
+            pressure_avg=10.0
+        )
+        for night in range(first, first + count)
+    ]
+    db_session.add_all(rows)
+    db_session.commit()
+    return rows
+
+
+@pytest.mark.unit
+class TestDataVersion:
+    """Test the per-user session data version."""
+
+    def test_session_writes_bump_once_per_transaction(self, db_session, test_user):
+        """Inserting, editing and deleting sessions each bump the version once."""
+        user_id = test_user.id
+        assert get_data_version(db_session, user_id) == 0
+
+        nights = add_nights(db_session, user_id, 0, 5)
+        assert get_data_version(db_session, user_id) == 1
+
+        nights[0].ahi = 12.0
+        nights[1].ahi = 14.0
+        db_session.commit()
+        assert get_data_version(db_session, user_id) == 2
+
+        db_session.delete(nights[2])
+        db_session.commit()
+        assert get_data_version(db_session, user_id) == 3
+
+    def test_unchanged_and_rolled_back_writes_keep_version(self, db_session, test_user):
+        """Commits without session changes and rolled back changes leave the version alone."""
+        user_id = test_user.id
+        nights = add_nights(db_session, user_id, 0, 2)
+
+        nights[0].ahi = nights[0].ahi
+        db_session.commit()
+        assert get_data_version(db_session, user_id) == 1
+
+        nights[0].ahi = 30.0
+        db_session.flush()
+        db_session.rollback()
+        assert get_data_version(db_session, user_id) == 1
+
+    def test_csv_import_bumps_version(self, db_session, test_user):
+        """Rows inserted without the ORM still bump the importing user's version."""
+        user_id = test_user.id
+        process_cpap_file(io.BytesIO(b"date,duration_hours,ahi,leak\n2025-01-01,7.5,3.0,12.0\n"), user_id, db_session)
+        assert get_data_version(db_session, user_id) == 1
+
+    def test_etag_matching(self):
+        """If-None-Match lists, weak tags and * are understood."""
+        etag = '"insights-1.0.0-1-3"'
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", W/{etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('"insights-1.0.0-1-2"', etag)
+        assert not etag_matches(None, etag)
+
+
+@pytest.mark.api
+class TestConditionalGet:
+    """Test ETag revalidation of per-user session endpoints."""
+
+    @pytest.mark.parametrize("path", ["/api/sessions/insights", "/api/sessions/analytics"])
+    def test_unchanged_data_is_not_modified(self, client, auth_headers, db_session, test_user, path):
+        """A matching If-None-Match gets 304; a new night changes the tag."""
+        user_id = test_user.id
+        add_nights(db_session, user_id, 0, 7)
+
+        first = client.get(path, headers=auth_headers)
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"] == "private, no-cache"
+
+        revalidated = client.get(path, headers={**auth_headers, "If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == etag
+        assert revalidated.content == b""
+
+        add_nights(db_session, user_id, 7, 1)
+        changed = client.get(path, headers={**auth_headers, "If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+
+    def test_not_modified_skips_sessions_and_insights(
+        self, client, auth_headers, db_session, test_user, count_queries, monkeypatch
+    ):
+        """A 304 reads only the data version - no session rows, no insight generation."""
+        add_nights(db_session, test_user.id, 0, 7)
+        etag = client.get("/api/sessions/insights", headers=auth_headers).headers["etag"]
+
+        def fail(*args, **kwargs):
+            raise AssertionError("insights were generated for a 304")
+        monkeypatch.setattr(sessions_endpoints, "get_user_insights", fail)
+
+        with count_queries() as counter:
+            response = client.get("/api/sessions/insights", headers={**auth_headers, "If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert counter.count == 1
+        assert "user_data_versions" in counter.statements[0]
@@ -0,0 +1,391 @@
+import re
+import statistics
+from datetime import date, timedelta
+
+import random
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.analytics import generate_insights, generate_insights_batch
+from app.analytics.batch_insights import BatchSessionFrame
+from app.analytics.incremental import InsightState
+from app.models.session import Session as SessionModel
+from app.services.insight_cache import CachedInsightState, get_user_insights, insight_cache
+from app.analytics.insights_engine import InsightsEngine
+from app.analytics.session_frame import GroupedStats, SessionFrame, ols_slope
+
+
+def make_sessions(count, **overrides):
+    """Nightly session dicts in the shape the insights endpoint builds"""
+    sessions = []
+    for i in range(count):
+        session = {
+            'date': (date(2025, 1, 1) + timedelta(days=i)).isoformat(),
+            'duration_hours': 7.5,
+            'ahi': 3.0,
+            'quality_score': 88.0,
+            'mask_leak': 8.0,
+            'pressure_avg': 10.0
+        }
+        for key, values in overrides.items():
+            session[key] = values[i] if isinstance(values, list) else values
+        sessions.append(session)
+    return sessions
+
+
+def titles(insights):
+    return [insight['title'] for insight in insights]
+
+
+def without_timestamps(insights):
+    return [{k: v for k, v in insight.items() if k != 'timestamp'} for insight in insights]
+
+
+def random_sessions(rng, count):
+    """Noisy sessions with missing and zero values in every metric"""
+    base_ahi = rng.uniform(1, 20)
+    sessions = []
+    for i in range(count):
+        sessions.append({
+            'date': (date(2025, 1, 1) + timedelta(days=i)).isoformat(),
+            'duration_hours': rng.choice([None, 0, round(rng.uniform(2, 10), 1)]),
+            'ahi': None if rng.random() < 0.1 else round(rng.uniform(0, base_ahi), 1),
+            'quality_score': rng.choice([None, 0, round(rng.uniform(50, 100), 1)]),
+            'mask_leak': None if rng.random() < 0.2 else round(rng.uniform(0, 40), 1),
+            'pressure_avg': None if rng.random() < 0.2 else round(rng.uniform(6, 16), 1)
+        })
+    return sessions
+
+
+@pytest.mark.unit
+class TestSessionFrame:
+    """Test the columnar session view shared by the insight analyzers."""
+
+    def test_sorts_by_date_and_maps_none_to_nan(self):
+        """Columns follow date order and missing values become NaN."""
+        sessions = make_sessions(3, ahi=[1.0, None, 3.0])
+        frame = SessionFrame.from_sessions(list(reversed(sessions)))
+
+        assert len(frame) == 3
+        ahi = frame.column('ahi')
+        assert ahi[0] == 1.0 and np.isnan(ahi[1]) and ahi[2] == 3.0
+
+    def test_valid_drops_missing_and_optionally_zero(self):
+        """valid() mirrors the `is not None` and truthiness filters."""
+        frame = SessionFrame.from_sessions(make_sessions(4, quality_score=[0, None, 80.0, 90.0]))
+
+        assert frame.valid('quality_score').tolist() == [0.0, 80.0, 90.0]
+        assert frame.valid('quality_score', nonzero=True).tolist() == [80.0, 90.0]
+        assert frame.valid('quality_score', -2, nonzero=True).tolist() == [80.0, 90.0]
+
+    def test_window_stats_are_shared(self):
+        """The same window is only reduced once per frame."""
+        frame = SessionFrame.from_sessions(make_sessions(10))
+        assert frame.window('ahi', -7) is frame.window('ahi', -7)
+
+    def test_window_statistics(self):
+        """Window statistics match the statistics module."""
+        hours = [3.5, 7.2, 8.1, 0, 6.6, 4.0, 9.3]
+        frame = SessionFrame.from_sessions(make_sessions(7, duration_hours=hours))
+        window = frame.window('duration_hours', nonzero=True)
+        expected = [h for h in hours if h]
+
+        assert window.count == 6
+        assert window.mean == pytest.approx(statistics.mean(expected))
+        assert window.stdev == pytest.approx(statistics.stdev(expected))
+        assert window.maximum == 9.3
+        assert window.compliance_rate == pytest.approx(5 / 6 * 100)
+
+    def test_grouped_stats(self):
+        """Per-group count, mean, stdev and extremes match numpy; empty groups are NaN."""
+        rng = np.random.default_rng(0)
+        values = np.round(rng.uniform(0, 12, 200), 1)
+        groups = rng.integers(0, 5, 200)
+        groups[groups == 3] = 4
+        stats = GroupedStats.of(values, groups, 5)
+
+        for group in (0, 1, 2, 4):
+            expected = values[groups == group]
+            window = stats.at(group)
+            assert window.count == len(expected)
+            assert window.mean == pytest.approx(expected.mean())
+            assert window.stdev == pytest.approx(expected.std(ddof=1))
+            assert window.minimum == expected.min()
+            assert window.maximum == expected.max()
+            assert window.compliant_count == np.count_nonzero(expected >= 4)
+        assert stats.at(3).count == 0
+        assert np.isnan(stats.at(3).mean)
+        assert np.isnan(stats.at(3).minimum)
+
+    def test_windows_are_reduced_in_one_pass(self):
+        """Every window the analyzers read is declared, so one pass reduces them all."""
+        frame = SessionFrame.from_sessions(make_sessions(30, ahi=[3.0] * 25 + [9.0] * 5))
+        InsightsEngine().analyze_frame(frame)
+
+        assert set(frame._windows) == set(InsightsEngine.WINDOWS)
+
+    def test_ols_slope(self):
+        """Slope of a straight line is recovered; short series have no trend."""
+        assert ols_slope(np.array([1.0, 3.0, 5.0, 7.0])) == pytest.approx(2.0)
+        assert ols_slope(np.array([4.0])) == 0
+
+
+@pytest.mark.unit
+class TestInsightsEngine:
+    """Test insight generation on the columnar frame."""
+
+    def test_no_sessions(self):
+        """No data produces no insights."""
+        assert generate_insights([]) == []
+
+    def test_good_month(self):
+        """A consistent, well controlled month earns the achievement insights."""
+        insights = generate_insights(make_sessions(30))
+
+        assert titles(insights) == [
+            "🏆 Excellent Compliance",
+            "🎉 30-Day Success Milestone",
+            "⭐ Premium Quality Therapy",
+            "🔥 Perfect Week Streak",
+            "✅ Optimal AHI Control",
+            "🎯 Perfect Mask Seal"
+        ]
+        assert insights[0]['data_points'] == {'avg_hours': 7.5, 'compliance_rate': 100.0}
+
+    def test_poor_compliance_and_high_leak(self):
+        """Short nights and leaks raise the matching concerns."""
+        insights = generate_insights(make_sessions(7, duration_hours=3.0, mask_leak=30.0))
+
+        assert titles(insights) == [
+            "⚠️ Compliance Below Target",
+            "🔧 Mask Fit Optimization",
+            "⏰ Sleep Duration Focus"
+        ]
+
+    def test_reported_leak_is_the_window_mean(self):
+        """The reported leak is the mean of the nights that have one."""
+        leaks = [None, 28.8, 30.1, 29.0, 30.0, 29.3, 29.5]
+        insights = generate_insights(make_sessions(7, mask_leak=leaks))
+
+        message = next(i['message'] for i in insights if i['title'] == "🔧 Mask Fit Optimization")
+        reported = float(re.search(r"(\d+\.\d) L/min", message).group(1))
+        assert reported == pytest.approx(statistics.mean(leaks[1:]), abs=0.05 + 1e-9)
+
+    def test_rising_ahi_trend(self):
+        """A rising AHI over the last two weeks raises an alert."""
+        ahis = [10.0 + i for i in range(14)]
+        insights = generate_insights(make_sessions(14, ahi=ahis))
+
+        alert = next(i for i in insights if i['title'] == "🚨 AHI Trending Higher")
+        assert alert['priority'] == 9
+
+    def test_sudden_ahi_spike(self):
+        """A spike after well controlled nights is flagged."""
+        ahis = [3.0] * 10 + [4.0, 18.0, 5.0, 4.0, 3.0]
+        insights = generate_insights(make_sessions(15, ahi=ahis))
+
+        assert "⚠️ Sudden AHI Increase" in titles(insights)
+
+    def test_missing_values_are_skipped(self):
+        """Nights without AHI or usage do not break the analysis."""
+        sessions = make_sessions(30, ahi=[None] * 30, duration_hours=[None] + [7.5] * 29)
+        insights = generate_insights(sessions)
+
+        assert "🎉 30-Day Success Milestone" not in titles(insights)
+        assert "🏆 Excellent Compliance" in titles(insights)
+
+
+@pytest.mark.unit
+class TestBatchInsights:
+    """Test batch insight generation over a columnar frame of many users."""
+
+    def test_matches_per_user_generate_insights(self):
+        """Every user gets exactly the insights generate_insights gives them."""
+        rng = random.Random(7)
+        per_user = {}
+        rows = []
+        for user_id in rng.sample(range(1000), 40):
+            sessions = random_sessions(rng, rng.randint(1, 60))
+            per_user[user_id] = sessions
+            rows.extend(dict(session, user_id=user_id) for session in sessions)
+        rng.shuffle(rows)
+        columns = {key: [row[key] for row in rows] for key in rows[0]}
+
+        results = dict(generate_insights_batch(columns))
+
+        assert list(results) == sorted(per_user)
+        for user_id, sessions in per_user.items():
+            assert without_timestamps(results[user_id]) == without_timestamps(generate_insights(sessions))
+
+    def test_trends_match_per_user_slopes(self):
+        """Batch trend slopes are bit-for-bit the per-user ols_slope, so thresholds agree."""
+        rng = random.Random(11)
+        per_user = {}
+        rows = []
+        for user_id in range(30):
+            sessions = random_sessions(rng, rng.randint(1, 40))
+            per_user[user_id] = sessions
+            rows.extend(dict(session, user_id=user_id) for session in sessions)
+        columns = {key: [row[key] for row in rows] for key in rows[0]}
+        batch = BatchSessionFrame(columns)
+
+        slopes = batch.trend('ahi', -14, last=7)
+        for group, user_id in enumerate(batch.user_ids.tolist()):
+            frame = SessionFrame.from_sessions(per_user[user_id])
+            assert slopes[group] == frame.trend('ahi', -14, last=7)
+
+    def test_accepts_dataframe(self):
+        """A pandas DataFrame works as the columnar frame; missing metric columns are empty."""
+        frame = pd.DataFrame([dict(session, user_id=1) for session in make_sessions(30)])
+        frame = frame.drop(columns=['pressure_avg'])
+
+        (user_id, insights), = generate_insights_batch(frame)
+
+        assert user_id == 1
+        assert titles(insights) == titles(generate_insights(make_sessions(30, pressure_avg=None)))
+
+    def test_results_are_streamed(self):
+        """Users are yielded one at a time in user_id order."""
+        rows = [dict(session, user_id=user_id) for user_id in (3, 1, 2) for session in make_sessions(7)]
+        columns = {key: [row[key] for row in rows] for key in rows[0]}
+
+        results = generate_insights_batch(columns)
+
+        assert next(results)[0] == 1
+        assert [user_id for user_id, _ in results] == [2, 3]
+
+    def test_empty_frame(self):
+        """No sessions yields nothing."""
+        assert list(generate_insights_batch({'user_id': [], 'date': []})) == []
+
+
+def add_night(db_session, user, night, ahi=3.0, hours=7.5):
+    session = SessionModel(
+        user_id=user.id,
+        start_time=datetime(2025, 1, 1, 22, 30) + timedelta(days=night),
+        duration_minutes=hours * 60,
+        ahi=ahi,
+        mask_leak_95=12.0,
+        pressure_avg=10.0
+    )
+    db_session.add(session)
+    db_session.commit()
+    return session
+
+
+def full_recompute(db_session, user):
+    sessions = (
+        db_session.query(SessionModel)
+        .filter(SessionModel.user_id == user.id)
+        .order_by(SessionModel.start_time, SessionModel.id)
+    )
+    return without_timestamps(generate_insights([s.to_dict() for s in sessions]))
+
+
+@pytest.mark.unit
+class TestIncrementalInsights:
+    """Test per-user insight state updated one night at a time."""
+
+    def test_matches_full_recompute_after_every_night(self):
+        """Adding nights one by one gives the same insights as recomputing the prefix."""
+        rng = random.Random(11)
+        for _ in range(20):
+            sessions = random_sessions(rng, 45)
+            state = InsightState()
+            for i, session in enumerate(sessions):
+                state.add(session, key=i)
+                assert without_timestamps(state.insights()) == without_timestamps(generate_insights(sessions[:i + 1]))
+
+    def test_rejects_out_of_order_nights(self):
+        """A night older than the newest one cannot be folded in."""
+        state = InsightState()
+        sessions = make_sessions(2)
+        state.add(sessions[1], key=sessions[1]['date'])
+
+        assert not state.can_add(sessions[0]['date'])
+        with pytest.raises(ValueError):
+            state.add(sessions[0], key=sessions[0]['date'])
+
+    def test_only_new_nights_are_read(self, db_session, test_user):
+        """After the first call, only sessions added since are folded in."""
+        for night in range(14):
+            add_night(db_session, test_user, night)
+        get_user_insights(db_session, test_user.id)
+        cached = insight_cache.get(test_user.id)
+
+        add_night(db_session, test_user, 14, ahi=25.0)
+        insights = get_user_insights(db_session, test_user.id)
+
+        assert insight_cache.get(test_user.id) is cached
+        assert cached.state.total_sessions == 15
+        assert without_timestamps(insights) == full_recompute(db_session, test_user)
+
+    def test_edit_and_delete_invalidate(self, db_session, test_user):
+        """Editing or deleting a stored night drops the cached state."""
+        nights = [add_night(db_session, test_user, night) for night in range(30)]
+        get_user_insights(db_session, test_user.id)
+
+        nights[3].ahi = 40.0
+        db_session.commit()
+        assert insight_cache.get(test_user.id) is None
+        assert without_timestamps(get_user_insights(db_session, test_user.id)) == full_recompute(db_session, test_user)
+
+        db_session.delete(nights[0])
+        db_session.commit()
+        assert insight_cache.get(test_user.id) is None
+        assert without_timestamps(get_user_insights(db_session, test_user.id)) == full_recompute(db_session, test_user)
+
+    def test_uncommitted_changes_keep_the_state(self, db_session, test_user):
+        """A flushed edit only invalidates once committed; a rollback keeps the state."""
+        nights = [add_night(db_session, test_user, night) for night in range(30)]
+        get_user_insights(db_session, test_user.id)
+
+        nights[3].ahi = 40.0
+        db_session.flush()
+        assert insight_cache.get(test_user.id) is not None
+        db_session.rollback()
+        assert insight_cache.get(test_user.id) is not None
+
+        db_session.delete(nights[0])
+        db_session.flush()
+        assert insight_cache.get(test_user.id) is not None
+        db_session.commit()
+        assert insight_cache.get(test_user.id) is None
+
+    def test_state_built_before_an_invalidation_is_dropped(self, db_session, test_user):
+        """A rebuild that raced a committed change is not cached."""
+        add_night(db_session, test_user, 0)
+        generation = insight_cache.generation(test_user.id)
+        insight_cache.invalidate(test_user.id)
+
+        insight_cache.put(test_user.id, CachedInsightState(), generation)
+
+        assert insight_cache.get(test_user.id) is None
+
+    def test_backfilled_night_rebuilds(self, db_session, test_user):
+        """A newly imported night older than the newest one triggers a rebuild."""
+        for night in range(1, 30):
+            add_night(db_session, test_user, night)
+        get_user_insights(db_session, test_user.id)
+
+        add_night(db_session, test_user, 0, ahi=1.0)
+        insights = get_user_insights(db_session, test_user.id)
+
+        assert insight_cache.get(test_user.id).state.total_sessions == 30
+        assert without_timestamps(insights) == full_recompute(db_session, test_user)
+
+    @pytest.mark.api
+    def test_insights_endpoint_uses_stored_sessions(self, client, auth_headers, db_session, test_user):
+        """/api/sessions/insights reports on the user's own sessions."""
+        for night in range(7):
+            add_night(db_session, test_user, night, hours=3.0)
+
+        response = client.get("/api/sessions/insights", headers=auth_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['total_insights'] == len(data['insights'])
+        assert "⚠️ Compliance Below Target" in titles(data['insights'])
@@ -0,0 +1,118 @@
+import json
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram, Registry
+
+
+def sample(text, name, **labels):
+    """Value of one sample line from the exposition text"""
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    prefix = f"{name}{{{label_text}}} " if labels else f"{name} "
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return None
+
+
+@pytest.mark.unit
+class TestMetricTypes:
+    """Test the metric primitives and text rendering."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Bucket counts include every smaller bucket and end with +Inf."""
+        registry = Registry()
+        histogram = registry.register(Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0)))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, route="/a")
+
+        text = registry.render()
+
+        assert "# TYPE latency_seconds histogram" in text
+        assert sample(text, "latency_seconds_bucket", route="/a", le="0.1") == 2
+        assert sample(text, "latency_seconds_bucket", route="/a", le="1") == 3
+        assert sample(text, "latency_seconds_bucket", route="/a", le="+Inf") == 4
+        assert sample(text, "latency_seconds_count", route="/a") == 4
+        assert sample(text, "latency_seconds_sum", route="/a") == pytest.approx(3.65)
+
+    def test_labels_are_checked_and_escaped(self):
+        """Label sets must match the declaration; values are escaped."""
+        counter = Counter("events_total", "Events", ("kind",))
+        with pytest.raises(ValueError):
+            counter.inc(other="x")
+        counter.inc(kind='say "hi"')
+        assert 'events_total{kind="say \\"hi\\""} 1' in counter.render()
+
+    def test_failed_query_releases_its_start_time(self):
+        """A statement that raises does not leave its start time on the connection."""
+        engine = create_engine("sqlite://")
+        with engine.connect() as connection:
+            with pytest.raises(OperationalError):
+                connection.exec_driver_sql("SELECT * FROM missing")
+            assert connection.info["query_start_times"] == []
+
+            before = metrics.db_queries_total.value()
+            connection.exec_driver_sql("SELECT 1")
+            assert metrics.db_queries_total.value() == before + 1
+        engine.dispose()
+
+
+@pytest.mark.integration
+@pytest.mark.api
+class TestMetricsEndpoint:
+    """Test request instrumentation and the /metrics endpoint."""
+
+    def test_request_and_database_metrics(self, client: TestClient, auth_headers, monkeypatch):
+        """Requests are counted per route template with their database work."""
+        monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-token")
+        before = metrics.http_requests_total.value(method="GET", route="/api/upload/status/{upload_id}", status="404")
+        queries_before = metrics.db_queries_per_request.count(route="/api/upload/status/{upload_id}")
+
+        for upload_id in (1, 2):
+            assert client.get(f"/api/upload/status/{upload_id}", headers=auth_headers).status_code == 404
+
+        text = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"}).text
+        route = "/api/upload/status/{upload_id}"
+        assert sample(text, "http_requests_total", method="GET", route=route, status="404") == before + 2
+        assert sample(text, "http_request_duration_seconds_count", method="GET", route=route) >= 2
+        assert metrics.db_queries_per_request.count(route=route) == queries_before + 2
+        assert sample(text, "db_queries_total") > 0
+        # The scrape itself is in flight
+        assert sample(text, "http_requests_in_flight") == 1
+        assert sample(text, "upload_queue_depth") is not None
+        assert sample(text, "db_pool_checkedout") is not None
+
+    def test_metrics_require_the_token(self, client: TestClient, monkeypatch):
+        """/metrics is hidden without a configured token and needs it as a bearer token."""
+        monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+        assert client.get("/metrics").status_code == 404
+
+        monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-token")
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+        assert response.status_code == 200
+        assert "# TYPE http_requests_total counter" in response.text
+
+    def test_sampled_access_log(self, client: TestClient, monkeypatch, caplog):
+        """Access log records are structured and never include headers."""
+        monkeypatch.setattr(settings, "ACCESS_LOG_SAMPLE_RATE", 1.0)
+        with caplog.at_level(logging.INFO, logger="app.access"):
+            client.get("/health", headers={"Authorization": "Bearer secret-token"})
+
+        records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "app.access"]
+        assert records[-1]["route"] == "/health"
+        assert records[-1]["status"] == 200
+        assert "secret-token" not in caplog.text
+
+        caplog.clear()
+        monkeypatch.setattr(settings, "ACCESS_LOG_SAMPLE_RATE", 0.0)
+        with caplog.at_level(logging.INFO, logger="app.access"):
+            client.get("/health")
+        assert not [r for r in caplog.records if r.name == "app.access"]
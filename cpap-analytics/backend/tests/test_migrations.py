@@ -0,0 +1,90 @@
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import MetaData, create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app.core.database import Base
+
+ALEMBIC_DIR = Path(__file__).parent.parent / "alembic"
+CONSTRAINTS = ("ix_sessions_user_id_start_time", "uq_sessions_user_id_session_id")
+
+
+def upgrade(url):
+    """Run every migration against ``url``"""
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+
+def create_legacy_schema(engine):
+    """Current tables, but sessions without the unique index and constraint"""
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        if copy.name == "sessions":
+            copy.indexes = {index for index in copy.indexes if index.name not in CONSTRAINTS}
+            copy.constraints = {c for c in copy.constraints if c.name not in CONSTRAINTS}
+    metadata.create_all(engine)
+
+
+@pytest.mark.integration
+class TestSessionConstraintMigration:
+    """Test the migration adding the sessions unique constraints to existing databases."""
+
+    @pytest.fixture
+    def database(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'legacy.db'}"
+        engine = create_engine(url)
+        yield url, engine
+        engine.dispose()
+
+    def test_duplicates_are_removed_before_the_constraints(self, database):
+        """Test the first stored row of each night and session id is kept and the constraints hold."""
+        url, engine = database
+        create_legacy_schema(engine)
+        night = datetime(2025, 1, 1, 22, 30)
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO users (id, username, email, hashed_password) VALUES "
+                                    "(1, 'a', 'a@example.com', 'x'), (2, 'b', 'b@example.com', 'x')"))
+            connection.execute(
+                text("INSERT INTO sessions (id, user_id, session_id, start_time) VALUES (:id, :user, :sid, :start)"),
+                [
+                    {"id": 1, "user": 1, "sid": "resmed_a", "start": night},
+                    {"id": 2, "user": 1, "sid": "resmed_b", "start": night},
+                    {"id": 3, "user": 1, "sid": "resmed_a", "start": datetime(2025, 1, 3, 22, 0)},
+                    {"id": 4, "user": 2, "sid": "resmed_a", "start": night},
+                ]
+            )
+            connection.execute(
+                text("INSERT INTO session_sketches (user_id, session_id, day) VALUES (:user, :sid, :day)"),
+                [{"user": 1, "sid": sid, "day": date(2025, 1, 1)} for sid in ("resmed_a", "resmed_b")]
+            )
+
+        upgrade(url)
+
+        with engine.begin() as connection:
+            assert connection.execute(text("SELECT id FROM sessions ORDER BY id")).scalars().all() == [1, 4]
+            sketches = connection.execute(text("SELECT session_id FROM session_sketches")).scalars().all()
+            assert sketches == ["resmed_a"]
+        with pytest.raises(IntegrityError), engine.begin() as connection:
+            connection.execute(text("INSERT INTO sessions (user_id, session_id, start_time) "
+                                    "VALUES (1, 'resmed_c', :start)"), {"start": night})
+        with pytest.raises(IntegrityError), engine.begin() as connection:
+            connection.execute(text("INSERT INTO sessions (user_id, session_id, start_time) "
+                                    "VALUES (2, 'resmed_a', :start)"), {"start": datetime(2025, 1, 5)})
+
+    def test_current_schema_is_left_alone(self, database):
+        """Test a database created with the constraints already in place upgrades cleanly."""
+        url, engine = database
+        Base.metadata.create_all(engine)
+
+        upgrade(url)
+
+        inspector = inspect(engine)
+        assert any(index["name"] == CONSTRAINTS[0] and index["unique"] for index in inspector.get_indexes("sessions"))
+        assert CONSTRAINTS[1] in {c["name"] for c in inspector.get_unique_constraints("sessions")}
@@ -0,0 +1,180 @@
+import json
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.analytics.night_profile import LARGE_LEAK, NightProfile
+from app.models.device import Device
+from app.models.session_profile import SessionProfile
+from app.models.user import User
+from app.services.night_profiles import range_profile
+from app.services.sd_card_import import import_sd_card, session_parser
+
+START = datetime(2025, 1, 1, 22, 30)
+
+
+def write_night(make_edf, datalog, start, leak, events):
+    """PLD leak (0.5 Hz, digital steps of 0.6 L/min) and EVE events for one night"""
+    stem = start.strftime("%Y%m%d_%H%M%S")
+    make_edf(
+        datalog / f"{stem}_PLD.edf", start, record_duration=60,
+        signals=[{"label": "Leak.2s", "samples": leak, "samples_per_record": 30,
+                  "physical_min": 0, "physical_max": 1, "digital_min": 0, "digital_max": 100,
+                  "dimension": "L/s"}],
+    )
+    make_edf(
+        datalog / f"{stem}_EVE.edf", start, record_duration=len(leak) * 2,
+        signals=[{"label": "Crc16", "samples": [0], "samples_per_record": 1}],
+        annotations=events,
+    )
+
+
+@pytest.mark.unit
+class TestNightProfile:
+    """Test hourly binning of leak and events."""
+
+    def test_leak_by_hour_since_mask_on_and_clock_hour(self):
+        """Leak is averaged per hour since mask on and per clock hour across midnight."""
+        rate = 0.5
+        # Three hours: 6, 12 then 30 L/min
+        leak = np.repeat([6.0, 12.0, 30.0], 1800)
+        profile = NightProfile.for_session(START, 3 * 3600, leak=leak, leak_rate=rate)
+
+        since = profile.summary("since_mask_on")
+        assert [row["leak_avg"] for row in since[:3]] == [6.0, 12.0, 30.0]
+        assert since[3]["leak_avg"] is None
+        assert [row["usage_hours"] for row in since[:4]] == [1.0, 1.0, 1.0, 0.0]
+        assert since[2]["large_leak_percent"] == 100.0 and 30.0 > LARGE_LEAK
+
+        clock = profile.summary("clock_hour")
+        # 22:30-23:00 at 6, 23:00-00:00 half 6 half 12, 00:00-01:00 half 12 half 30, 01:00-01:30 at 30
+        assert clock[22]["leak_avg"] == 6.0
+        assert clock[23]["leak_avg"] == 9.0
+        assert clock[0]["leak_avg"] == 21.0
+        assert clock[1]["leak_avg"] == 30.0
+        assert clock[0]["large_leak_percent"] == 50.0
+        assert sum(row["usage_hours"] for row in clock) == 3.0
+
+    def test_events_by_hour(self):
+        """Event onsets are counted in their hour, late events in the last mask-on bin."""
+        profile = NightProfile.for_session(
+            START, 13 * 3600, events={"obstructive_apneas": [10, 20, 4000, 12.5 * 3600], "hypopneas": [5000]}
+        )
+
+        since = profile.summary("since_mask_on")
+        assert since[0]["events"]["obstructive_apneas"] == 2
+        assert since[1]["events"] == {
+            "obstructive_apneas": 1, "central_apneas": 0, "hypopneas": 1, "unclassified_apneas": 0
+        }
+        assert since[-1]["events"]["obstructive_apneas"] == 1
+        assert since[0]["event_index"] == 2.0
+        assert profile.summary("clock_hour")[22]["events"]["obstructive_apneas"] == 2
+
+    def test_nights_add_up(self):
+        """A multi-night profile is the sum of nightly profiles and survives storage."""
+        nights = [
+            NightProfile.for_session(START + timedelta(days=n), 3600, leak=np.full(1800, float(n)), leak_rate=0.5)
+            for n in range(90)
+        ]
+        total = NightProfile.total(NightProfile.from_json(json.loads(json.dumps(n.to_json()))) for n in nights)
+
+        assert total.nights == 90
+        assert total.summary("since_mask_on")[0]["usage_hours"] == 90.0
+        assert total.summary("since_mask_on")[0]["leak_avg"] == pytest.approx(44.5)
+
+    def test_partial_files_of_one_night(self):
+        """Leak and events profiles of the same night combine without doubling usage."""
+        leak = NightProfile.for_session(START, 3600, leak=np.full(1800, 3.0), leak_rate=0.5)
+        events = NightProfile.for_session(START, 3600, events={"hypopneas": [100, 200]})
+        night = leak.combine_partial(events).summary("since_mask_on")[0]
+
+        assert night["usage_hours"] == 1.0
+        assert night["leak_avg"] == 3.0
+        assert night["events"]["hypopneas"] == 2
+
+
+@pytest.mark.integration
+class TestStoredProfiles:
+    """Test profiles cached on import and served per date range."""
+
+    @pytest.fixture
+    def imported(self, tmp_path, make_edf, db_session, test_user):
+        device = Device(
+            serial_number="23205555555",
+            device_type="resmed_airsense_11",
+            manufacturer="ResMed",
+            model="AirSense 11 AutoSet",
+            user_id=test_user.id
+        )
+        db_session.add(device)
+        db_session.commit()
+
+        datalog = tmp_path / "DATALOG"
+        datalog.mkdir()
+        for night in range(3):
+            # Two hours; leak rises to 30 L/min (digital 50) in the second hour
+            leak = np.repeat(np.array([10, 50], dtype=np.int16), 1800)
+            write_night(make_edf, datalog, START + timedelta(days=night), leak,
+                        [(600, 10, "Obstructive Apnea"), (4000, 10, "Hypopnea"), (4100, 10, "Apnea")])
+        import_sd_card(db_session, test_user.id, device.id, str(tmp_path))
+
+    def test_parser_merges_profiles(self, tmp_path, make_edf):
+        """The PLD and EVE files of a night give one session with a combined profile."""
+        datalog = tmp_path / "DATALOG"
+        datalog.mkdir()
+        write_night(make_edf, datalog, START, np.full(1800, 10, dtype=np.int16), [(60, 10, "Central Apnea")])
+
+        session, = session_parser(str(tmp_path)).parse_all_sessions()
+        first_hour = session.profile.summary("since_mask_on")[0]
+        assert first_hour["leak_avg"] == pytest.approx(6.0)
+        assert first_hour["events"]["central_apneas"] == 1
+        assert first_hour["usage_hours"] == 1.0
+
+    def test_range_profile(self, db_session, test_user, imported):
+        """Profiles are stored per night and summed over the range."""
+        assert db_session.query(SessionProfile).count() == 3
+
+        profile = range_profile(db_session, test_user.id, date(2025, 1, 2), date(2025, 1, 3))
+        since = profile.summary("since_mask_on")
+        assert profile.nights == 2
+        assert [row["leak_avg"] for row in since[:2]] == [pytest.approx(6.0), pytest.approx(30.0)]
+        assert since[1]["events"]["hypopneas"] == 2
+        assert since[1]["events"]["unclassified_apneas"] == 2
+
+    def test_profiles_are_per_user(self, tmp_path, db_session, test_user, imported):
+        """Importing the same card for another user leaves the first user's profiles alone."""
+        other = User(username="other", email="other@example.com", hashed_password="x")
+        db_session.add(other)
+        db_session.commit()
+        device = Device(
+            serial_number="23206666666",
+            device_type="resmed_airsense_11",
+            manufacturer="ResMed",
+            model="AirSense 11 AutoSet",
+            user_id=other.id
+        )
+        db_session.add(device)
+        db_session.commit()
+
+        import_sd_card(db_session, other.id, device.id, str(tmp_path))
+
+        assert db_session.query(SessionProfile).count() == 6
+        for user_id in (test_user.id, other.id):
+            assert range_profile(db_session, user_id).nights == 3
+
+    def test_hourly_profile_endpoint(self, client, auth_headers, imported):
+        """The endpoint serves the profile of the requested days."""
+        response = client.get(
+            "/api/v1/analytics/hourly-profile",
+            params={"end_date": "2025-01-31", "days": 90},
+            headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["start_date"] == "2024-11-03"
+        assert body["nights"] == 3
+        assert len(body["since_mask_on"]) == 12 and len(body["clock_hour"]) == 24
+        assert body["clock_hour"][23]["leak_avg"] == pytest.approx(18.0)
+        assert body["since_mask_on"][0]["event_index"] == 1.0
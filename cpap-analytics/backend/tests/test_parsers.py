@@ -3,10 +3,14 @@ import tempfile
 import os
 from pathlib import Path
 from datetime import datetime, timedelta
-from unittest.mock import patch, mock_open
+from unittest.mock import patch
 import struct
 
+import numpy as np
+
 from app.parsers.resmed import ResMedParser, CPAPSession
+from app.parsers.edf import EDFReader, EDFError
+from app.services.sd_card_import import session_parser
 
 
 @pytest.mark.unit
@@ -158,42 +162,33 @@ class TestResMedParser:
             parser = ResMedParser(str(temp_path))
             assert parser.validate_sd_card() is False
 
-    @patch('builtins.open', new_callable=mock_open)
-    def test_parse_brp_file_valid_filename(self, mock_file):
-        """Test parsing BRP file with valid date filename."""
+    def test_brp_file_without_edf_header_is_skipped(self):
+        """A bare .BRP file that is not EDF gives no session and no error."""
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
             self.create_mock_sd_card(temp_path)
             
             parser = ResMedParser(str(temp_path))
-            
-            # Mock the file content
-            mock_file.return_value.read.return_value = b'mock_data'
-            
             file_path = temp_path / "DATALOG" / "20250115.BRP"
-            session = parser._parse_brp_file(mock_file.return_value, file_path)
+            file_path.write_bytes(b'mock_data')
             
-            assert session is not None
-            assert session.session_id == "resmed_20250115"
-            assert session.start_time.date() == datetime(2025, 1, 15).date()
+            result = parser._parse_file_result(file_path)
+            assert result.session is None
+            assert result.error is None
 
-    def test_parse_brp_file_invalid_filename(self):
-        """Test parsing BRP file with invalid filename falls back to file time."""
+    def test_corrupt_brp_file_reports_error(self):
+        """A .BRP file with a broken EDF header is reported, not replaced by a placeholder."""
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
             self.create_mock_sd_card(temp_path)
             
             parser = ResMedParser(str(temp_path))
+            file_path = temp_path / "DATALOG" / "20250115.BRP"
+            file_path.write_bytes(b'0       truncated')
             
-            # Create a file with invalid name
-            invalid_file = temp_path / "DATALOG" / "invalid.BRP"
-            invalid_file.touch()
-            
-            with patch('builtins.open', mock_open()):
-                session = parser._parse_brp_file(open(invalid_file, 'rb'), invalid_file)
-                
-                assert session is not None
-                assert session.session_id == "resmed_invalid"
+            result = parser._parse_file_result(file_path)
+            assert result.session is None
+            assert result.error is not None
 
     def test_deduplicate_sessions(self):
         """Test session deduplication logic."""
@@ -266,6 +261,63 @@ class TestResMedParser:
             assert "1" in session_ids
             assert "3" in session_ids
 
+    def test_deduplicate_keeps_the_complete_recording(self):
+        """Test a truncated earliest copy does not supply the merged night's events."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+            self.create_mock_sd_card(temp_path)
+            
+            parser = ResMedParser(str(temp_path))
+            
+            # First hour only, e.g. a card pulled mid-night on an earlier upload
+            truncated = CPAPSession(
+                session_id="truncated",
+                start_time=datetime(2025, 1, 1, 23, 0),
+                end_time=datetime(2025, 1, 2, 0, 0),
+                duration_minutes=60,
+                ahi=6.0,
+                total_apneas=6,
+                obstructive_apneas=6,
+                central_apneas=0,
+                hypopneas=0,
+                mask_leak_avg=0.0,
+                mask_leak_95=20.0,
+                pressure_min=8.0,
+                pressure_95=10.0,
+                pressure_max=11.0
+            )
+            
+            complete = CPAPSession(
+                session_id="complete",
+                start_time=datetime(2025, 1, 1, 23, 30),
+                end_time=datetime(2025, 1, 2, 5, 30),
+                duration_minutes=360,
+                ahi=2.0,
+                total_apneas=10,
+                obstructive_apneas=8,
+                central_apneas=2,
+                hypopneas=2,
+                mask_leak_avg=0.0,
+                mask_leak_95=0.0,
+                pressure_min=8.0,
+                pressure_95=11.0,
+                pressure_max=13.0,
+                resp_rate_avg=14.0
+            )
+            
+            merged, = parser._deduplicate_sessions([complete, truncated])
+            
+            assert merged.session_id == "truncated"
+            assert merged.start_time == datetime(2025, 1, 1, 23, 0)
+            assert merged.duration_minutes == 390
+            assert merged.ahi == 2.0
+            assert merged.total_apneas == 10
+            assert merged.hypopneas == 2
+            assert merged.pressure_95 == 11.0
+            # Only metrics missing on the complete recording come from the truncated one
+            assert merged.mask_leak_95 == 20.0
+            assert merged.resp_rate_avg == 14.0
+
     def test_get_device_info_default(self):
         """Test device info extraction with default values."""
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -295,6 +347,219 @@ class TestResMedParser:
             assert device_info["model"] == "AirSense 10 AutoSet"
 
 
+@pytest.mark.unit
+@pytest.mark.parser
+class TestEDFReader:
+    """Test memory-mapped EDF/EDF+ decoding."""
+
+    def test_header_and_signal_views(self, tmp_path, make_edf):
+        """Test header fields and zero-copy int16 signal views."""
+        flow = np.arange(-250, 250, dtype=np.int16)
+        path = make_edf(
+            tmp_path / "20250101_223000_BRP.edf",
+            datetime(2025, 1, 1, 22, 30),
+            record_duration=2,
+            signals=[
+                {"label": "Flow.40ms", "samples": flow, "samples_per_record": 50,
+                 "physical_min": -2, "physical_max": 2, "digital_min": -1000, "digital_max": 1000,
+                 "dimension": "L/s"},
+                {"label": "Press.40ms", "samples": np.full(500, 500), "samples_per_record": 50},
+            ],
+        )
+
+        with EDFReader(path) as edf:
+            assert edf.header.is_edf_plus
+            assert edf.start_time == datetime(2025, 1, 1, 22, 30)
+            assert edf.header.num_records == 10
+            assert edf.end_time == datetime(2025, 1, 1, 22, 30, 20)
+
+            signal = edf.find_signal("flow")
+            assert signal.label == "Flow.40ms"
+            assert signal.sample_rate == 25
+            assert signal.digital.dtype == np.int16
+            assert signal.digital.base is not None  # view, not a copy
+            assert len(signal) == 500
+            np.testing.assert_array_equal(signal.digital.reshape(-1), flow)
+
+            # Lazy scaling over an arbitrary slice crossing record boundaries
+            np.testing.assert_allclose(signal.physical(45, 55), flow[45:55] * 0.002)
+            assert signal.physical().shape == (500,)
+
+    def test_annotations(self, tmp_path, make_edf):
+        """Test EDF+ TAL annotation decoding."""
+        path = make_edf(
+            tmp_path / "20250101_223000_EVE.edf",
+            datetime(2025, 1, 1, 22, 30),
+            record_duration=60,
+            signals=[{"label": "Crc16", "samples": [0, 0], "samples_per_record": 1}],
+            annotations=[(12.5, 10, "Obstructive Apnea"), (300, 15, "Hypopnea")],
+        )
+
+        with EDFReader(path) as edf:
+            annotations = edf.annotations()
+
+        assert [(a.onset, a.duration, a.text) for a in annotations] == [
+            (12.5, 10.0, "Obstructive Apnea"),
+            (300.0, 15.0, "Hypopnea"),
+        ]
+
+    def test_truncated_records_are_ignored(self, tmp_path, make_edf):
+        """Test a partially written trailing record is not exposed."""
+        path = make_edf(
+            tmp_path / "partial.edf",
+            datetime(2025, 1, 1, 22, 30),
+            record_duration=1,
+            signals=[{"label": "Leak.2s", "samples": np.ones(4), "samples_per_record": 2}],
+        )
+        with open(path, "ab") as f:
+            f.write(b"\x01\x00")
+
+        with EDFReader(path) as edf:
+            assert edf.header.num_records == 2
+
+    def test_invalid_file(self, tmp_path):
+        """Test non-EDF input raises EDFError."""
+        path = tmp_path / "bogus.edf"
+        path.write_bytes(b"not an edf file".ljust(512, b" "))
+
+        with pytest.raises(EDFError):
+            EDFReader(path)
+
+    def test_parse_edf_session_files(self, tmp_path, make_edf):
+        """Test PLD and EVE files of one session merge into a single session."""
+        datalog = tmp_path / "DATALOG"
+        datalog.mkdir()
+        start = datetime(2025, 1, 1, 22, 30)
+        minutes = 480
+        # 0.5 Hz PLD data, one-minute records
+        leak = np.tile(np.array([5, 10, 15, 40], dtype=np.int16), minutes * 30 // 4)
+        make_edf(
+            datalog / "20250101_223000_PLD.edf", start, record_duration=60,
+            signals=[
+                {"label": "Leak.2s", "samples": leak, "samples_per_record": 30,
+                 "physical_min": 0, "physical_max": 2, "digital_min": 0, "digital_max": 100,
+                 "dimension": "L/s"},
+                {"label": "MaskPress.2s", "samples": np.full(minutes * 30, 500), "samples_per_record": 30,
+                 "physical_min": 0, "physical_max": 25, "digital_min": 0, "digital_max": 1250,
+                 "dimension": "cmH2O"},
+            ],
+        )
+        make_edf(
+            datalog / "20250101_223000_EVE.edf", start, record_duration=minutes * 60,
+            signals=[{"label": "Crc16", "samples": [0], "samples_per_record": 1}],
+            annotations=[(60, 12, "Obstructive Apnea")] * 8 + [(120, 20, "Hypopnea")] * 8,
+        )
+
+        sessions = ResMedParser(str(tmp_path)).parse_all_sessions()
+
+        assert len(sessions) == 1
+        session = sessions[0]
+        assert session.session_id == "resmed_20250101_223000"
+        assert session.duration_minutes == minutes
+        assert session.obstructive_apneas == 8
+        assert session.hypopneas == 8
+        assert session.ahi == 2.0
+        # Leak is stored in L/s and reported in L/min
+        assert session.mask_leak_avg == pytest.approx(21.0)
+        assert session.mask_leak_95 == pytest.approx(48.0)
+        assert session.pressure_95 == pytest.approx(10.0)
+
+    def test_signal_summary_matches_numpy(self, tmp_path, make_edf):
+        """Test the histogram summary of a signal agrees with np.percentile over the samples."""
+        datalog = tmp_path / "DATALOG"
+        datalog.mkdir()
+        leak = np.random.default_rng(3).integers(-20, 1000, 30 * 400).astype(np.int16)
+        make_edf(
+            datalog / "20250101_223000_PLD.edf", datetime(2025, 1, 1, 22, 30), record_duration=60,
+            signals=[{"label": "Leak.2s", "samples": leak, "samples_per_record": 30,
+                      "physical_min": -0.2, "physical_max": 10, "digital_min": -20, "digital_max": 1000,
+                      "dimension": "L/s"}],
+        )
+
+        session, = ResMedParser(str(tmp_path)).parse_all_sessions()
+
+        physical = (leak * 0.01) * 60
+        assert session.mask_leak_avg == pytest.approx(round(physical.mean(), 2), abs=0.01)
+        assert session.mask_leak_95 == pytest.approx(round(np.percentile(physical, 95), 2), abs=0.01)
+        assert session.mask_leak_95 != pytest.approx(session.mask_leak_avg)
+        # Without builders the parser leaves sketches and profiles to the caller
+        assert session.leak_sketch is None
+        assert session.profile is None
+
+
+@pytest.mark.integration
+@pytest.mark.parser
+class TestParallelIngestion:
+    """Test process-pool SD card ingestion."""
+
+    def create_card(self, temp_path, make_edf, nights=6):
+        """Create a card with per-night folders and one corrupt file."""
+        datalog = temp_path / "DATALOG"
+        datalog.mkdir()
+        for night in range(nights):
+            start = datetime(2025, 1, 1, 22, 30) + timedelta(days=night)
+            folder = datalog / start.strftime("%Y%m%d")
+            folder.mkdir()
+            make_edf(
+                folder / start.strftime("%Y%m%d_%H%M%S_PLD.edf"), start, record_duration=60,
+                signals=[{"label": "Leak.2s", "samples": np.full(30 * 420, night + 1),
+                          "samples_per_record": 30, "dimension": "L/min"}],
+            )
+        (datalog / "20250101" / "20250101_010000_PLD.edf").write_bytes(b"0       " + b"\xff" * 600)
+        return temp_path
+
+    def test_single_scan_finds_nested_files(self, make_edf):
+        """Test the directory walk covers per-night folders in path order."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            parser = ResMedParser(str(self.create_card(Path(temp_dir), make_edf)))
+            files = parser.scan_session_files()
+
+            assert len(files) == 7
+            assert files == sorted(files)
+
+    def test_parallel_matches_serial(self, make_edf):
+        """Test pooled parsing returns the same ordered results as serial parsing."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            parser = ResMedParser(str(self.create_card(Path(temp_dir), make_edf)))
+            files = parser.scan_session_files()
+
+            serial = parser.parse_files(files)
+            parallel = parser.parse_files(files, max_workers=2, chunk_size=2)
+
+            assert [r.file_path for r in parallel] == files
+            assert [r.session for r in parallel] == [r.session for r in serial]
+
+            sessions = parser.parse_all_sessions(max_workers=2, chunk_size=2)
+            assert [s.mask_leak_avg for s in sessions] == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+
+    def test_parallel_workers_use_the_builders(self, make_edf):
+        """Test the import service's sketch and profile builders also run in worker processes."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            parser = session_parser(str(self.create_card(Path(temp_dir), make_edf)))
+            files = parser.scan_session_files()
+
+            serial = parser.parse_files(files)
+            parallel = parser.parse_files(files, max_workers=2, chunk_size=2)
+
+            sessions = [r.session for r in parallel if r.session is not None]
+            assert len(sessions) == 6
+            assert all(s.leak_sketch is not None and s.profile is not None for s in sessions)
+            assert [r.session for r in parallel] == [r.session for r in serial]
+
+    def test_errors_are_structured(self, make_edf):
+        """Test a corrupt file is reported as a ParseResult, not printed."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            parser = ResMedParser(str(self.create_card(Path(temp_dir), make_edf)))
+            parser.parse_all_sessions()
+
+            assert len(parser.parse_errors) == 1
+            error = parser.parse_errors[0]
+            assert error.file_path.name == "20250101_010000_PLD.edf"
+            assert not error.ok
+            assert error.session is None
+            assert "EDFError" in error.error
+
+
 @pytest.mark.integration
 @pytest.mark.parser
 class TestResMedParserIntegration:
@@ -316,8 +581,8 @@ class TestResMedParserIntegration:
             parser = ResMedParser(str(temp_path))
             
             # Mock file parsing to return valid sessions
-            with patch.object(parser, '_parse_brp_file') as mock_parse:
-                def mock_parse_func(file_handle, file_path):
+            with patch.object(parser, '_parse_session_file') as mock_parse:
+                def mock_parse_func(file_path):
                     # Extract date from filename
                     filename = file_path.stem
                     session_date = datetime.strptime(filename, '%Y%m%d')
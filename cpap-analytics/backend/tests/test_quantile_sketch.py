@@ -0,0 +1,218 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.analytics.quantile_sketch import RELATIVE_ACCURACY, QuantileSketch
+from app.models.device import Device
+from app.models.session import Session as SessionModel
+from app.models.session_rollup import SessionRollup
+from app.models.session_sketch import SessionSketch
+from app.models.user import User
+from app.parsers.resmed import CPAPSession
+from app.services.rollups import rebuild_rollups
+from app.services.sd_card_import import import_sd_card
+from app.services.session_sketches import backfill_pressure_averages, range_percentiles, store_session_sketches
+
+PERCENTILES = [0.5, 0.95, 0.99]
+
+
+def leak_samples(size, seed=0):
+    """Leak in L/min: mostly a few L/min, sometimes exactly zero, with a long tail"""
+    rng = np.random.default_rng(seed)
+    leak = rng.gamma(2.0, 4.0, size)
+    leak[rng.random(size) < 0.2] = 0.0
+    return leak
+
+
+def assert_close(estimates, values):
+    exact = np.percentile(values, [p * 100 for p in PERCENTILES], method="lower")
+    np.testing.assert_allclose(estimates, exact, rtol=RELATIVE_ACCURACY * 1.01, atol=0.01)
+
+
+@pytest.mark.unit
+class TestQuantileSketch:
+    """Test the mergeable quantile sketch."""
+
+    def test_quantiles_within_relative_accuracy(self):
+        """Quantiles are within the sketch's relative accuracy of the exact values."""
+        values = leak_samples(200_000)
+        sketch = QuantileSketch().add(values)
+
+        assert sketch.count == values.size
+        assert_close(sketch.quantiles(PERCENTILES), values)
+        assert sketch.quantile(0.0) == 0.0
+        assert sketch.quantile(1.0) == pytest.approx(values.max())
+
+    def test_mean_within_relative_accuracy(self):
+        """The mean from bucket counts is within the relative accuracy of the exact mean."""
+        values = leak_samples(200_000)
+        sketch = QuantileSketch().add(values)
+
+        assert sketch.mean() == pytest.approx(values.mean(), rel=RELATIVE_ACCURACY)
+        assert QuantileSketch().add(np.full(10, 8.0)).mean() == 8.0
+        assert QuantileSketch().mean() is None
+
+    def test_merge_equals_sketch_of_all_values(self):
+        """Merging nightly sketches gives exactly the sketch of all samples."""
+        nights = [leak_samples(5000, seed) * (1 + seed / 10) for seed in range(30)]
+        whole = QuantileSketch().add(np.concatenate(nights))
+        merged = QuantileSketch.merged(QuantileSketch().add(night) for night in reversed(nights))
+
+        assert merged.count == whole.count
+        assert merged.zero_count == whole.zero_count
+        assert merged.quantiles(PERCENTILES) == whole.quantiles(PERCENTILES)
+        assert (merged.min, merged.max) == (whole.min, whole.max)
+
+    def test_digital_samples(self):
+        """Counting int16 samples by value matches counting their physical values."""
+        digital = np.random.default_rng(1).integers(0, 1250, 50_000).astype(np.int16)
+        from_digital = QuantileSketch().add_digital(digital, 0.02, 0.0, 60.0)
+        from_physical = QuantileSketch().add(digital * 0.02 * 60.0)
+
+        np.testing.assert_array_equal(from_digital.counts, from_physical.counts)
+        assert from_digital.quantiles(PERCENTILES) == from_physical.quantiles(PERCENTILES)
+
+    def test_serialization_is_compact(self):
+        """A night of samples serializes to well under a kilobyte and round-trips."""
+        sketch = QuantileSketch().add(leak_samples(25 * 3600 * 8))
+        data = sketch.to_bytes()
+        restored = QuantileSketch.from_bytes(data)
+
+        assert len(data) < 1024
+        assert restored.count == sketch.count
+        assert restored.quantiles(PERCENTILES) == sketch.quantiles(PERCENTILES)
+
+    def test_empty(self):
+        """An empty sketch has no quantiles and merges as a no-op."""
+        empty = QuantileSketch()
+        assert empty.quantiles(PERCENTILES) == [None, None, None]
+        assert QuantileSketch.from_bytes(empty.to_bytes()).count == 0
+        assert QuantileSketch.merged([]).count == 0
+        with pytest.raises(ValueError):
+            empty.merge(QuantileSketch(0.05))
+
+
+@pytest.mark.integration
+class TestSessionSketches:
+    """Test nightly sketches stored on import and merged over date ranges."""
+
+    NIGHTS = 5
+
+    @pytest.fixture
+    def imported(self, tmp_path, make_edf, db_session, test_user):
+        """Import nights whose leak rises by 2 L/min per night over a 0.5 Hz PLD file."""
+        device = Device(
+            serial_number="23207654321",
+            device_type="resmed_airsense_11",
+            manufacturer="ResMed",
+            model="AirSense 11 AutoSet",
+            user_id=test_user.id
+        )
+        db_session.add(device)
+        db_session.commit()
+
+        datalog = tmp_path / "DATALOG"
+        datalog.mkdir()
+        leaks = []
+        for night in range(self.NIGHTS):
+            start = datetime(2025, 3, 1, 22, 30) + timedelta(days=night)
+            # Digital steps of 0.02 L/s (1.2 L/min)
+            leak = (np.arange(30 * 420) % 50 + night * 5).astype(np.int16)
+            make_edf(
+                datalog / f"{start:%Y%m%d_%H%M%S}_PLD.edf", start, record_duration=60,
+                signals=[
+                    {"label": "Leak.2s", "samples": leak, "samples_per_record": 30,
+                     "physical_min": 0, "physical_max": 2, "digital_min": 0, "digital_max": 100,
+                     "dimension": "L/s"},
+                    {"label": "MaskPress.2s", "samples": np.full(30 * 420, 400 + night * 20),
+                     "samples_per_record": 30, "physical_min": 0, "physical_max": 25,
+                     "digital_min": 0, "digital_max": 1250, "dimension": "cmH2O"},
+                ],
+            )
+            leaks.append(leak * 0.02 * 60)
+        import_sd_card(db_session, test_user.id, device.id, str(tmp_path))
+        return leaks
+
+    def test_sketch_per_night(self, db_session, imported):
+        """Every imported night gets a sketch row with both metrics."""
+        rows = db_session.query(SessionSketch).order_by(SessionSketch.day).all()
+
+        assert [row.day for row in rows] == [date(2025, 3, 1) + timedelta(days=n) for n in range(self.NIGHTS)]
+        assert all(row.leak and row.pressure for row in rows)
+        assert QuantileSketch.from_bytes(rows[0].leak).count == 30 * 420
+
+    def test_mean_pressure_is_stored_and_rolled_up(self, db_session, test_user, imported):
+        """Imported nights record their mean pressure, so pressure rollups include them."""
+        sessions = db_session.query(SessionModel).order_by(SessionModel.start_time).all()
+        assert [s.pressure_avg for s in sessions] == [8.0, 8.4, 8.8, 9.2, 9.6]
+
+        month = db_session.query(SessionRollup).filter_by(user_id=test_user.id, period="month").one()
+        assert month.pressure_count == self.NIGHTS
+        assert month.mean("pressure") == pytest.approx(8.8)
+
+    def test_backfill_pressure_from_sketches(self, db_session, test_user, imported):
+        """Nights stored without a mean pressure get one from their sketch."""
+        db_session.query(SessionModel).update({"pressure_avg": 0.0})
+        rebuild_rollups(db_session, test_user.id)
+        db_session.commit()
+
+        assert backfill_pressure_averages(db_session) == [test_user.id]
+        db_session.commit()
+
+        sessions = db_session.query(SessionModel).order_by(SessionModel.start_time).all()
+        expected = [8.0, 8.4, 8.8, 9.2, 9.6]
+        assert [s.pressure_avg for s in sessions] == pytest.approx(expected, rel=RELATIVE_ACCURACY)
+        month = db_session.query(SessionRollup).filter_by(user_id=test_user.id, period="month").one()
+        assert month.pressure_count == self.NIGHTS
+        assert backfill_pressure_averages(db_session) == []
+
+    def test_range_percentiles(self, db_session, test_user, imported):
+        """Percentiles over a range match the exact percentiles of its samples."""
+        stats = range_percentiles(db_session, test_user.id, date(2025, 3, 2), date(2025, 3, 4))
+
+        assert stats["sessions"] == 3
+        leak = np.concatenate(imported[1:4])
+        assert stats["leak"]["samples"] == leak.size
+        assert_close([stats["leak"]["p50"], stats["leak"]["p95"], stats["leak"]["p99"]], leak)
+        assert stats["pressure"]["p50"] == pytest.approx(8.8, rel=RELATIVE_ACCURACY)
+        assert stats["pressure"]["max"] == pytest.approx(9.2)
+
+    def test_percentiles_endpoint(self, client, auth_headers, imported):
+        """The percentiles endpoint merges the nights of the requested range."""
+        response = client.get(
+            "/api/v1/analytics/percentiles",
+            params={"start_date": "2025-03-01", "end_date": "2025-03-31"},
+            headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["sessions"] == self.NIGHTS
+        assert set(body["leak"]) == {"samples", "min", "max", "p50", "p95", "p99"}
+
+        empty = client.get("/api/v1/analytics/percentiles", params={"end_date": "2024-12-31"}, headers=auth_headers)
+        assert empty.json()["leak"]["p95"] is None
+
+    def test_sketches_are_per_user(self, db_session, test_user):
+        """Another user's session with the same id gets its own sketch row."""
+        other = User(username="other", email="other@example.com", hashed_password="x")
+        db_session.add(other)
+        db_session.commit()
+
+        for user_id, leak in ((test_user.id, 5.0), (other.id, 20.0)):
+            session = CPAPSession(
+                session_id="resmed_20250301_223000",
+                start_time=datetime(2025, 3, 1, 22, 30),
+                end_time=datetime(2025, 3, 2, 5, 30),
+                duration_minutes=420,
+                ahi=0.0, total_apneas=0, obstructive_apneas=0, central_apneas=0, hypopneas=0,
+                mask_leak_avg=leak, mask_leak_95=leak, pressure_min=0.0, pressure_95=0.0, pressure_max=0.0,
+                leak_sketch=QuantileSketch().add(np.full(10, leak)).to_bytes()
+            )
+            store_session_sketches(db_session, user_id, [session])
+            db_session.commit()
+
+        assert db_session.query(SessionSketch).count() == 2
+        assert range_percentiles(db_session, test_user.id)["leak"]["max"] == 5.0
+        assert range_percentiles(db_session, other.id)["leak"]["max"] == 20.0
@@ -0,0 +1,71 @@
+import io
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import upload
+from app.core import query_budget
+from app.core.query_budget import QueryBudgetExceeded
+from app.models.session import Session as SessionModel
+from app.services.csv_import import process_cpap_file
+
+
+def make_csv(days, start=date(2024, 1, 1)):
+    lines = ["date,duration_hours,ahi,leak,pressure"]
+    for i in range(days):
+        lines.append(f"{start + timedelta(days=i)},7.5,{2 + i % 4},{10 + i % 7},11.0")
+    return "\n".join(lines).encode()
+
+
+@pytest.mark.unit
+class TestQueryCounter:
+    """Test counting statements in a block."""
+
+    def test_counts_and_enforces_budget(self, db_session, test_user, count_queries):
+        """Statements are counted and listed when the budget is exceeded."""
+        with count_queries() as counter:
+            db_session.query(SessionModel).count()
+            db_session.query(SessionModel).first()
+        assert counter.count == 2
+
+        with pytest.raises(QueryBudgetExceeded) as excinfo:
+            with count_queries(budget=1, where="two queries"):
+                db_session.query(SessionModel).count()
+                db_session.query(SessionModel).first()
+        assert "two queries issued 2 SQL statements, budget is 1" in str(excinfo.value)
+        assert len(excinfo.value.statements) == 2
+
+    def test_csv_import_is_not_per_row(self, db_session, test_user, count_queries):
+        """Importing more nights in one batch issues no more statements."""
+        user_id = test_user.id
+        with count_queries() as small:
+            process_cpap_file(io.BytesIO(make_csv(10)), user_id, db_session)
+        with count_queries() as large:
+            process_cpap_file(io.BytesIO(make_csv(400, start=date(2025, 1, 1))), user_id, db_session)
+
+        assert large.count == small.count <= 5
+
+
+@pytest.mark.integration
+@pytest.mark.api
+class TestEndpointBudgets:
+    """Test budgets declared on endpoints."""
+
+    def test_budget_is_declared(self):
+        """@query_budget records the limit on the endpoint function."""
+        assert query_budget.budget_of(upload.get_upload_history) == 2
+        assert query_budget.budget_of(upload.allowed_file) is None
+
+    def test_exceeded_budget_is_reported(self, client: TestClient, auth_headers, monkeypatch, enforce_query_budgets):
+        """A request over its budget is reported with its route and count."""
+        monkeypatch.setattr(upload.get_upload_history, "query_budget", 0)
+        before = query_budget.db_query_budget_exceeded_total.value(route="/api/upload/history")
+
+        assert client.get("/api/upload/history", headers=auth_headers).status_code == 200
+
+        assert [e.where for e in enforce_query_budgets] == ["/api/upload/history"]
+        assert enforce_query_budgets[0].queries >= 1
+        assert query_budget.db_query_budget_exceeded_total.value(route="/api/upload/history") == before + 1
+        # Reported as expected - keep the autouse fixture from failing this test
+        enforce_query_budgets.clear()
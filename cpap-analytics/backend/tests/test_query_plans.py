@@ -0,0 +1,132 @@
+import asyncio
+import io
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from app.api.endpoints import sessions_fixed
+from app.models.session import Session as SessionModel
+from app.services.csv_import import process_cpap_file
+from app.services.insight_cache import get_user_insights
+from app.services.rollups import rollup_values, update_rollups
+from app.services.session_listing import list_sessions
+
+INDEX = "ix_sessions_user_id_start_time"
+
+
+class SessionQueryPlans:
+    """Collects the SQLite query plan of every SELECT on the sessions table"""
+
+    def __init__(self, db_session):
+        self.db_session = db_session
+        self.engine = db_session.get_bind()
+        self.statements = []
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM sessions" in statement:
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._capture)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._capture)
+
+    @property
+    def plans(self):
+        connection = self.db_session.connection()
+        return [
+            " | ".join(row[3] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            for statement, parameters in self.statements
+        ]
+
+    def assert_indexed(self):
+        assert self.statements, "no sessions queries were issued"
+        for plan in self.plans:
+            assert INDEX in plan, plan
+            assert "SCAN sessions" not in plan, plan
+            assert "TEMP B-TREE FOR ORDER BY" not in plan, plan
+
+
+def make_csv(days, start=date(2024, 1, 1)):
+    lines = ["date,duration_hours,ahi,leak,pressure"]
+    for i in range(days):
+        lines.append(f"{start + timedelta(days=i)},7.5,{2 + i % 4},{10 + i % 7},11.0")
+    return "\n".join(lines).encode()
+
+
+@pytest.fixture
+def imported(db_session, test_user):
+    process_cpap_file(io.BytesIO(make_csv(60)), test_user.id, db_session)
+
+
+@pytest.mark.unit
+class TestSessionIndexes:
+    """Regression tests that per-user session queries use the (user_id, start_time) index."""
+
+    def test_start_time_is_unique_per_user(self, db_session, test_user):
+        """A user cannot store two sessions starting at the same time."""
+        start = datetime(2024, 1, 1, 22)
+        db_session.add_all([
+            SessionModel(user_id=test_user.id, start_time=start),
+            SessionModel(user_id=test_user.id, start_time=start)
+        ])
+        with pytest.raises(IntegrityError):
+            db_session.commit()
+
+    def test_csv_import(self, db_session, test_user, imported):
+        """Re-importing looks up stored dates with an index range scan."""
+        with SessionQueryPlans(db_session) as plans:
+            imported = process_cpap_file(io.BytesIO(make_csv(90)), test_user.id, db_session)
+
+        assert imported == 30
+        plans.assert_indexed()
+        assert all("COVERING INDEX" in plan for plan in plans.plans)
+
+    def test_insights(self, db_session, test_user, imported):
+        """Insight state reads the user's sessions in index order."""
+        with SessionQueryPlans(db_session) as plans:
+            get_user_insights(db_session, test_user.id)
+        plans.assert_indexed()
+
+    def test_rollup_extremes(self, db_session, test_user, imported):
+        """Recomputing extremes after a removal scans only the affected periods."""
+        session = db_session.query(SessionModel).filter(SessionModel.user_id == test_user.id).first()
+        with SessionQueryPlans(db_session) as plans:
+            update_rollups(db_session, test_user.id, removed=[rollup_values(session)])
+        plans.assert_indexed()
+
+    def test_sessions_analytics(self, db_session, test_user, imported):
+        """Summary, recent sessions and trends are answered from the index."""
+        with SessionQueryPlans(db_session) as plans:
+            data = asyncio.run(sessions_fixed.get_analytics(current_user=test_user, db=db_session))
+
+        assert data["summary"]["total_sessions"] == 60
+        assert len(data["recent_sessions"]) == 30
+        plans.assert_indexed()
+
+    def test_session_pages(self, db_session, test_user, imported):
+        """Every page, however deep, is an index range scan in index order."""
+        cursor = None
+        with SessionQueryPlans(db_session) as plans:
+            for _ in range(4):
+                cursor = list_sessions(db_session, test_user.id, 15, cursor)["next_cursor"]
+
+        assert cursor is None
+        assert len(plans.statements) == 4
+        plans.assert_indexed()
+        assert all("start_time<?" in plan for plan in plans.plans[1:])
+
+    def test_profile(self, client: TestClient, auth_headers, db_session, imported):
+        """Profile statistics are a single indexed aggregate."""
+        with SessionQueryPlans(db_session) as plans:
+            response = client.get("/api/v1/users/profile", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.json()["statistics"]["total_nights"] == 60
+        assert len(plans.statements) == 1
+        plans.assert_indexed()
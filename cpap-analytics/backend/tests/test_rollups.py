@@ -0,0 +1,270 @@
+import io
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.models.session import Session as SessionModel
+from app.models.session_rollup import SessionRollup, ROLLUP_METRICS
+from app.services.csv_import import process_cpap_file
+from app.models.user import User
+from app.services.rollups import (
+    backfill_rollups, covering_rollups, period_rollups, period_start, rebuild_rollups, rollup_values,
+    update_rollups
+)
+
+
+def add_session(db_session, user, day, hours=7.5, ahi=3.0, leak=12.0, pressure=10.0, hour=22):
+    session = SessionModel(
+        user_id=user.id,
+        start_time=datetime.combine(day, datetime.min.time()) + timedelta(hours=hour),
+        duration_minutes=hours * 60 if hours is not None else None,
+        ahi=ahi,
+        mask_leak_95=leak,
+        pressure_avg=pressure
+    )
+    db_session.add(session)
+    db_session.flush()
+    update_rollups(db_session, user.id, added=[rollup_values(session)])
+    db_session.commit()
+    return session
+
+
+def snapshot(db_session, user):
+    """Rollup contents keyed by (period, period_start), with float noise rounded away"""
+    result = {}
+    for rollup in db_session.query(SessionRollup).filter(SessionRollup.user_id == user.id):
+        data = rollup.to_dict()
+        for metric in ROLLUP_METRICS:
+            data[metric] = {k: round(v, 6) if isinstance(v, float) else v for k, v in data[metric].items()}
+        data["usage_hours"] = round(data["usage_hours"], 6) if data["usage_hours"] is not None else None
+        result[(rollup.period, rollup.period_start)] = data
+    return result
+
+
+def make_csv(days, start=date(2024, 1, 1)):
+    lines = ["date,duration_hours,ahi,leak,pressure"]
+    for i in range(days):
+        hours = 3.0 if i % 5 == 0 else 7.5
+        lines.append(f"{start + timedelta(days=i)},{hours},{2 + i % 4},{10 + i % 7},11.0")
+    return "\n".join(lines).encode()
+
+
+@pytest.mark.unit
+class TestRollupMaintenance:
+    """Test incremental maintenance of per-period session rollups."""
+
+    def test_period_start(self):
+        """Days map to their ISO week (Monday) and month."""
+        day = date(2024, 3, 14)  # Thursday
+        assert period_start(day, "day") == day
+        assert period_start(day, "week") == date(2024, 3, 11)
+        assert period_start(day, "month") == date(2024, 3, 1)
+
+    def test_day_week_and_month_rollups(self, db_session, test_user):
+        """Each session updates its day, week and month; split nights count once."""
+        add_session(db_session, test_user, date(2024, 3, 14), hours=2.5, ahi=4.0)
+        add_session(db_session, test_user, date(2024, 3, 14), hours=2.0, ahi=2.0, hour=23)
+        add_session(db_session, test_user, date(2024, 3, 15), hours=3.0, ahi=6.0, pressure=0.0)
+
+        day = db_session.query(SessionRollup).filter_by(period="day", period_start=date(2024, 3, 14)).one()
+        assert day.session_count == 2
+        assert day.night_count == 1
+        assert day.compliant_nights == 1  # 4.5 hours across both sessions
+        assert day.mean("ahi") == 3.0
+        assert day.ahi_min == 2.0 and day.ahi_max == 4.0
+
+        month = db_session.query(SessionRollup).filter_by(period="month", period_start=date(2024, 3, 1)).one()
+        assert month.session_count == 3
+        assert month.night_count == 2
+        assert month.compliant_nights == 1
+        assert month.ahi_sumsq == pytest.approx(16 + 4 + 36)
+        assert month.pressure_count == 2  # pressure 0 is not recorded
+
+        week = db_session.query(SessionRollup).filter_by(period="week", period_start=date(2024, 3, 11)).one()
+        assert week.duration_sum == pytest.approx(7.5)
+
+    def test_incremental_matches_rebuild(self, db_session, test_user):
+        """Rollups built one session at a time equal a rebuild from the sessions table."""
+        rng = random.Random(3)
+        # Start times are unique per user, so draw distinct (day, hour) slots
+        slots = rng.sample([(day, hour) for day in range(91) for hour in range(18, 24)], 120)
+        for offset, hour in slots:
+            add_session(
+                db_session, test_user, date(2024, 1, 1) + timedelta(days=offset),
+                hours=rng.choice([None, round(rng.uniform(1, 9), 1)]),
+                ahi=rng.choice([None, round(rng.uniform(0, 20), 1)]),
+                leak=round(rng.uniform(0, 40), 1),
+                hour=hour
+            )
+        incremental = snapshot(db_session, test_user)
+
+        rebuild_rollups(db_session, test_user.id)
+        db_session.commit()
+
+        assert snapshot(db_session, test_user) == incremental
+
+    def test_replaced_session(self, db_session, test_user):
+        """Rewriting a session moves its values and recomputes extremes."""
+        session = add_session(db_session, test_user, date(2024, 3, 14), hours=5.0, ahi=9.0)
+        add_session(db_session, test_user, date(2024, 3, 14), hours=1.0, ahi=2.0, hour=23)
+
+        old = rollup_values(session)
+        session.ahi = 1.0
+        session.duration_minutes = 60
+        update_rollups(db_session, test_user.id, added=[rollup_values(session)], removed=[old])
+        db_session.commit()
+
+        day = db_session.query(SessionRollup).filter_by(period="day", period_start=date(2024, 3, 14)).one()
+        assert day.session_count == 2
+        assert day.ahi_max == 2.0 and day.ahi_min == 1.0
+        assert day.compliant_nights == 0
+        month = db_session.query(SessionRollup).filter_by(period="month").one()
+        assert month.compliant_nights == 0
+
+    def test_removed_last_session_deletes_rollups(self, db_session, test_user):
+        """A period without sessions has no rollup row."""
+        session = add_session(db_session, test_user, date(2024, 3, 14))
+        update_rollups(db_session, test_user.id, removed=[rollup_values(session)])
+        db_session.delete(session)
+        db_session.commit()
+
+        assert db_session.query(SessionRollup).count() == 0
+
+    def test_backfill_users_without_rollups(self, db_session, test_user):
+        """Sessions stored without rollups get them; users with rollups are left alone."""
+        other = User(username="other", email="other@example.com", hashed_password="x")
+        db_session.add(other)
+        db_session.commit()
+        add_session(db_session, other, date(2024, 3, 14))
+        for offset in range(3):
+            db_session.add(SessionModel(
+                user_id=test_user.id,
+                start_time=datetime(2024, 3, 10 + offset, 22, 0),
+                duration_minutes=420,
+                ahi=2.0
+            ))
+        db_session.commit()
+        others = snapshot(db_session, other)
+
+        assert backfill_rollups(db_session) == [test_user.id]
+        db_session.commit()
+
+        month = db_session.query(SessionRollup).filter_by(user_id=test_user.id, period="month").one()
+        assert month.session_count == 3
+        assert snapshot(db_session, other) == others
+        assert backfill_rollups(db_session) == []
+
+    def test_covering_rollups(self, db_session, test_user):
+        """Whole months are read as month rows, partial months as day rows."""
+        process_cpap_file(io.BytesIO(make_csv(120)), test_user.id, db_session)
+        start, end = date(2024, 1, 20), date(2024, 3, 10)
+
+        rollups = covering_rollups(db_session, test_user.id, start, end)
+
+        assert sorted(r.period for r in rollups).count("month") == 1
+        assert all(start <= r.period_start <= end for r in rollups if r.period == "day")
+        combined = SessionRollup.combine(rollups)
+        days = period_rollups(db_session, test_user.id, "day", start, end)
+        assert combined.session_count == len(days) == (end - start).days + 1
+        assert combined.ahi_sum == pytest.approx(sum(day.ahi_sum for day in days))
+
+
+@pytest.mark.integration
+@pytest.mark.api
+class TestAnalyticsEndpoints:
+    """Test the v1 analytics endpoints answered from rollups."""
+
+    @pytest.fixture
+    def imported(self, db_session, test_user):
+        process_cpap_file(io.BytesIO(make_csv(60)), test_user.id, db_session)
+
+    def test_requires_authentication(self, client: TestClient):
+        """Analytics are per user, so a token is required."""
+        assert client.get("/api/v1/analytics/compliance").status_code == 403
+
+    def test_compliance(self, client: TestClient, auth_headers, imported):
+        """Compliance counts nights with at least 4 hours of use."""
+        response = client.get(
+            "/api/v1/analytics/compliance",
+            params={"start_date": "2024-01-01", "end_date": "2024-01-31"},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_nights"] == 31
+        assert data["compliant_nights"] == 24  # every fifth night is 3 hours
+        assert data["compliance_rate"] == round(24 / 31 * 100, 1)
+        assert data["target_hours"] == 4.0
+
+    def test_trends(self, client: TestClient, auth_headers, imported):
+        """Trends return one point per period."""
+        response = client.get(
+            "/api/v1/analytics/trends/usage_hours",
+            params={"granularity": "monthly"},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        points = response.json()
+        assert [p["date"] for p in points] == ["2024-01-01", "2024-02-01"]
+
+        weekly = client.get("/api/v1/analytics/trends/ahi?granularity=weekly", headers=auth_headers).json()
+        assert [p["date"] for p in weekly[:2]] == ["2024-01-01", "2024-01-08"]  # ISO weeks start on Monday
+
+        bad = client.get("/api/v1/analytics/trends/ahi?granularity=hourly", headers=auth_headers)
+        assert bad.status_code == 400
+
+    def test_sleep_quality(self, client: TestClient, auth_headers, imported):
+        """Sleep quality metrics come from the user's data."""
+        data = client.get("/api/v1/analytics/sleep-quality", headers=auth_headers).json()
+        assert data["average_ahi"] == 3.5  # AHI cycles 2, 3, 4, 5
+        assert data["ahi_trend"] == "stable"
+        assert data["leak_rate_average"] > 0
+
+    def test_sleep_quality_weeks_are_clipped(self, client: TestClient, auth_headers, db_session, test_user):
+        """Nights outside the range do not count towards the AHI trend of its partial weeks."""
+        for offset in range(21):
+            day = date(2024, 1, 1) + timedelta(days=offset)  # Monday
+            ahi = 20.0 if day < date(2024, 1, 3) else 0.0 if day > date(2024, 1, 16) else 3.0
+            add_session(db_session, test_user, day, ahi=ahi)
+
+        data = client.get(
+            "/api/v1/analytics/sleep-quality",
+            params={"start_date": "2024-01-03", "end_date": "2024-01-16"},
+            headers=auth_headers
+        ).json()
+
+        assert data["average_ahi"] == 3.0
+        assert data["ahi_trend"] == "stable"
+
+    def test_monthly_report(self, client: TestClient, auth_headers, imported):
+        """The monthly report summarises one calendar month."""
+        response = client.get("/api/v1/analytics/reports/monthly?year=2024&month=2", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["report_period"] == "2024-02"
+        assert data["summary"]["total_nights"] == 29
+        assert data["summary"]["usage_nights"] == 29
+        assert len(data["highlights"]) == 3
+
+    def test_monthly_report_rejects_invalid_year(self, client: TestClient, auth_headers):
+        """Years outside the supported date range are a validation error, not a server error."""
+        for year in (0, 9999, 10000):
+            response = client.get(f"/api/v1/analytics/reports/monthly?year={year}&month=12", headers=auth_headers)
+            assert response.status_code == 422
+
+    def test_compare(self, client: TestClient, auth_headers, imported):
+        """Two periods are compared side by side."""
+        response = client.get(
+            "/api/v1/analytics/compare",
+            params={
+                "period1_start": "2024-01-01", "period1_end": "2024-01-31",
+                "period2_start": "2024-02-01", "period2_end": "2024-02-29"
+            },
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        comparison = response.json()["comparison"]
+        assert comparison["period1"]["compliance_rate"] == round(24 / 31 * 100, 1)
+        assert comparison["improvements"]["usage_increase"].endswith("hours")
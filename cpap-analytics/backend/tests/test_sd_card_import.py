@@ -0,0 +1,177 @@
+import os
+import pytest
+import numpy as np
+from datetime import datetime, timedelta
+
+from app.models.device import Device
+from app.models.ingest_manifest import IngestManifestEntry
+from app.models.session import Session as SessionModel
+from app.models.session_rollup import SessionRollup
+from app.models.session_sketch import SessionSketch
+from app.models.user import User
+from app.services.sd_card_import import import_sd_card
+
+
+def write_night(make_edf, datalog, start, leak_value, minutes=420):
+    """Write the PLD and EVE files for one night."""
+    stem = start.strftime("%Y%m%d_%H%M%S")
+    make_edf(
+        datalog / f"{stem}_PLD.edf", start, record_duration=60,
+        signals=[{"label": "Leak.2s", "samples": np.full(30 * minutes, leak_value),
+                  "samples_per_record": 30, "dimension": "L/min"}],
+    )
+    make_edf(
+        datalog / f"{stem}_EVE.edf", start, record_duration=minutes * 60,
+        signals=[{"label": "Crc16", "samples": [0], "samples_per_record": 1}],
+        annotations=[(60, 12, "Obstructive Apnea")] * 7,
+    )
+
+
+@pytest.fixture
+def device(db_session, test_user):
+    device = Device(
+        serial_number="23201234567",
+        device_type="resmed_airsense_11",
+        manufacturer="ResMed",
+        model="AirSense 11 AutoSet",
+        user_id=test_user.id
+    )
+    db_session.add(device)
+    db_session.commit()
+    return device
+
+
+@pytest.fixture
+def sd_card(tmp_path, make_edf):
+    datalog = tmp_path / "DATALOG"
+    datalog.mkdir()
+    for night in range(3):
+        write_night(make_edf, datalog, datetime(2025, 1, 1, 22, 30) + timedelta(days=night), 10 + night)
+    return tmp_path
+
+
+@pytest.mark.integration
+@pytest.mark.parser
+class TestIncrementalImport:
+    """Test manifest-based incremental SD card import."""
+
+    def test_first_import_fills_sessions_and_manifest(self, db_session, test_user, device, sd_card):
+        """Test the first import decodes every file and records checksums."""
+        report = import_sd_card(db_session, test_user.id, device.id, str(sd_card))
+
+        assert report.files_scanned == 6
+        assert report.files_parsed == 6
+        assert report.sessions_imported == 3
+        assert not report.errors
+
+        sessions = db_session.query(SessionModel).order_by(SessionModel.start_time).all()
+        assert [s.mask_leak_avg for s in sessions] == [10.0, 11.0, 12.0]
+        assert all(s.ahi == 1.0 for s in sessions)
+        assert all(len(s.checksum) == 64 for s in sessions)
+        assert sessions[0].raw_data_path == "20250101_223000_EVE.edf"
+        assert db_session.query(IngestManifestEntry).count() == 6
+
+    def test_reimport_skips_unchanged_files(self, db_session, test_user, device, sd_card):
+        """Test a re-upload of the same card decodes nothing."""
+        import_sd_card(db_session, test_user.id, device.id, str(sd_card))
+        report = import_sd_card(db_session, test_user.id, device.id, str(sd_card))
+
+        assert report.files_parsed == 0
+        assert report.files_unchanged == 6
+        assert report.sessions_imported == 0
+        assert db_session.query(SessionModel).count() == 3
+
+    def test_touched_file_with_same_contents_is_not_parsed(self, db_session, test_user, device, sd_card):
+        """Test an mtime-only change is resolved by the content hash."""
+        import_sd_card(db_session, test_user.id, device.id, str(sd_card))
+        pld = sd_card / "DATALOG" / "20250101_223000_PLD.edf"
+        os.utime(pld, (1_800_000_000, 1_800_000_000))
+
+        report = import_sd_card(db_session, test_user.id, device.id, str(sd_card))
+        assert report.files_parsed == 0
+
+        entry = db_session.query(IngestManifestEntry).filter_by(relative_path=pld.name).one()
+        assert entry.mtime == 1_800_000_000
+
+    def test_changed_and_new_nights_are_parsed(self, db_session, test_user, device, sd_card, make_edf):
+        """Test only the changed session's files and the new night are decoded."""
+        import_sd_card(db_session, test_user.id, device.id, str(sd_card))
+        datalog = sd_card / "DATALOG"
+        write_night(make_edf, datalog, datetime(2025, 1, 2, 22, 30), 20)
+        write_night(make_edf, datalog, datetime(2025, 1, 4, 22, 30), 30)
+
+        report = import_sd_card(db_session, test_user.id, device.id, str(sd_card))
+
+        assert report.files_parsed == 4
+        assert report.sessions_imported == 1
+        assert report.sessions_updated == 1
+        sessions = db_session.query(SessionModel).order_by(SessionModel.start_time).all()
+        assert [s.mask_leak_avg for s in sessions] == [10.0, 20.0, 12.0, 30.0]
+
+    def test_same_card_for_two_users(self, db_session, test_user, device, sd_card):
+        """Test identical session ids of another user's card do not touch this user's rows."""
+        import_sd_card(db_session, test_user.id, device.id, str(sd_card))
+        other = User(username="other", email="other@example.com", hashed_password="x")
+        db_session.add(other)
+        db_session.commit()
+        other_device = Device(
+            serial_number="23207654321",
+            device_type="resmed_airsense_11",
+            manufacturer="ResMed",
+            model="AirSense 11 AutoSet",
+            user_id=other.id
+        )
+        db_session.add(other_device)
+        db_session.commit()
+
+        report = import_sd_card(db_session, other.id, other_device.id, str(sd_card))
+
+        assert report.sessions_imported == 3
+        assert report.sessions_updated == 0
+        for user in (test_user, other):
+            assert db_session.query(SessionModel).filter_by(user_id=user.id).count() == 3
+            month = db_session.query(SessionRollup).filter_by(user_id=user.id, period="month").one()
+            assert month.session_count == 3
+
+    def test_overlapping_night_from_another_card(self, db_session, test_user, device, sd_card, tmp_path, make_edf):
+        """Test a stored night recorded again under another name is updated, not duplicated."""
+        import_sd_card(db_session, test_user.id, device.id, str(sd_card))
+        other_card = tmp_path / "other_card"
+        (other_card / "DATALOG").mkdir(parents=True)
+        write_night(make_edf, other_card / "DATALOG", datetime(2025, 1, 1, 22, 40), 10)
+
+        report = import_sd_card(db_session, test_user.id, device.id, str(other_card))
+
+        assert report.sessions_imported == 0
+        assert report.sessions_updated == 1
+        sessions = db_session.query(SessionModel).order_by(SessionModel.start_time).all()
+        assert len(sessions) == 3
+        first = sessions[0]
+        assert first.session_id == "resmed_20250101_223000"
+        assert first.end_time == datetime(2025, 1, 2, 5, 40)
+        assert first.duration_minutes == 430
+        assert first.obstructive_apneas == 7
+        month = db_session.query(SessionRollup).filter_by(user_id=test_user.id, period="month").one()
+        assert month.session_count == 3
+        entry = db_session.query(IngestManifestEntry).filter_by(relative_path="20250101_224000_PLD.edf").one()
+        assert entry.session_id == "resmed_20250101_223000"
+
+    def test_recording_spanning_stored_segments(self, db_session, test_user, device, tmp_path, make_edf):
+        """Test stored segments overlapped by one new recording become one session."""
+        card = tmp_path / "card"
+        (card / "DATALOG").mkdir(parents=True)
+        write_night(make_edf, card / "DATALOG", datetime(2025, 1, 1, 22, 30), 10, minutes=60)
+        write_night(make_edf, card / "DATALOG", datetime(2025, 1, 1, 23, 40), 10, minutes=60)
+        import_sd_card(db_session, test_user.id, device.id, str(card))
+        other_card = tmp_path / "other_card"
+        (other_card / "DATALOG").mkdir(parents=True)
+        write_night(make_edf, other_card / "DATALOG", datetime(2025, 1, 1, 22, 45), 10, minutes=120)
+
+        import_sd_card(db_session, test_user.id, device.id, str(other_card))
+
+        session = db_session.query(SessionModel).one()
+        assert session.session_id == "resmed_20250101_223000"
+        assert session.duration_minutes == 135
+        assert [row.session_id for row in db_session.query(SessionSketch)] == ["resmed_20250101_223000"]
+        day = db_session.query(SessionRollup).filter_by(user_id=test_user.id, period="day").one()
+        assert day.session_count == 1
@@ -0,0 +1,96 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.session import Session as SessionModel
+from app.services.session_listing import InvalidCursor, decode_cursor, encode_cursor, list_sessions
+
+
+def add_nights(db_session, user_id, count, first=datetime(2020, 1, 1, 22, 30)):
+    db_session.add_all([
+        SessionModel(user_id=user_id, start_time=first + timedelta(days=night), duration_minutes=420, ahi=2.0)
+        for night in range(count)
+    ])
+    db_session.commit()
+
+
+@pytest.mark.unit
+class TestSessionListing:
+    """Test keyset pagination of a user's sessions."""
+
+    def test_pages_cover_every_session_once(self, db_session, test_user):
+        """Following next_cursor visits each session once, newest first."""
+        user_id = test_user.id
+        add_nights(db_session, user_id, 53)
+
+        seen, cursor = [], None
+        while True:
+            page = list_sessions(db_session, user_id, 10, cursor)
+            seen.extend(page['sessions'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+        assert len(seen) == 53
+        assert len({s['id'] for s in seen}) == 53
+        assert [s['date'] for s in seen] == sorted((s['date'] for s in seen), reverse=True)
+
+    def test_exact_final_page_has_no_cursor(self, db_session, test_user):
+        """A page that ends on the last session does not promise another."""
+        add_nights(db_session, test_user.id, 20)
+
+        first = list_sessions(db_session, test_user.id, 10)
+        second = list_sessions(db_session, test_user.id, 10, first['next_cursor'])
+
+        assert len(second['sessions']) == 10
+        assert second['next_cursor'] is None
+
+    def test_date_range(self, db_session, test_user):
+        """start_date and end_date bound the listed nights inclusively."""
+        add_nights(db_session, test_user.id, 30)
+
+        page = list_sessions(db_session, test_user.id, 100, start_date=date(2020, 1, 5), end_date=date(2020, 1, 9))
+
+        assert [s['date'] for s in page['sessions']] == [date(2020, 1, day) for day in range(9, 4, -1)]
+
+    def test_cursor_round_trip(self):
+        """Cursors decode to the key they were made from; anything else is rejected."""
+        key = (datetime(2024, 3, 1, 22, 15, 0, 250), 42)
+        assert decode_cursor(encode_cursor(*key)) == key
+        for cursor in ["", "not a cursor", encode_cursor(datetime(2024, 1, 1), 1)[:-3]]:
+            with pytest.raises(InvalidCursor):
+                decode_cursor(cursor)
+
+
+@pytest.mark.api
+class TestSessionsEndpointPagination:
+    """Test GET /api/v1/cpap-data/sessions."""
+
+    def test_pages_through_sessions(self, client, auth_headers, db_session, test_user):
+        """Clients follow next_cursor until it is null."""
+        add_nights(db_session, test_user.id, 25)
+
+        first = client.get("/api/v1/cpap-data/sessions", params={"limit": 20}, headers=auth_headers).json()
+        second = client.get(
+            "/api/v1/cpap-data/sessions",
+            params={"limit": 20, "cursor": first["next_cursor"]},
+            headers=auth_headers
+        ).json()
+
+        assert len(first["sessions"]) == 20
+        assert first["sessions"][0]["date"] == "2020-01-25"
+        assert len(second["sessions"]) == 5
+        assert second["next_cursor"] is None
+
+    def test_rejects_bad_requests(self, client, auth_headers):
+        """Invalid cursors, oversized pages and missing tokens are refused."""
+        bad_cursor = client.get("/api/v1/cpap-data/sessions", params={"cursor": "bogus"}, headers=auth_headers)
+        too_large = client.get(
+            "/api/v1/cpap-data/sessions", params={"limit": settings.SESSIONS_MAX_PAGE_SIZE + 1}, headers=auth_headers
+        )
+        anonymous = client.get("/api/v1/cpap-data/sessions")
+
+        assert bad_cursor.status_code == 400
+        assert too_large.status_code == 422
+        assert anonymous.status_code == 403
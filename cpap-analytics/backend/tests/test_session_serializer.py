@@ -0,0 +1,91 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core import responses
+from app.core.responses import FastJSONResponse
+from app.models.session import Session as SessionModel
+from app.services.session_serializer import serialize_sessions
+
+
+def add_sessions(db_session, user_id, count):
+    rows = [
+        SessionModel(
+            user_id=user_id,
+            start_time=datetime(2025, 1, 1, 22, 30) + timedelta(days=night),
+            duration_minutes=300 + night * 7,
+            ahi=1.5 + night % 6,
+            mask_leak_95=8.0 + night % 11,
+            pressure_avg=10.0,
+            pressure_95=12.5,
+            # Legacy rows without a stored score are scored on the fly
+            quality_score=None if night % 3 == 0 else 80.0 + night % 9,
+            central_apneas=night % 2,
+            obstructive_apneas=night % 4,
+            hypopneas=night % 5
+        )
+        for night in range(count)
+    ]
+    rows.append(SessionModel(user_id=user_id, start_time=None, duration_minutes=None, ahi=None))
+    db_session.add_all(rows)
+    db_session.commit()
+    return rows
+
+
+def rendered(content):
+    return json.loads(FastJSONResponse(content).body)
+
+
+@pytest.mark.unit
+class TestSessionSerializer:
+    """Test serializing sessions from column tuples."""
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_matches_to_dict(self, db_session, test_user, monkeypatch, use_orjson):
+        """Records render to the same JSON as Session.to_dict(), with or without orjson."""
+        if not use_orjson:
+            monkeypatch.setattr(responses, "orjson", None)
+        add_sessions(db_session, test_user.id, 40)
+        query = db_session.query(SessionModel).filter(SessionModel.user_id == test_user.id).order_by(SessionModel.id)
+
+        expected = json.loads(json.dumps([session.to_dict() for session in query]))
+        assert rendered(serialize_sessions(query)) == expected
+
+    def test_empty_query(self, db_session, test_user):
+        """No rows give an empty list."""
+        query = db_session.query(SessionModel).filter(SessionModel.user_id == test_user.id)
+        assert serialize_sessions(query) == []
+
+
+@pytest.mark.api
+class TestAnalyticsEndpoint:
+    """Test /api/sessions/analytics over stored sessions."""
+
+    def test_no_sessions(self, client, auth_headers):
+        """A user without sessions gets an empty summary."""
+        response = client.get("/api/sessions/analytics", headers=auth_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["summary"]["total_sessions"] == 0
+        assert data["trends"] == []
+        assert data["recent_sessions"] == []
+
+    def test_recent_sessions_and_summary(self, client, auth_headers, db_session, test_user):
+        """The 30 newest sessions are listed newest first; the summary covers all of them."""
+        user_id = test_user.id
+        sessions = add_sessions(db_session, user_id, 40)
+        expected_ahi = sum(s.ahi for s in sessions if s.ahi is not None) / 40
+
+        response = client.get("/api/sessions/analytics", headers=auth_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["summary"]["total_sessions"] == 41
+        assert data["summary"]["avg_ahi"] == round(expected_ahi, 2)
+        recent = data["recent_sessions"]
+        assert len(recent) == len(data["trends"]) == 30
+        assert [s["date"] for s in recent] == sorted((s["date"] for s in recent), reverse=True)
+        assert recent[0]["date"] == "2025-02-09"
+        assert data["trends"][0]["usageHours"] == recent[0]["duration_hours"]
@@ -0,0 +1,125 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.analytics.night_profile import NightProfile
+from app.parsers.resmed import CPAPSession
+from app.parsers.stitching import group_therapy_days, merge_overlapping, therapy_day
+
+
+def segment(session_id, start, minutes, **metrics):
+    values = dict(
+        ahi=0.0, total_apneas=0, obstructive_apneas=0, central_apneas=0, hypopneas=0,
+        mask_leak_avg=0.0, mask_leak_95=0.0, pressure_min=0.0, pressure_95=0.0, pressure_max=0.0
+    )
+    values.update(metrics)
+    return CPAPSession(
+        session_id=session_id,
+        start_time=start,
+        end_time=start + timedelta(minutes=minutes),
+        duration_minutes=minutes,
+        **values
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.parser
+class TestSessionStitching:
+    """Test overlap merging and noon-to-noon therapy days."""
+
+    def test_therapy_day_runs_noon_to_noon(self):
+        """Times before noon belong to the previous day's night."""
+        assert therapy_day(datetime(2025, 1, 1, 22, 30)) == date(2025, 1, 1)
+        assert therapy_day(datetime(2025, 1, 2, 3, 0)) == date(2025, 1, 1)
+        assert therapy_day(datetime(2025, 1, 2, 12, 0)) == date(2025, 1, 2)
+
+    def test_overlapping_duplicates_merge(self):
+        """Overlapping sessions merge into the earliest, filling its missing metrics."""
+        edf = segment("resmed_20250101_225000", datetime(2025, 1, 1, 22, 50), 400, hypopneas=6)
+        brp = segment("resmed_20250101", datetime(2025, 1, 1, 22, 30), 480, mask_leak_95=18.0)
+        other_upload = segment("resmed_20250101_225000", datetime(2025, 1, 1, 22, 50), 400, hypopneas=6)
+
+        merged, = merge_overlapping([edf, other_upload, brp])
+
+        assert merged.session_id == "resmed_20250101"
+        assert merged.start_time == datetime(2025, 1, 1, 22, 30)
+        assert merged.end_time == datetime(2025, 1, 2, 6, 30)
+        assert merged.mask_leak_95 == 18.0
+        assert merged.hypopneas == 6
+
+    def test_duplicates_are_not_added_up(self):
+        """Merging two recordings of the same events keeps one count and one profile."""
+        events = {"obstructive_apneas": [600, 1200, 1800]}
+        first = segment(
+            "edf", datetime(2025, 1, 1, 23, 0), 60, obstructive_apneas=3, total_apneas=3,
+            profile=NightProfile.for_session(datetime(2025, 1, 1, 23, 0), 3600, events=events)
+        )
+        second = segment(
+            "brp", datetime(2025, 1, 1, 23, 0), 60, obstructive_apneas=3, total_apneas=3,
+            profile=NightProfile.for_session(datetime(2025, 1, 1, 23, 0), 3600, events=events)
+        )
+
+        merged, = merge_overlapping([first, second])
+
+        assert merged.total_apneas == 3
+        assert merged.profile.summary("since_mask_on")[0]["events"]["obstructive_apneas"] == 3
+        assert merged.profile.summary("since_mask_on")[0]["usage_hours"] == 1.0
+
+    def test_duration_covers_the_union(self):
+        """A merged session lasts from the first start to the last end."""
+        first = segment("a", datetime(2025, 1, 1, 23, 0), 60)
+        second = segment("b", datetime(2025, 1, 1, 23, 30), 360)
+
+        merged, = merge_overlapping([second, first])
+
+        assert merged.end_time == datetime(2025, 1, 2, 5, 30)
+        assert merged.duration_minutes == 390
+
+    def test_duplicates_across_an_hour_boundary(self):
+        """Duplicates starting either side of an hour are merged, not kept twice."""
+        first = segment("a", datetime(2025, 1, 1, 22, 58), 300)
+        second = segment("b", datetime(2025, 1, 1, 23, 1), 297)
+        assert [s.session_id for s in merge_overlapping([second, first])] == ["a"]
+
+    def test_mask_off_segments_are_kept(self):
+        """Separate segments in one hour stay separate and form one therapy day."""
+        night = [
+            segment("first", datetime(2025, 1, 1, 23, 0), 20, obstructive_apneas=1, total_apneas=1),
+            segment("second", datetime(2025, 1, 1, 23, 25), 210, hypopneas=3),
+            segment("after_midnight", datetime(2025, 1, 2, 3, 0), 250),
+            segment("next_night", datetime(2025, 1, 2, 22, 0), 420),
+        ]
+
+        days = group_therapy_days(night)
+
+        assert [day.day for day in days] == [date(2025, 1, 1), date(2025, 1, 2)]
+        first = days[0]
+        assert [s.session_id for s in first.segments] == ["first", "second", "after_midnight"]
+        assert first.usage_minutes == 480
+        assert first.mask_off_minutes == 5 + 5
+        assert first.ahi == 0.5
+        assert first.to_dict()["segments"][1]["start_time"] == "2025-01-01T23:25:00"
+
+    def test_touching_segments_are_not_merged(self):
+        """A segment starting exactly when the previous one ends is a new segment."""
+        first = segment("a", datetime(2025, 1, 1, 22, 0), 60)
+        second = segment("b", datetime(2025, 1, 1, 23, 0), 60)
+        assert len(merge_overlapping([first, second])) == 2
+
+    def test_many_segments(self):
+        """Ten thousand segments with a duplicate for each are stitched quickly."""
+        sessions = []
+        for night in range(5000):
+            start = datetime(2010, 1, 1, 22, 0) + timedelta(days=night)
+            sessions.append(segment(f"{night}a", start, 120))
+            sessions.append(segment(f"{night}b", start + timedelta(hours=3), 240))
+            sessions.append(segment(f"{night}dup", start + timedelta(hours=3, minutes=1), 200))
+
+        started = time.perf_counter()
+        days = group_therapy_days(reversed(sessions))
+        elapsed = time.perf_counter() - started
+
+        assert len(days) == 5000
+        assert all(len(day.segments) == 2 for day in days)
+        assert elapsed < 1.0
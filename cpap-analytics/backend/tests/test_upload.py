@@ -0,0 +1,238 @@
+import io
+import zipfile
+import pytest
+import numpy as np
+from datetime import date, datetime, timedelta
+from fastapi.testclient import TestClient
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.database import Base, create_database_engine
+from app.main import app
+from app.models.device import Device
+from app.models.file_upload import FileUpload
+from app.models.session import Session as SessionModel
+from app.models.user import User
+from app.services import csv_import
+from app.services.csv_import import process_cpap_file
+from app.services.upload_jobs import _prepare_sd_card, run_upload_job, upload_queue
+
+
+def make_csv(days, start=date(2015, 1, 1), newline="\n"):
+    lines = ["date,duration_hours,ahi,leak,pressure"]
+    for i in range(days):
+        lines.append(f"{start + timedelta(days=i)},7.5,{2 + i % 4},{10 + i % 7},11.0")
+    return newline.join(lines).encode()
+
+
+@pytest.mark.unit
+@pytest.mark.api
+class TestStreamingCSVImport:
+    """Test the streaming, batched CSV import pipeline."""
+
+    def test_imports_rows_in_batches(self, db_session, test_user, monkeypatch):
+        """Test rows cross several read chunks and insert batches."""
+        monkeypatch.setattr(csv_import, "CSV_READ_CHUNK_SIZE", 37)
+        monkeypatch.setattr(csv_import, "CSV_INSERT_BATCH_SIZE", 100)
+
+        imported = process_cpap_file(io.BytesIO(make_csv(365, newline="\r\n")), test_user.id, db_session)
+
+        assert imported == 365
+        sessions = db_session.query(SessionModel).order_by(SessionModel.start_time).all()
+        assert sessions[0].date == date(2015, 1, 1)
+        assert sessions[0].duration_minutes == 450
+        assert sessions[0].mask_leak == 10
+        assert sessions[0].pressure_avg == 11.0
+        assert sessions[0].quality_score == sessions[0].calculate_quality_score()
+        assert sessions[-1].date == date(2015, 12, 31)
+
+    def test_skips_existing_and_repeated_dates(self, db_session, test_user):
+        """Test dates already stored or repeated in the file are not duplicated."""
+        db_session.add(SessionModel(user_id=test_user.id, start_time=datetime(2015, 1, 2, 22, 30)))
+        db_session.commit()
+
+        data = make_csv(3) + b"\n2015-01-03,6.0,1.0,5.0,10.0\nnot-a-date,1,2,3\n"
+        imported = process_cpap_file(io.BytesIO(data), test_user.id, db_session)
+
+        assert imported == 2
+        assert db_session.query(SessionModel).count() == 3
+
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    return tmp_path / "uploads"
+
+
+def upload(client, headers, filename, content):
+    response = client.post("/api/upload/file", headers=headers, files={"file": (filename, content)})
+    assert response.status_code == 202
+    upload_id = response.json()["file_upload"]["id"]
+    upload_queue.wait(upload_id, timeout=30)
+    return upload_id
+
+
+@pytest.mark.integration
+@pytest.mark.api
+class TestUploadJobs:
+    """Test background upload processing and status reporting."""
+
+    def test_csv_upload_is_processed_in_background(self, client: TestClient, auth_headers, db_session, upload_dir):
+        """Test a CSV upload is queued, processed and reported via /status."""
+        response = client.post(
+            "/api/upload/file",
+            headers=auth_headers,
+            files={"file": ("export.csv", make_csv(10), "text/csv")},
+        )
+        assert response.status_code == 202
+        queued = response.json()["file_upload"]
+        assert queued["processing_status"] in ("pending", "processing", "completed")
+        assert queued["file_size"] == len(make_csv(10))
+
+        upload_queue.wait(queued["id"], timeout=30)
+        status = client.get(f"/api/upload/status/{queued['id']}", headers=auth_headers).json()["upload"]
+
+        assert status["processing_status"] == "completed"
+        assert status["sessions_imported"] == 10
+        assert status["progress"] == {"files_total": 1, "files_parsed": 1, "sessions_imported": 10, "errors": 0}
+        assert db_session.query(SessionModel).count() == 10
+        assert not any(path.is_file() for path in upload_dir.rglob("*"))
+
+    def test_sd_card_archive_upload(self, client: TestClient, auth_headers, db_session, upload_dir, make_edf, tmp_path):
+        """Test a zipped SD card is imported and progress counters are filled."""
+        datalog = tmp_path / "card" / "DATALOG"
+        datalog.mkdir(parents=True)
+        for night in range(2):
+            start = datetime(2025, 1, 1, 22, 30) + timedelta(days=night)
+            make_edf(
+                datalog / start.strftime("%Y%m%d_%H%M%S_PLD.edf"), start, record_duration=60,
+                signals=[{"label": "Leak.2s", "samples": np.full(30 * 420, 5), "samples_per_record": 30}],
+            )
+        (datalog / "20250103_223000_PLD.edf").write_bytes(b"0       " + b"\xff" * 600)
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            for path in sorted(datalog.iterdir()):
+                zf.write(path, f"SDCARD/DATALOG/{path.name}")
+
+        upload_id = upload(client, auth_headers, "card.zip", archive.getvalue())
+        status = client.get(f"/api/upload/status/{upload_id}", headers=auth_headers).json()["upload"]
+
+        assert status["processing_status"] == "completed"
+        assert status["progress"]["files_total"] == 3
+        assert status["progress"]["files_parsed"] == 3
+        assert status["progress"]["errors"] == 1
+        assert "20250103_223000_PLD.edf" in status["error_message"]
+        assert status["sessions_imported"] == 2
+
+        # Re-uploading the same card decodes nothing new
+        upload_id = upload(client, auth_headers, "card.zip", archive.getvalue())
+        status = client.get(f"/api/upload/status/{upload_id}", headers=auth_headers).json()["upload"]
+        assert status["sessions_imported"] == 0
+        assert db_session.query(SessionModel).count() == 2
+
+    def test_first_sd_card_upload_on_file_database(self, tmp_path, make_edf):
+        """Test the device created for a first upload does not lock out progress writes."""
+        engine = create_database_engine(
+            f"sqlite:///{tmp_path / 'app.db'}", connect_args={"check_same_thread": False, "timeout": 0.5}
+        )
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        start = datetime(2025, 1, 1, 22, 30)
+        path = make_edf(
+            tmp_path / "20250101_223000_PLD.edf", start, record_duration=60,
+            signals=[{"label": "Leak.2s", "samples": np.full(30 * 60, 5), "samples_per_record": 30}],
+        )
+        db = session_factory()
+        user = User(username="firstupload", email="first@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        upload_row = FileUpload(user_id=user.id, filename=str(path), original_filename=path.name, file_type="edf")
+        db.add(upload_row)
+        db.commit()
+        upload_id = upload_row.id
+        db.close()
+
+        try:
+            run_upload_job(upload_id, session_factory)
+
+            db = session_factory()
+            finished = db.get(FileUpload, upload_id)
+            assert finished.processing_status == FileUpload.STATUS_COMPLETED, finished.error_message
+            assert finished.sessions_imported == 1
+            assert db.query(Device).filter_by(user_id=finished.user_id).count() == 1
+            db.close()
+        finally:
+            engine.dispose()
+
+    def test_failed_job_is_reported(self, client: TestClient, auth_headers, upload_dir):
+        """Test a job error marks the upload failed with a message."""
+        upload_id = upload(client, auth_headers, "card.zip", b"not a zip archive")
+        status = client.get(f"/api/upload/status/{upload_id}", headers=auth_headers).json()["upload"]
+
+        assert status["processing_status"] == "failed"
+        assert status["error_message"]
+
+    def test_interrupted_uploads_resume_on_startup(self, db_session, test_user, upload_dir, monkeypatch):
+        """Test uploads left pending or processing by a restart are processed when the app starts."""
+        # The test database is a single shared connection, so run the resumed jobs one at a time
+        upload_queue.shutdown()
+        monkeypatch.setattr(upload_queue, "max_workers", 1)
+        upload_dir.mkdir(parents=True)
+        rows = []
+        for status, name in [(FileUpload.STATUS_PENDING, "queued.csv"), (FileUpload.STATUS_PROCESSING, "running.csv")]:
+            path = upload_dir / name
+            path.write_bytes(make_csv(3, start=date(2015 + len(rows), 1, 1)))
+            rows.append(FileUpload(
+                user_id=test_user.id, filename=str(path), original_filename=name,
+                file_type="csv", processing_status=status
+            ))
+        rows.append(FileUpload(
+            user_id=test_user.id, filename=str(upload_dir / "lost.csv"), original_filename="lost.csv",
+            file_type="csv", processing_status=FileUpload.STATUS_PROCESSING
+        ))
+        db_session.add_all(rows)
+        db_session.commit()
+        upload_ids = [row.id for row in rows]
+
+        with TestClient(app):
+            for upload_id in upload_ids[:2]:
+                upload_queue.wait(upload_id, timeout=30)
+
+        db_session.expire_all()
+        statuses = [db_session.get(FileUpload, upload_id).processing_status for upload_id in upload_ids]
+        assert statuses == ["completed", "completed", "failed"]
+        assert db_session.query(SessionModel).count() == 6
+        assert not any(path.is_file() for path in upload_dir.rglob("*"))
+
+    def test_archive_size_is_capped(self, tmp_path, monkeypatch):
+        """Test an archive expanding beyond the limit is rejected before extraction."""
+        archive_path = tmp_path / "card.zip"
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("DATALOG/20250101_223000_PLD.edf", b"\0" * 4096)
+        workdir = tmp_path / "work"
+        workdir.mkdir()
+
+        monkeypatch.setattr(settings, "MAX_EXTRACTED_SIZE", 4095)
+        with pytest.raises(ValueError, match="expands"):
+            _prepare_sd_card(archive_path, "card.zip", workdir)
+        assert not any(workdir.iterdir())
+
+        monkeypatch.setattr(settings, "MAX_EXTRACTED_SIZE", 4096)
+        assert _prepare_sd_card(archive_path, "card.zip", workdir) == workdir
+
+    def test_history_and_status_are_per_user(self, client: TestClient, auth_headers, db_session, upload_dir):
+        """Test history lists the user's uploads newest first and hides others."""
+        first = upload(client, auth_headers, "a.csv", make_csv(2))
+        second = upload(client, auth_headers, "b.csv", make_csv(2, start=date(2016, 1, 1)))
+        db_session.add(FileUpload(user_id=999, filename="x", original_filename="x.csv", file_type="csv"))
+        db_session.commit()
+        other = db_session.query(FileUpload).filter_by(user_id=999).one()
+
+        history = client.get("/api/upload/history", headers=auth_headers).json()["uploads"]
+        assert [u["id"] for u in history] == [second, first]
+
+        response = client.get(f"/api/upload/status/{other.id}", headers=auth_headers)
+        assert response.status_code == 404
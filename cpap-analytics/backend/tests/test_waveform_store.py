@@ -0,0 +1,166 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.models.device import Device
+from app.parsers.edf import EDFReader
+from app.services import waveform_store
+from app.services.sd_card_import import import_sd_card
+from app.services.waveform_store import WaveformSignal, WaveformStore, decode_chunk, encode_chunk
+
+NIGHT_START = datetime(2025, 1, 1, 22, 30)
+
+
+def breathing_flow(seconds, rate=25, seed=0):
+    """Digital flow at 0.002 L/s per step: 15 breaths/min of +-0.5 L/s with sensor noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    return (np.sin(2 * np.pi * t / 4.0) * 250 + rng.normal(0, 1, t.size)).astype("<i2")
+
+
+@pytest.mark.unit
+class TestWaveformChunks:
+    """Test chunk encoding."""
+
+    def test_round_trip_is_exact(self):
+        """Delta encoding wraps around int16 and decodes exactly, extremes included."""
+        rng = np.random.default_rng(1)
+        samples = rng.integers(-32768, 32768, 5000).astype("<i2")
+        samples[:4] = [32767, -32768, 32767, 0]
+        np.testing.assert_array_equal(decode_chunk(encode_chunk(samples), samples.dtype), samples)
+        assert decode_chunk(encode_chunk(samples[:0]), samples.dtype).size == 0
+
+
+@pytest.mark.unit
+class TestWaveformStore:
+    """Test storing and slicing nights of waveforms."""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return WaveformStore(tmp_path, chunk_seconds=60)
+
+    @pytest.fixture
+    def flow(self):
+        return breathing_flow(2 * 3600)
+
+    @pytest.fixture
+    def night(self, store, flow):
+        leak = np.arange(3600, dtype="<i2") % 40
+        store.write_night(1, "resmed_20250101_223000", [
+            WaveformSignal("flow", flow, 25.0, NIGHT_START, gain=0.002, unit="L/s"),
+            WaveformSignal("leak", leak, 0.5, NIGHT_START.replace(minute=31), gain=0.02, unit="L/s"),
+        ])
+        return store.open_night(1, "resmed_20250101_223000")
+
+    def test_slices_match_original(self, night, flow):
+        """Reads across chunk boundaries return exactly the stored samples."""
+        rng = np.random.default_rng(2)
+        for _ in range(50):
+            start, stop = sorted(rng.integers(0, flow.size + 100, 2))
+            np.testing.assert_array_equal(night.read_samples("flow", start, stop), flow[start:stop])
+        np.testing.assert_array_equal(night.read("flow", physical=False), flow)
+
+    def test_time_slice_in_physical_units(self, night, flow):
+        """Seconds map to samples from each signal's own start, scaled by its gain."""
+        np.testing.assert_allclose(night.read("flow", 600, 602), flow[15000:15050] * 0.002)
+
+        # Leak starts a minute into the night at 0.5 Hz
+        assert night.info("leak")["start_offset"] == 60
+        np.testing.assert_allclose(night.read("leak", 60, 70), (np.arange(5) % 40) * 0.02)
+        assert night.duration_seconds("leak") == 60 + 7200
+
+    def test_only_overlapping_chunks_are_decoded(self, night, monkeypatch):
+        """A two minute slice decompresses two or three chunks, not the night."""
+        calls = []
+        decode = waveform_store.decode_chunk
+        monkeypatch.setattr(waveform_store, "decode_chunk", lambda data, dtype: calls.append(1) or decode(data, dtype))
+
+        night.read("flow", 1800, 1920)
+
+        assert 2 <= len(calls) <= 3
+        assert len(night.info("flow")["chunks"]) == 120
+
+    def test_compresses_to_a_fraction(self, night, flow):
+        """Stored flow takes a fraction of its raw int16 (EDF) size."""
+        assert night.info("flow")["stored_bytes"] < 0.4 * flow.nbytes
+
+    def test_rewrite_replaces_night(self, store, night):
+        """Writing a night again swaps in the new signals and leaves no staging files."""
+        store.write_night(1, "resmed_20250101_223000", [
+            WaveformSignal("press", np.full(100, 500, dtype="<i2"), 25.0, NIGHT_START)
+        ])
+
+        assert store.open_night(1, "resmed_20250101_223000").signals == ["press"]
+        assert os.listdir(store.root / "1") == ["resmed_20250101_223000"]
+        assert store.open_night(1, "missing") is None
+
+
+@pytest.mark.integration
+@pytest.mark.parser
+class TestWaveformImport:
+    """Test SD card imports writing waveforms."""
+
+    def test_import_stores_signals(self, db_session, test_user, tmp_path, make_edf):
+        """BRP and PLD signals of an imported night are stored; event files are not."""
+        datalog = tmp_path / "card" / "DATALOG"
+        datalog.mkdir(parents=True)
+        flow = breathing_flow(600)
+        brp = make_edf(
+            datalog / "20250101_223000_BRP.edf", NIGHT_START, record_duration=60,
+            signals=[{"label": "Flow.40ms", "samples": flow, "samples_per_record": 1500,
+                      "physical_min": -2, "physical_max": 2, "digital_min": -10000, "digital_max": 10000,
+                      "dimension": "L/s"}],
+        )
+        make_edf(
+            datalog / "20250101_223000_PLD.edf", NIGHT_START, record_duration=60,
+            signals=[{"label": "Leak.2s", "samples": np.full(300, 12), "samples_per_record": 30,
+                      "dimension": "L/min"}],
+        )
+        make_edf(
+            datalog / "20250101_223000_EVE.edf", NIGHT_START, record_duration=600,
+            signals=[{"label": "Crc16", "samples": [0], "samples_per_record": 1}],
+            annotations=[(60, 12, "Obstructive Apnea")],
+        )
+        device = Device(serial_number="1", device_type="resmed_airsense_11", manufacturer="ResMed",
+                        model="AirSense 11", user_id=test_user.id)
+        db_session.add(device)
+        db_session.commit()
+        store = WaveformStore(tmp_path / "waveforms")
+
+        report = import_sd_card(db_session, test_user.id, device.id, str(tmp_path / "card"), waveform_store=store)
+
+        assert not report.errors
+        night = store.open_night(test_user.id, "resmed_20250101_223000")
+        assert sorted(night.signals) == ["flow", "leak"]
+        with EDFReader(brp) as edf:
+            np.testing.assert_allclose(night.read("flow", 100, 110), edf.find_signal("flow").physical(2500, 2750))
+
+    def test_absorbed_recording_signals_are_stored(self, db_session, test_user, tmp_path, make_edf):
+        """Signals of a recording stitched into an overlapping night are stored with that night."""
+        datalog = tmp_path / "card" / "DATALOG"
+        datalog.mkdir(parents=True)
+        make_edf(
+            datalog / "20250101_223000_PLD.edf", NIGHT_START, record_duration=60,
+            signals=[{"label": "Leak.2s", "samples": np.full(300, 12), "samples_per_record": 30,
+                      "dimension": "L/min"}],
+        )
+        make_edf(
+            datalog / "20250101_223100_BRP.edf", NIGHT_START + timedelta(minutes=1), record_duration=60,
+            signals=[{"label": "Flow.40ms", "samples": breathing_flow(300), "samples_per_record": 1500,
+                      "physical_min": -2, "physical_max": 2, "digital_min": -10000, "digital_max": 10000,
+                      "dimension": "L/s"}],
+        )
+        device = Device(serial_number="1", device_type="resmed_airsense_11", manufacturer="ResMed",
+                        model="AirSense 11", user_id=test_user.id)
+        db_session.add(device)
+        db_session.commit()
+        store = WaveformStore(tmp_path / "waveforms")
+
+        report = import_sd_card(db_session, test_user.id, device.id, str(tmp_path / "card"), waveform_store=store)
+
+        assert report.sessions_imported == 1
+        assert not store.has_night(test_user.id, "resmed_20250101_223100")
+        night = store.open_night(test_user.id, "resmed_20250101_223000")
+        assert sorted(night.signals) == ["flow", "leak"]
@@ -239,9 +239,22 @@ class CPAPAnalytics:
         conn.commit()
         conn.close()
         
-    def analyze_mask_fit(self) -> Dict[str, any]:
-        """Analyze mask fit issues and provide recommendations"""
-        leak_patterns = self.reader.get_leak_patterns()
+    def analyze_mask_fit(self, hourly_profile: Optional[List[Dict]] = None) -> Dict[str, any]:
+        """
+        Analyze mask fit issues and provide recommendations
+
+        hourly_profile is the "clock_hour" list of the backend's
+        /api/v1/analytics/hourly-profile endpoint, the mean leak per clock
+        hour from high-resolution leak data. Without it, leak per hour is
+        estimated from each session's start hour (get_leak_patterns).
+        """
+        if hourly_profile is not None:
+            leak_patterns = {
+                f"{row['hour']:02d}:00": row["leak_avg"]
+                for row in hourly_profile if row["leak_avg"] is not None
+            }
+        else:
+            leak_patterns = self.reader.get_leak_patterns()
         sessions = self.reader.sessions[-30:]  # Last 30 sessions
         
         if not sessions: